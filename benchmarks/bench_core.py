@@ -0,0 +1,112 @@
+"""
+Geometry kernels in morphometrix.core, timed over the sizes analysts produce:
+control points per length, width stations and outline vertices.
+"""
+import numpy as np
+
+from morphometrix.core import (BezierCurve, ArcLength, bezier, gauss_legendre, fit_length,
+                               width_stations, tessellate, posData, measure)
+from morphometrix.edges import propose_edges
+
+from .common import trace, outline, record
+
+class Bezier:
+    params = ([3, 10, 40], [100, 10000])
+    param_names = ['control_points', 'samples']
+
+    def setup(self, k, n):
+        self.P = trace(k)
+        self.t = np.linspace(0, 1, n)
+
+    def time_bezier(self, k, n):
+        bezier(self.t, self.P, k - 1)
+
+    def time_tessellate(self, k, n):
+        tessellate(BezierCurve(self.P))
+
+class GaussLegendre:
+    params = ([3, 10, 40], [24, 64])
+    param_names = ['control_points', 'degree']
+
+    def setup(self, k, degree):
+        self.dP = BezierCurve(trace(k)).derivative().P
+
+    def time_gauss_legendre(self, k, degree):
+        gauss_legendre(1.0, None, self.dP, k - 2, True, degree = degree)
+
+class ArcLengthTable:
+    params = [3, 10, 40]
+    param_names = ['control_points']
+
+    def setup(self, k):
+        self.curve = BezierCurve(trace(k))
+
+    def time_arc_length(self, k):
+        ArcLength(self.curve)
+
+class WidthStations:
+    """Station solve of imwin.measure_widths: invert arc length, normals at each station"""
+    params = ([3, 10, 40], [5, 20, 100])
+    param_names = ['control_points', 'numwidths']
+
+    def setup(self, k, numwidths):
+        self.curve, self.arc = fit_length(trace(k))
+
+    def time_width_stations(self, k, numwidths):
+        width_stations(self.curve, self.arc, numwidths)
+
+class EdgeProposals:
+    """Intensity profiles sampled along every station normal of a 3000 x 2000 frame, edges found"""
+    params = ([5, 20, 100], [250, 1000])
+    param_names = ['numwidths', 'reach']
+
+    def setup(self, numwidths, reach):
+        self.image = np.random.default_rng(0).integers(0, 256, (2000, 3000)).astype(float)
+        self.origins, self.normals = width_stations(*fit_length(trace(10)), numwidths)
+
+    def time_propose_edges(self, numwidths, reach):
+        propose_edges(self.image, self.origins, self.normals, reach)
+
+class PosData:
+    params = [16, 128, 1024, 8192]
+    param_names = ['vertices']
+
+    def setup(self, n):
+        self.P = outline(n)
+        self.closed = posData(self.P[:,0], self.P[:,1])
+        self.open = posData(self.P[:-1,0], self.P[:-1,1])
+
+    def time_update(self, n):
+        pos = posData()
+        for x, y in self.P:
+            pos.update(x, y)
+
+    def time_check_intersect(self, n):
+        #closing segment, tested against every earlier one as on each click
+        self.open.checkIntersect(*self.P[-1])
+
+    def time_trace_with_checks(self, n):
+        #an outline traced click by click, intersection test before each point
+        pos = posData()
+        for x, y in self.P:
+            pos.checkIntersect(x, y)
+            pos.update(x, y)
+
+    def time_live_readout(self, n):
+        #running length and area with the cursor as the next point, queried on every mouse move
+        for x, y in self.P[:100]:
+            self.open.traced_length(x, y)
+            self.open.closed_area(x, y)
+
+    def time_calc_area(self, n):
+        self.closed.calcArea()
+
+class Measure:
+    params = ([1, 10], [10, 100])
+    param_names = ['lengths', 'numwidths']
+
+    def setup(self, lengths, numwidths):
+        self.record = record(lengths, numwidths = numwidths)
+
+    def time_measure(self, lengths, numwidths):
+        measure(self.record)
@@ -0,0 +1,39 @@
+"""
+Writing measurements out: the GUI's export files (without the annotated
+image) and the batch tool's CSV rows.
+"""
+import io
+import os
+import shutil
+import tempfile
+
+from morphometrix.core import measure
+from morphometrix.batch import CSVWriter
+from morphometrix.dataset import measurement_records
+from morphometrix.export import write_export
+
+from .common import record
+
+class Export:
+    params = ([1, 10], [10, 100])
+    param_names = ['lengths', 'numwidths']
+
+    def setup(self, lengths, numwidths):
+        self.dir = tempfile.mkdtemp()
+        self.record = record(lengths, numwidths = numwidths)
+        results = measure(self.record)
+        self.records = measurement_records(self.record, results)
+        #same layout as MainWindow.export_measurements: one row per length with its widths
+        self.rows = [['Object', 'Length (m)', 'Widths (%)']]
+        for name, (names, W) in results['widths'].items():
+            self.rows.append(['', ''] + names)
+            self.rows.append([name, f"{results['lengths'][name]:.2f}"] + [f'{w:.2f}' for w in W])
+
+    def teardown(self, lengths, numwidths):
+        shutil.rmtree(self.dir)
+
+    def time_write_export(self, lengths, numwidths):
+        write_export(os.path.join(self.dir, 'bench'), self.rows, self.record)
+
+    def time_csv_rows(self, lengths, numwidths):
+        CSVWriter(io.StringIO()).writerows(self.records)
@@ -0,0 +1,151 @@
+"""
+Interaction paths of the measuring window, replayed headless.
+
+Each benchmark opens a MainWindow on the offscreen Qt platform with a blank
+3000 x 2000 frame and replays a fixed stream of mouse events through imwin
+with morphometrix.replay (positions in scene coordinates, mapped through the
+view as a real cursor would be), so the timings cover event dispatch, preview
+throttling, intersection tests and scene updates together, as an analyst
+experiences them.
+"""
+import os
+import tempfile
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from PyQt6 import QtGui
+from PyQt6.QtWidgets import QApplication, QInputDialog
+
+from morphometrix.replay import Recording, replay
+
+from .common import trace, outline
+
+LEFT = 1 #Qt.MouseButton.LeftButton
+
+_frame = None
+
+def frame():
+    """Path of a blank frame written once per process"""
+    global _frame
+    if _frame is None:
+        image = QtGui.QImage(3000, 2000, QtGui.QImage.Format.Format_RGB32)
+        image.fill(QtGui.QColor(40, 80, 120))
+        _frame = os.path.join(tempfile.mkdtemp(), 'frame.png')
+        image.save(_frame)
+    return _frame
+
+def clicks(points, moves = 4, finish = False):
+    """Recording placing points, with moves cursor positions on the way to each one"""
+    rec = Recording()
+    last = points[0]
+    for p in points:
+        for f in np.linspace(0, 1, moves + 1)[1:]:
+            rec.append(0.0, 'move', *(last + f * (p - last)))
+        rec.append(0.0, 'press', *p, LEFT, LEFT)
+        rec.append(0.0, 'release', *p, LEFT, 0)
+        last = p
+    if finish: #double click on the last point
+        rec.append(0.0, 'dclick', *last, LEFT, LEFT)
+        rec.append(0.0, 'release', *last, LEFT, 0)
+    return rec
+
+class Window:
+    """Fresh window per sample; subclasses put it in a measuring state in prepare()"""
+    number = 1
+    repeat = 10
+    timeout = 300
+
+    def setup(self, *params):
+        self.app = QApplication.instance() or QApplication([])
+        self._getText = QInputDialog.getText
+        QInputDialog.getText = staticmethod(lambda *a, **k: ('bench', True)) #measurement names
+        from morphometrix.__main__ import MainWindow
+        self.window = MainWindow()
+        self.window.resize(*Recording().size) #the size replay() sets, before the frame is fitted
+        self.window.show()
+        self.window.start_session([frame()])
+        self.view = self.window.iw
+        QApplication.processEvents()
+        self.prepare(*params)
+
+    def prepare(self, *params):
+        pass
+
+    def teardown(self, *params):
+        QInputDialog.getText = self._getText
+        self.window.close()
+        self.window.deleteLater()
+        QApplication.processEvents()
+
+class LengthReplay(Window):
+    params = [4, 16, 64]
+    param_names = ['points']
+
+    def prepare(self, n):
+        self.window.lengthButton.click()
+        self.events = clicks(trace(n), finish = True)
+
+    def time_length(self, n):
+        replay(self.window, self.events)
+
+class AreaReplay(Window):
+    params = [8, 64, 256]
+    param_names = ['vertices']
+
+    def prepare(self, n):
+        self.window.areaButton.click()
+        P = outline(n)
+        #close the outline by crossing its first edge from outside
+        mid, out = 0.5 * (P[0] + P[1]), 1.3 * (0.5 * (P[0] + P[1]) - (1500.0, 1000.0))
+        P = np.vstack((P, (1500.0, 1000.0) + out, (1500.0, 1000.0) + 0.7 * (mid - (1500.0, 1000.0))))
+        self.events = clicks(P)
+
+    def time_area(self, n):
+        replay(self.window, self.events)
+
+class WidthReplay(Window):
+    params = [5, 20, 50]
+    param_names = ['numwidths']
+
+    def prepare(self, numwidths):
+        self.window.subWin.numwidths.setText(str(numwidths))
+        self.window.lengthButton.click()
+        replay(self.window, clicks(trace(12), finish = True))
+
+    def time_measure_widths(self, numwidths):
+        #station solve and width guides
+        self.window.widthsButton.click()
+
+    def time_widths(self, numwidths):
+        self.window.widthsButton.click()
+        view = self.view
+        points = [(view.xp[k // 2] + s * 40 * view.slopes[k // 2, 0], view.yp[k // 2] + s * 40 * view.slopes[k // 2, 1])
+                  for k, s in zip(range(view.nspines), np.tile((1, -1), numwidths))]
+        replay(self.window, clicks(np.array(points)))
+
+class GuideRepaint(Window):
+    """Drawing the view with the width lines of a measurement in progress"""
+    params = [5, 20, 50]
+    param_names = ['numwidths']
+
+    def prepare(self, numwidths):
+        self.window.subWin.numwidths.setText(str(numwidths))
+        self.window.lengthButton.click()
+        replay(self.window, clicks(trace(12), finish = True))
+        self.window.widthsButton.click()
+
+    def time_repaint(self, numwidths):
+        self.view.viewport().grab()
+
+class ZoomReplay(Window):
+    params = [10, 40]
+    param_names = ['steps'] #of 5% each, in and back out
+
+    def prepare(self, steps):
+        self.events = Recording()
+        for delta in [120] * steps + [-120] * steps:
+            self.events.append(0.0, 'wheel', 1500.0, 1000.0, 0, 0, 0, delta)
+
+    def time_zoom(self, steps):
+        replay(self.window, self.events)
@@ -0,0 +1,38 @@
+"""
+Inputs shared by the benchmarks: traced outlines of a given size, generated
+from a fixed seed so every run times the same work.
+"""
+import numpy as np
+
+def trace(n, seed = 0):
+    """n clicked points along a gently curving body axis, (n, 2) pixels"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(200.0, 2800.0, n)
+    y = 1000.0 + 150.0 * np.sin(x / 700.0) + rng.normal(0.0, 2.0, n)
+    return np.c_[x, y]
+
+def outline(n, seed = 0, center = (1500.0, 1000.0), radius = 600.0):
+    """n points around a closed, slightly irregular outline, (n, 2) pixels"""
+    rng = np.random.default_rng(seed)
+    a = np.linspace(0.0, 2*np.pi, n, endpoint = False)
+    r = radius * (1.0 + 0.05 * rng.standard_normal(n))
+    return np.c_[center[0] + r * np.cos(a), center[1] + 0.4 * r * np.sin(a)]
+
+def record(lengths = 1, points = 12, numwidths = 10, area_points = 40):
+    """Annotation record (see core.measure) with width stations on every length"""
+    from morphometrix.core import fit_length, width_stations
+    L = []
+    for i in range(lengths):
+        P = trace(points, seed = i)
+        curve, arc = fit_length(P)
+        B, normal = width_stations(curve, arc, numwidths)
+        W = np.stack([B + 40*normal, B - 40*normal], axis = 1).reshape(-1, 2)
+        L.append({'name': f'L{i}', 'points': P, 'bezier': True, 'numwidths': numwidths, 'widths': W})
+    return {
+        'image': {'id': 'bench', 'path': 'bench.png', 'width': 3000.0, 'height': 2000.0},
+        'calibration': {'focal': 50.0, 'altitude': 50.0, 'pixeldim': 0.00391667},
+        'notes': '',
+        'lengths': L,
+        'areas': [{'name': 'A', 'points': outline(area_points)}],
+        'angles': [{'name': 'T', 'points': np.array([[100.0, 100.0], [300.0, 100.0], [300.0, 400.0]])}],
+    }
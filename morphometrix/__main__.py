@@ -1,22 +1,36 @@
 #usr/bin/env python
+from morphometrix.startup import mark, report_on_first_paint #first, to time the imports below
 import os
 import sys
-import csv
-from itertools import cycle, islice
+import logging
 import numpy as np
-from scipy.linalg import pascal
-from scipy.sparse import diags,spdiags
-from scipy.optimize import root_scalar
+from concurrent.futures import ThreadPoolExecutor
+mark('numpy')
 
 from PyQt6 import QtGui, QtCore
-from PyQt6.QtWidgets import QMainWindow, QApplication, QGraphicsView, QGraphicsScene, QWidget, QHBoxLayout, QVBoxLayout, QToolBar, QPushButton, QCheckBox, QStatusBar, QLabel, QLineEdit, QPlainTextEdit, QTextEdit, QGridLayout, QFileDialog, QGraphicsLineItem, QGraphicsEllipseItem, QGraphicsPolygonItem, QGraphicsItem, QMessageBox, QInputDialog, QDockWidget, QSizePolicy, QRadioButton
+from PyQt6.QtWidgets import QMainWindow, QApplication, QGraphicsView, QGraphicsScene, QWidget, QHBoxLayout, QVBoxLayout, QToolBar, QPushButton, QCheckBox, QStatusBar, QLabel, QLineEdit, QPlainTextEdit, QTextEdit, QTextBrowser, QGridLayout, QFileDialog, QGraphicsLineItem, QGraphicsEllipseItem, QGraphicsPolygonItem, QGraphicsItem, QMessageBox, QInputDialog, QDockWidget, QSizePolicy, QRadioButton
 from PyQt6.QtGui import QShortcut
-from PyQt6.QtWebEngineWidgets import QWebEngineView
+mark('PyQt6')
+
+from morphometrix.core import (posData, angleData, fit_length, width_names, width_stations,
+                               clip_lines, project_to_normal, widths_from_points, polygon_area, angle,
+                               unique_name)
+from morphometrix.tiles import TilePyramid, TiledImageItem
+from morphometrix.items import CurveItem
+from morphometrix.edges import propose_edges
+from morphometrix.prefetch import ImagePrefetcher, list_images
+from morphometrix.session import load_session
+from morphometrix.export import export_size, render_overlay, write_export
+from morphometrix.calibration import calibration_model, exponents
+from morphometrix.metadata import image_calibration
+mark('morphometrix modules')
+
+log = logging.getLogger(__name__) #silent unless configured, python -m morphometrix --debug
 
 #To-do list (descending priority)
 #   -combine UI into one window (done)
 #   -scale bar
-#   -show values as measurements being made
+#   -show values as measurements being made (done)
 #   -mouseover xy position
 #   -preferences change in options
 #   -tune bezier curve tension parameter (rational bezier) with scroll wheel
@@ -26,47 +40,39 @@ from PyQt6.QtWebEngineWidgets import QWebEngineView
 #   -arc between angle lines
 #   -object outline: fusiform
 
-def bezier(t,P,k,arc = False):
-    """
-    Matrix representation of Bezier curve following
-    https://pomax.github.io/bezierinfo/#arclength
-    """
-    signs = np.array([i for j,i in zip(range(k+1),islice(cycle([1, -1]),0,None))]) #create array alternating 0,1s for diagonals
-    A = pascal(k+1, kind='lower') #generate Pascal triangle matrix
-    S = diags(signs, [i-k for i in range(k+1)][::-1], shape=(k+1, k+1)).toarray() #create signs matrix
-    M = A*S #multiply pascals by signs to get Bernoulli polynomial matrix
-    coeff = A[-1,:]
-    C = M*coeff[:,None] #broadcast
-    T = np.array( [t**i for i in range(k+1)] ).T
-    
-    B = T.dot( C.dot(P) )
-    
-    if arc:
-        return np.linalg.norm(B, axis = 1)
-    else:
-        return B
-
-def gauss_legendre(b, f, P, k, arc, loc = 0.0, L = 1, degree = 24, a = 0):
+class Manual(QWidget):
     """
-    Gauss-Legendre Quadrature for bezier curve arc length
+    Manual dock. The page view is only created when the dock is first shown:
+    QtWebEngine (Chromium) is slow to start, so launch doesn't pay for it.
+    The bundled offline manual is shown first; it links to the online one.
+    Without QtWebEngine the offline manual is shown in a QTextBrowser.
     """
-    x, w = np.polynomial.legendre.leggauss(degree)
-    t = 0.5*(b-a)*x + 0.5*(b+a)
-    
-    return 0.5*(b-a)*np.sum( w*bezier(t,P,k,arc) )/L - loc
-
+    offline = os.path.join(os.path.dirname(__file__), 'manual', 'index.html')
 
-
-class Manual(QWidget):
     def __init__(self, parent=None):
         super(Manual, self).__init__()
-        self.manual = QWebEngineView()
-        webpage = QtCore.QUrl('https://wingtorres.github.io/morphometrix/')
-        self.manual.setUrl(webpage)
+        self.manual = None
         self.grid = QGridLayout()
-        self.grid.addWidget(self.manual,1,0)
         self.setLayout(self.grid)
 
+    def showEvent(self, event):
+        if self.manual is None:
+            self.load()
+        super(Manual, self).showEvent(event)
+
+    def load(self):
+        page = QtCore.QUrl.fromLocalFile(self.offline)
+        try:
+            from PyQt6.QtWebEngineWidgets import QWebEngineView
+            self.manual = QWebEngineView()
+        except ImportError: #not installed, or imported after QApplication without shared GL contexts
+            self.manual = QTextBrowser()
+            self.manual.setOpenExternalLinks(True)
+            self.manual.setSource(page)
+        else:
+            self.manual.setUrl(page)
+        self.grid.addWidget(self.manual,1,0)
+
 class Window(QWidget):
 
     def __init__(self, parent=None):
@@ -98,9 +104,23 @@ class Window(QWidget):
         self.numwidths = QLineEdit()
         self.numwidths.setText('10')
 
+        self.label_reach = QLabel("Width Line Reach (% length):")
+        self.reach = QLineEdit()
+        self.reach.setText('25')
+        self.reach.setToolTip('How far width lines extend either side of the length curve')
+
+        self.snap = QCheckBox("Propose widths from edges")
+        self.snap.setToolTip('Width points are pre-placed where the image changes fastest along each width line;\n'
+                             'click near a point to move it, Enter to accept them all')
+
         self.label_not = QLabel("Notes:")
         self.notes = QPlainTextEdit()
 
+        self.label_ds = QLabel("Dataset (optional):")
+        self.dataset = QLineEdit()
+        self.dataset.setPlaceholderText('season.parquet, .arrow, .h5 or .csv')
+        self.dataset.setToolTip('Every export also appends its measurements here as long-format rows')
+
         # self.manual = QWebEngineView()
         #fpath = os.path.abspath('/Users/WalterTorres/Dropbox/KC_WT/MorphoMetrix/morphometrix/README.html')
         #webpage = QtCore.QUrl.fromLocalFile(fpath)
@@ -121,10 +141,15 @@ class Window(QWidget):
         self.grid.addWidget(self.pixeldim, 4, 1)
         self.grid.addWidget(self.label_widths, 5, 0)
         self.grid.addWidget(self.numwidths, 5, 1)
-        self.grid.addWidget(self.label_not, 6, 0)
-        self.grid.addWidget(self.notes, 6, 1)
-        # self.grid.addWidget(self.manual, 8,0,1,4)
-        self.grid.addWidget(self.exit, 7, 3)
+        self.grid.addWidget(self.label_reach, 6, 0)
+        self.grid.addWidget(self.reach, 6, 1)
+        self.grid.addWidget(self.snap, 7, 0, 1, 2)
+        self.grid.addWidget(self.label_not, 8, 0)
+        self.grid.addWidget(self.notes, 8, 1)
+        self.grid.addWidget(self.label_ds, 9, 0)
+        self.grid.addWidget(self.dataset, 9, 1)
+        # self.grid.addWidget(self.manual, 10,0,1,4)
+        self.grid.addWidget(self.exit, 10, 3)
         self.setLayout(self.grid)
 
     def close_application(self):
@@ -141,6 +166,8 @@ class Window(QWidget):
 #https://stackoverflow.com/questions/27109629/how-can-i-resize-the-main-window-depending-on-screen-resolution-using-pyqt
 class MainWindow(QMainWindow):
 
+    export_finished = QtCore.pyqtSignal(str)
+
     def __init__(self, parent = None):
         super(MainWindow, self).__init__()
 
@@ -164,12 +191,13 @@ class MainWindow(QMainWindow):
 
         #Stacked dock widgets
         docked1 = QDockWidget("", self)
-        docked2 = QDockWidget("", self)
+        docked2 = QDockWidget("Manual", self)
         self.addDockWidget(QtCore.Qt.DockWidgetArea.LeftDockWidgetArea, docked1)
         self.addDockWidget(QtCore.Qt.DockWidgetArea.LeftDockWidgetArea, docked2)
         docked1.setWidget(self.subWin)
         docked2.setWidget(self.Manual)
         docked1.setFeatures(QDockWidget.DockWidgetFeature.DockWidgetFloatable)
+        docked2.hide() #opened from the toolbar, see Manual
 
         self.setCorner(QtCore.Qt.Corner.TopLeftCorner, QtCore.Qt.DockWidgetArea.LeftDockWidgetArea);
         self.setCorner(QtCore.Qt.Corner.TopRightCorner, QtCore.Qt.DockWidgetArea.RightDockWidgetArea)
@@ -180,10 +208,34 @@ class MainWindow(QMainWindow):
         self.exportButton = QPushButton("Export Measurements", self)
         self.exportButton.clicked.connect(self.export_measurements)
         self.exportButton.setEnabled(False)
+        self.exporter = ThreadPoolExecutor(max_workers = 1) #exports are written in order
+        self.export_future = None
+        self.export_scale = 1.0 #annotated image resolution relative to the frame
 
         self.importImage = QPushButton("New Image", self)
         self.importImage.clicked.connect(self.file_open)
 
+        self.importFolder = QPushButton("Open Folder", self)
+        self.importFolder.clicked.connect(self.folder_open)
+
+        self.importSession = QPushButton("Open Session", self)
+        self.importSession.clicked.connect(self.session_open)
+
+        #session of several images, decoded ahead in the background
+        self.prefetcher = None
+        self.lens = {}
+        self.session_index = 0
+        self.prevImage = QPushButton("Previous Image", self)
+        self.prevImage.clicked.connect(self.previous_image)
+        self.prevImage.setEnabled(False)
+        self.nextImage = QPushButton("Next Image", self)
+        self.nextImage.clicked.connect(self.next_image)
+        self.nextImage.setEnabled(False)
+        shortcut_prev = QShortcut(QtGui.QKeySequence(QtCore.Qt.Key.Key_PageUp), self)
+        shortcut_prev.activated.connect(self.previous_image)
+        shortcut_next = QShortcut(QtGui.QKeySequence(QtCore.Qt.Key.Key_PageDown), self)
+        shortcut_next.activated.connect(self.next_image)
+
         self.lengthButton = QPushButton("Measure Length", self)
         self.lengthButton.clicked.connect(self.measure_length)
         self.lengthButton.setEnabled(False)
@@ -217,6 +269,10 @@ class MainWindow(QMainWindow):
         shortcut_undo = QShortcut(QtGui.QKeySequence('Ctrl+Z'), self)
         shortcut_undo.activated.connect(self.undo)
 
+        for key in (QtCore.Qt.Key.Key_Return, QtCore.Qt.Key.Key_Enter): #accept proposed width points
+            shortcut_accept = QShortcut(QtGui.QKeySequence(key), self)
+            shortcut_accept.activated.connect(self.iw.accept_widths)
+
         self.bezier = QRadioButton("Bezier fit", self)
         self.bezier.setEnabled(True)
         self.bezier.setChecked(True)
@@ -226,6 +282,7 @@ class MainWindow(QMainWindow):
 	
         self.statusbar = self.statusBar()
         self.statusbar.showMessage('Select new image to begin')
+        self.export_finished.connect(self.statusbar.showMessage)
 
         self.tb = QToolBar('Toolbar')
         #self.addToolBar(QtCore.Qt.RightToolBarArea,self.tb)
@@ -234,6 +291,10 @@ class MainWindow(QMainWindow):
         self.tb.addWidget(spacer)
         self.addToolBar(self.tb)
         self.tb.addWidget(self.importImage)
+        self.tb.addWidget(self.importFolder)
+        self.tb.addWidget(self.importSession)
+        self.tb.addWidget(self.prevImage)
+        self.tb.addWidget(self.nextImage)
         self.tb.addWidget(self.exportButton)
         self.tb.addWidget(self.lengthButton)
         self.tb.addWidget(self.widthsButton)
@@ -242,25 +303,139 @@ class MainWindow(QMainWindow):
         self.tb.addWidget(self.undoButton)
         self.tb.addWidget(self.bezier)
         self.tb.addWidget(self.piecewise)
+        self.tb.addAction(docked2.toggleViewAction())
         #self.tb.setOrientation(QtCore.Qt.Vertical)
 
     def file_open(self):
 
+        paths = QFileDialog.getOpenFileNames(self, 'Open File')[0] #several files start a session
+        if paths:
+            self.start_session(paths)
+
+    def folder_open(self):
+
+        folder = QFileDialog.getExistingDirectory(self, 'Open Folder')
+        if folder:
+            paths = list_images(folder)
+            if paths:
+                self.start_session(paths)
+            else:
+                self.statusbar.showMessage(f'No images found in {folder}')
+
+    def session_open(self):
+
+        path = QFileDialog.getOpenFileName(self, 'Open Session', '', 'MorphoMetriX session (*.npz)')[0]
+        if not path:
+            return
+        try:
+            record = load_session(path)
+        except (IOError, ValueError, KeyError) as err:
+            self.statusbar.showMessage(f'Could not read session {path}: {err}')
+            return
+        image = record['image']['path']
+        if not os.path.exists(image): #moved with the session file?
+            image = os.path.join(os.path.dirname(path), os.path.basename(image))
+        if not os.path.exists(image):
+            self.statusbar.showMessage(f"Image {record['image']['path']} for this session was not found")
+            return
+        self.start_session([image])
+        self.restore_measurements(record)
+        self.statusbar.showMessage(f'Session {os.path.basename(path)} loaded')
+
+    def restore_measurements(self, record):
+        """Redraw stored measurements from a session record and add them to the export"""
+        cal = record['calibration']
+        self.lens = {k: v for k, v in cal.items() if k not in ('focal', 'altitude', 'pixeldim')}
+        self.subWin.id.setText(record['image']['id'])
+        self.subWin.focal.setText(str(cal['focal']))
+        self.subWin.altitude.setText(str(cal['altitude']))
+        self.subWin.pixeldim.setText(str(cal['pixeldim']))
+        self.subWin.notes.setPlainText(record.get('notes', ''))
+
+        iw = self.iw
+        for m in record['lengths']:
+            self.lengthNames.append(m['name'])
+            iw.lengths[-1] = m['length']
+            iw.lengths.extend([np.nan])
+            W = m['widths']
+            iw.widths.append(np.array(m['width_values']) if W is not None else [])
+            iw.widthNames.append(width_names(m['numwidths']) if W is not None else [])
+            iw.lengthData.append({'points': np.array(m['points']), 'bezier': m['bezier'],
+                                  'numwidths': m['numwidths'], 'widths': None if W is None else np.array(W)})
+            iw.add_polyline(m['curve'] if len(m['curve']) else m['points'])
+            for x, y in (W if W is not None else []):
+                iw.add_dot(x, y)
+            for P in (W.reshape(-1, 2, 2) if W is not None else []):
+                iw.add_polyline(P)
+        for m in record['areas']:
+            self.areaNames.append(m['name'])
+            iw.areaValues = np.append(iw.areaValues, m['area'])
+            iw.areaPoints.append(np.array(m['points']))
+            iw.add_polyline(m['points'], closed = True)
+        for m in record['angles']:
+            self.angleNames.append(m['name'])
+            iw.angleValues = np.append(iw.angleValues, m['angle'])
+            iw.anglePoints.append(np.array(m['points']))
+            iw.add_polyline(m['points'])
+
+    def read_calibration(self, path):
+        """Fill in the camera details found in the image's EXIF/XMP metadata, returns them"""
+        try:
+            cal = image_calibration(path)
+        except Exception: #unreadable header or cache; keep the values already entered
+            return {}
+        for k, v in cal.items():
+            getattr(self.subWin, k).setText('{:.6g}'.format(v))
+        return cal
+
+    def start_session(self, paths):
+
+        if self.prefetcher:
+            self.prefetcher.close()
+        self.prefetcher = ImagePrefetcher(paths, tile_threshold = self.iw.tile_threshold,
+                                          view_size = self.iw.viewport().size())
+        self.show_image(0)
+
+    def next_image(self):
+        if self.prefetcher and self.session_index + 1 < len(self.prefetcher):
+            self.show_image(self.session_index + 1)
+
+    def previous_image(self):
+        if self.prefetcher and self.session_index > 0:
+            self.show_image(self.session_index - 1)
+
+    def show_image(self, index):
+
+        try:
+            image = self.prefetcher.get(index)
+        except IOError as err:
+            self.statusbar.showMessage(str(err))
+            return
+        self.session_index = index
+        self.prefetcher.prefetch(index) #decode the next frames while this one is measured
+        self.prevImage.setEnabled(index > 0)
+        self.nextImage.setEnabled(index + 1 < len(self.prefetcher))
+
+        self.image_name = (self.prefetcher.paths[index], '')
+        cal = self.read_calibration(self.image_name[0])
         self.iw.scene.clear()
-        self.image_name = QFileDialog.getOpenFileName(self, 'Open File')
-        self.iw.pixmap = QtGui.QPixmap(self.image_name[0])
-        self.iw.pixmap_fit = self.iw.pixmap.scaled(
-            self.iw.pixmap.width(),
-            self.iw.pixmap.height(),
-            QtCore.Qt.AspectRatioMode.KeepAspectRatio,
-            transformMode=QtCore.Qt.TransformationMode.SmoothTransformation)
-        self.iw.scene.addPixmap(self.iw.pixmap_fit)  #add image
+        if isinstance(image, TilePyramid):
+            #very large frames: decode visible tiles at the current zoom only
+            self.iw.pixmap = None
+            self.iw.image = TiledImageItem(image)
+            self.iw.scene.addItem(self.iw.image)
+        else:
+            self.iw.pixmap = QtGui.QPixmap.fromImage(image)
+            self.iw.image = self.iw.scene.addPixmap(self.iw.pixmap)  #add image
+        self.iw.scene.setSceneRect(self.iw.image.boundingRect())
         self.iw.setScene(self.iw.scene)
 
         #Adjust window size automatically?
         self.iw.fitInView(self.iw.scene.sceneRect(), QtCore.Qt.AspectRatioMode.KeepAspectRatio)
         self.iw.scene.update()
-        self.statusbar.showMessage('Select a measurement to make from the toolbar')
+        self.statusbar.showMessage('Image {} of {}: {}{}. Select a measurement to make from the toolbar'.format(
+            index + 1, len(self.prefetcher), os.path.basename(self.image_name[0]),
+            ' ({} from image metadata)'.format(', '.join(cal)) if cal else ''))
 
         self.lengthButton.setEnabled(True)
         self.areaButton.setEnabled(True)
@@ -276,7 +451,11 @@ class MainWindow(QMainWindow):
         self.lengthNames = []
         #self.iw.measurements = [[]]
         self.iw.widths = []
+        self.iw.widthNames = []
         self.iw.lengths = [[]]
+        self.iw.lengthData = []
+        self.iw.areaPoints = []
+        self.iw.anglePoints = []
         self.iw.L = posData(
             np.empty(shape=(0, 0)), np.empty(shape=(0, 0)))  #lengths
         self.iw.A = posData(
@@ -294,15 +473,16 @@ class MainWindow(QMainWindow):
         self.iw.measuring_angle = False
         self.iw._zoom = 0
         self.iw.factor = 1.0
-        self.iw.d = {}  #dictionary for line items
+        self.iw.guides = []
+        self.iw.proposal = None
+        self.iw.corrections = []
         self.iw.k = 0  #initialize counter so lines turn yellow
         self.iw.m = None
-        self.iw.scene.realline = None
-        self.iw.scene.testline = None
+        self.iw.lines = []
         self.iw.scene.ellipseItem = None
-        self.iw.scene.area_ellipseItem = None
-        self.iw.scene.polyItem = None
+        self.iw.init_preview()
         self.iw.image_name = None
+        self.lens = {} #calibration model parameters beyond the input fields, from a reopened session
 
     def measure_length(self):
 
@@ -312,12 +492,13 @@ class MainWindow(QMainWindow):
 
         if ok:
             self.lel.setText(str(text))
-            self.lengthNames.append(self.lel.text())
-            QApplication.setOverrideCursor(QtCore.Qt.CursorShape.CrossCursor)  #change cursor
+            self.lengthNames.append(unique_name(self.lel.text(), self.lengthNames)) #names key the exports
+            self.iw.set_cursor(QtCore.Qt.CursorShape.CrossCursor)  #change cursor
             self.widthsButton.setChecked(False)
             self.widthsButton.setEnabled(False)
             self.iw.line_count = 0
             self.iw.measuring_length = True
+            self.iw.lines = []
             self.iw.L = posData(
                 np.empty(shape=(0, 0)),
                 np.empty(shape=(0, 0)))  #preallocate
@@ -335,10 +516,11 @@ class MainWindow(QMainWindow):
 
         if ok:
             self.lea.setText(str(text))
-            self.angleNames.append(self.lea.text())
-            QApplication.setOverrideCursor(QtCore.Qt.CrossCursor)  #change cursor
+            self.angleNames.append(unique_name(self.lea.text(), self.angleNames))
+            self.iw.set_cursor(QtCore.Qt.CursorShape.CrossCursor)  #change cursor
             self.bezier.setEnabled(False)
             self.iw.measuring_angle = True
+            self.iw.lines = []
             self.iw._lastpos = None
             self.iw._thispos = None
             self.statusbar.showMessage('Click initial point for angle measurement')
@@ -353,11 +535,13 @@ class MainWindow(QMainWindow):
 
         if ok:
             self.lea.setText(str(text))
-            self.areaNames.append(self.lea.text())
-            QApplication.setOverrideCursor(QtCore.Qt.CrossCursor)  #change cursor
+            self.areaNames.append(unique_name(self.lea.text(), self.areaNames))
+            self.iw.set_cursor(QtCore.Qt.CursorShape.CrossCursor)  #change cursor
             self.bezier.setEnabled(False)
             self.iw.line_count = 0
             self.iw.measuring_area = True
+            self.iw.lines = []
+            self.iw.areaPolygon = QtGui.QPolygonF()
             self.iw._lastpos = None
             self.iw._thispos = None
             self.iw.A = posData(
@@ -370,38 +554,68 @@ class MainWindow(QMainWindow):
     def undo(self):
 
         if self.iw.measuring_length:
-            self.iw._thispos = self.iw._lastpos
             self.iw.L.downdate()  #remove data
             self.iw.line_count += -1
-            self.iw.scene.removeItem(self.iw.scene.realline)  #remove graphic
-            self.iw.scene.realline = False
+            self.iw.remove_last_line()  #remove graphic
+            self.iw._thispos = QtCore.QPointF(self.iw.L.x[-1], self.iw.L.y[-1]) if len(self.iw.L) else None
 
         if self.iw.measuring_area:
-            self.iw._thispos = self.iw._lastpos
             self.iw.A.downdate()  #remove data
+            if len(self.iw.areaPolygon):
+                self.iw.areaPolygon.remove(len(self.iw.areaPolygon) - 1)
             self.iw.line_count += -1
-            self.iw.scene.removeItem(self.iw.scene.realline)  #remove graphic
-            self.iw.scene.realline = False
+            self.iw.remove_last_line()  #remove graphic
+            self.iw._thispos = QtCore.QPointF(self.iw.A.x[-1], self.iw.A.y[-1]) if len(self.iw.A) else None
+
+        if self.iw.measuring_widths and self.iw.proposal is not None:
+            if self.iw.corrections: #put the last corrected point back
+                i, (x, y), pen = self.iw.corrections.pop()
+                self.iw.move_proposal(i, x, y, pen)
 
-        if self.iw.measuring_widths:
+        elif self.iw.measuring_widths:
             self.iw.W.downdate()  #remove data
             self.iw.scene.removeItem(self.iw.scene.ellipseItem)  #remove graphic
             self.iw.scene.ellipseItem = False
-            self.iw.d[str(self.iw.k)].setPen(
+            self.iw.guides[self.iw.k].setPen(
                 QtGui.QPen(QtGui.QColor('black')))  #un-highlight next spine
             self.iw.k += -1  #reduce count
 
         if self.iw.measuring_angle:
             self.iw.T.downdate()  #remove data
-            self.iw._thispos = self.iw_lastpos
-            self.iw.scene.removeItem(self.iw.scene.realline)  #remove graphic
-            self.iw.scene.realline = False
+            self.iw._thispos = self.iw._lastpos
+            self.iw.remove_last_line()  #remove graphic
+
+    def calibration(self):
+        return dict(self.lens, focal = float(self.subWin.focal.text()),
+                    altitude = float(self.subWin.altitude.text()),
+                    pixeldim = float(self.subWin.pixeldim.text()))
+
+    def readout(self, value, kind):
+        """Pixel measurement formatted in calibrated units, as pixels while the input fields don't parse"""
+        units = {'length': ' m', 'area': ' m²', 'angle': '°'}
+        try:
+            rect = self.iw.image.boundingRect()
+            model = calibration_model(self.calibration(), {'width': rect.width(), 'height': rect.height()})
+        except ValueError:
+            return '{:.1f} px{}'.format(value, '²' if kind == 'area' else '')
+        value = float(model.convert(value, exponents[kind]))
+        return '{:.{}f}{}'.format(value, 1 if kind == 'angle' else 3 if kind == 'area' else 2, units[kind])
+
+    def annotations(self):
+        """Raw pixel geometry and calibration of the current image, see morphometrix.core.measure"""
+        return {
+            'image': {'id': self.subWin.id.text(), 'path': self.image_name[0],
+                      'width': self.iw.image.boundingRect().width(),
+                      'height': self.iw.image.boundingRect().height()},
+            'calibration': self.calibration(),
+            'notes': self.subWin.notes.toPlainText(),
+            'lengths': [dict(m, name = n) for n, m in zip(self.lengthNames, self.iw.lengthData)],
+            'areas': [{'name': n, 'points': P} for n, P in zip(self.areaNames, self.iw.areaPoints)],
+            'angles': [{'name': n, 'points': P} for n, P in zip(self.angleNames, self.iw.anglePoints)],
+        }
 
     def export_measurements(self):
 
-        fac = max(self.iw.pixmap.width(), self.iw.pixmap.height()) / max(
-            self.iw.pixmap_fit.width(),
-            self.iw.pixmap_fit.height())  #scale pixel -> m by scaled image
         name = QFileDialog.getSaveFileName(
             self, 'Save File', self.image_name[0].split('.', 1)[0])[0]
         self.pixeldim = float(self.subWin.pixeldim.text())
@@ -410,12 +624,17 @@ class MainWindow(QMainWindow):
         #okay in mm https://www.imaging-resource.com/PRODS/sony-a5100/sony-a5100DAT.HTM
         if name:
 
-            #Convert pixels to meters
-            #measurements = [ f * fac * self.pixeldim * self.altitude / self.focal for f in self.iw.measurements]
-            #lengths = [ f * fac * self.pixeldim * self.altitude / self.focal for f in self.iw.lengths]
-            #print(self.iw.widths)
-            areas = self.iw.areaValues * (
-                fac * self.pixeldim * self.altitude / self.focal)**2
+            #Convert pixels to meters, one array per kind of measurement
+            record = self.annotations()
+            cal = calibration_model(record['calibration'], record['image'])
+            if cal.distorts: #lens model of a reopened session, measure the corrected points
+                lengths, widths, areas, angles = self.corrected_pixels(cal)
+            else:
+                lengths = [l if np.size(l) else np.nan for l in self.iw.lengths[:len(self.lengthNames)]]
+                widths, areas, angles = self.iw.widths, self.iw.areaValues, self.iw.angleValues
+            lengths = cal.convert(lengths)
+            widths = [cal.convert(w) if np.size(w) else w for w in widths]
+            areas = cal.convert(areas, 2)
             values_optical = np.array([
                 self.subWin.id.text(), self.image_name[0], self.focal,
                 self.altitude, self.pixeldim
@@ -427,52 +646,81 @@ class MainWindow(QMainWindow):
             names_widths = ['Object'] +  ['Length (m)'] + ['Widths (%)'] # + self.iw.widthNames[0]
             #names_widths.append([self.iw.widthNames[0]])
 
-	    #Write .csv file
+	    #Rows for the .csv file
             print(f"Writing {name} to file")
-            with open(name + '.csv', 'w') as csvfile:
-                writer = csv.writer(csvfile)
-                for (f, g) in zip(names_optical, values_optical):
-                    writer.writerow([f, g])
-                writer.writerow(['Notes', self.subWin.notes.toPlainText()])
-
-                writer.writerow([''])
-                writer.writerow(names_widths)
-
-                for k,m in enumerate(self.lengthNames):
-                    #format and convert pixel length measurement
-                    l =  "{0:.2f}".format( self.iw.lengths[k] * fac * self.pixeldim * self.altitude / self.focal )
-
-                    if any(self.iw.widths[k]): #check if width measurement exists for length
-                        n = self.iw.widthNames[k]
-                        writer.writerow( [''] + [''] + n )
-                        #format and convert pixel width measurement
-                        vals = [ "{0:.2f}".format(g * fac * self.pixeldim * self.altitude / self.focal) for g in self.iw.widths[k]]
-                        line = [m] + [l] + list(vals)
-                    else:
-                        #vals = l #f.copy()
-                        line = [m] + [l]
-
-                    writer.writerow(line)
-
-                writer.writerow([''])
-                writer.writerow(['Object'] + ['Angle'])
-
-                for k, f in enumerate(self.angleNames):  #write angles
-                    line = [[f] + ["{0:.3f}".format(self.iw.angleValues[k])]]  #need to convert NaNs to empty
-                    writer.writerows(line)
-
-                writer.writerow([''])
-                writer.writerow(['Object'] + ['Area (m\u00B2)'])
-
-                for k, f in enumerate(self.areaNames):  #write areas
-                    line = [[f] + ["{0:.3f}".format(areas[k])]]  #need to convert NaNs to empty
-                    writer.writerows(line)
-
-            #Export image
-            self.iw.fitInView(self.iw.scene.sceneRect(), QtCore.Qt.AspectRatioMode.KeepAspectRatio)
-            pix = QtGui.QPixmap(self.iw.viewport().size())
-            self.iw.viewport().render(pix)
-            pix.save(name + '-measurements.png')
+            rows = []
+            for (f, g) in zip(names_optical, values_optical):
+                rows.append([f, g])
+            rows.append(['Notes', self.subWin.notes.toPlainText()])
+
+            rows.append([''])
+            rows.append(names_widths)
+
+            for k,m in enumerate(self.lengthNames):
+                #format and convert pixel length measurement
+                l =  "{0:.2f}".format(lengths[k])
+
+                if any(self.iw.widths[k]): #check if width measurement exists for length
+                    n = self.iw.widthNames[k]
+                    rows.append( [''] + [''] + n )
+                    #format and convert pixel width measurement
+                    vals = [ "{0:.2f}".format(g) for g in widths[k]]
+                    line = [m] + [l] + list(vals)
+                else:
+                    #vals = l #f.copy()
+                    line = [m] + [l]
+
+                rows.append(line)
+
+            rows.append([''])
+            rows.append(['Object'] + ['Angle'])
+
+            for k, f in enumerate(self.angleNames):  #write angles
+                line = [[f] + ["{0:.3f}".format(angles[k])]]  #need to convert NaNs to empty
+                rows.extend(line)
+
+            rows.append([''])
+            rows.append(['Object'] + ['Area (m\u00B2)'])
+
+            for k, f in enumerate(self.areaNames):  #write areas
+                line = [[f] + ["{0:.3f}".format(areas[k])]]  #need to convert NaNs to empty
+                rows.extend(line)
+
+            #Measurement graphics at image resolution, composited onto the frame off the GUI thread
+            rect = self.iw.scene.sceneRect()
+            size = export_size(rect.width(), rect.height(), self.export_scale)
+            overlay = render_overlay(self.iw.scene, rect, size, hide = [self.iw.image])
+
+            self.export_future = self.exporter.submit(write_export, name, rows, record,
+                                                      overlay, self.subWin.dataset.text().strip())
+            self.export_future.add_done_callback(self.export_done)
+            self.statusbar.showMessage(f'Exporting {os.path.basename(name)}...')
+
+    def corrected_pixels(self, cal):
+        """Pixel lengths, widths, areas and angles re-derived from lens corrected points"""
+        iw = self.iw
+        lengths = [fit_length(cal.undistort(m['points']), m['bezier'], m.get('max_degree'))[1].length
+                   for m in iw.lengthData]
+        widths = [widths_from_points(cal.undistort(m['widths'])) if m['widths'] is not None else []
+                  for m in iw.lengthData]
+        pending = len(self.lengthNames) - len(lengths) #a length still being drawn
+        areas = [polygon_area(*cal.undistort(P).T) for P in iw.areaPoints]
+        angles = [angle(*cal.undistort(P)) for P in iw.anglePoints]
+        return lengths + [np.nan] * pending, widths + [[]] * pending, np.array(areas), angles
+
+    def export_done(self, future):
+        #runs on the export thread, the signal hands the message to the GUI thread
+        try:
+            name = future.result()
+        except Exception as err:
+            self.export_finished.emit(f'Export failed: {type(err).__name__}: {err}')
+        else:
+            self.export_finished.emit(f'Exported {os.path.basename(name)}')
+
+    def closeEvent(self, event):
+        self.exporter.shutdown(wait = True) #let pending exports finish writing
+        super(MainWindow, self).closeEvent(event)
+
 
 class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
     def __init__(self, parent=None):
@@ -481,6 +729,8 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
         self.view = QGraphicsView(self.scene)
 
         self.pixmap = None
+        self.image = None #scene item showing the image
+        self.tile_threshold = 24e6 #pixels, larger images are shown from a tile pyramid
         self._lastpos = None
         self._thispos = None
         self.delta = QtCore.QPointF(0, 0)
@@ -494,13 +744,26 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
         self.oldPos = None
         self.factor = 1.0
         self.numwidths = None
+        self.reach = None #width line reach either side of the curve, pixels
         self.widthNames = [] #initialize as empty list
-        self.d = {}  #dictionary for line items
+        self.lengthData = [] #raw clicked geometry for each measurement
+        self.areaPoints = []
+        self.anglePoints = []
+        self.guides = [] #width line items of the current width measurement, one per point to place
+        self.proposal = None #width points pre-placed from image edges, see propose_widths
+        self.proposal_dots = []
+        self.corrections = [] #(index, previous point, previous pen) for undo
         #self.k = 0 #initialize counter so lines turn yellow
         self.L = posData(np.empty(shape=(0, 0)), np.empty(shape=(0, 0)))
         self.W = posData(np.empty(shape=(0, 0)), np.empty(shape=(0, 0)))
-        self.scene.realline = None
-        self.scene.testline = None
+        self.lines = [] #straight segments drawn by clicks of the current measurement
+        self.areaPolygon = QtGui.QPolygonF() #area vertices, kept in step with self.A
+        self._cursor = None
+        self._preview_timer = QtCore.QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(16) #~one preview update per display frame
+        self._preview_timer.timeout.connect(self.preview_timeout)
+        self.init_preview()
         self.setMouseTracking(True)
         self.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
@@ -512,91 +775,147 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
         self.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
         self.setInteractive(False)
     
-    def qpt2pt(self, x, y):
-        Q = self.mapFromScene( self.mapToScene( int(x), int(y)) )
-        return Q.x(), Q.y()
-
     def keyPressEvent(self, event):  #shift modifier for panning
         if event.key() == QtCore.Qt.Key.Key_Shift:
             pos = QtGui.QCursor.pos()
             self.oldPos = self.mapToScene(self.mapFromGlobal(pos))
 
+    def set_cursor(self, shape):
+        """One override cursor changed in place, so mouse moves can't grow Qt's cursor stack"""
+        if shape == self._cursor:
+            return
+        if QApplication.overrideCursor() is None:
+            QApplication.setOverrideCursor(shape)
+        else:
+            QApplication.changeOverrideCursor(shape)
+        self._cursor = shape
+
+    def init_preview(self):
+        """Rubber band items reused on every mouse move, (re)created after scene.clear()"""
+        self.scene.testline = QGraphicsLineItem()
+        self.scene.area_ellipseItem = QGraphicsEllipseItem(0, 0, 10, 10) #intersect point
+        self.scene.area_ellipseItem.setBrush(QtGui.QBrush(QtGui.QColor('blue')))
+        self.scene.polyItem = QGraphicsPolygonItem() #shaded region closed by intersect
+        self.scene.polyItem.setBrush( QtGui.QBrush(QtGui.QColor(255,255,255,127)) )
+        for item in (self.scene.testline, self.scene.area_ellipseItem, self.scene.polyItem):
+            item.hide()
+            self.scene.addItem(item)
+        self._pending = None
+
+    def hide_preview(self):
+        for item in (self.scene.testline, self.scene.area_ellipseItem, self.scene.polyItem):
+            item.hide()
+
+    def add_polyline(self, points, closed = False):
+        """Stored geometry as one path item (closed polygons shaded like a finished area)"""
+        polygon = QtGui.QPolygonF([QtCore.QPointF(x, y) for x, y in points])
+        if closed:
+            item = QGraphicsPolygonItem(polygon)
+            item.setBrush(QtGui.QBrush(QtGui.QColor(255,255,255,127)))
+            self.scene.addItem(item)
+        else:
+            path = QtGui.QPainterPath()
+            path.addPolygon(polygon)
+            item = self.scene.addPath(path)
+        return item
+
+    def add_dot(self, x, y, s = 10):
+        item = QGraphicsEllipseItem(0, 0, s, s)
+        item.setPos(x - s / 2, y - s / 2)
+        self.scene.addItem(item)
+        return item
+
+    def remove_last_line(self):
+        if self.lines:
+            self.scene.removeItem(self.lines.pop())
+
     def mouseMoveEvent(self, event):
         data = self.mapToScene(event.position().toPoint())
         rules = [self.measuring_length, self.measuring_angle, self.measuring_area]
 
         modifiers = QApplication.keyboardModifiers()
         if modifiers == QtCore.Qt.KeyboardModifier.ShiftModifier and self.oldPos:
-            QApplication.setOverrideCursor(QtCore.Qt.CursorShape.OpenHandCursor)
+            self.set_cursor(QtCore.Qt.CursorShape.OpenHandCursor)
             self.newPos = data
             delta = self.newPos - self.oldPos
             self.translate(delta.x(), delta.y())
         elif (any(rules) or self.measuring_widths):
-            QApplication.setOverrideCursor(QtCore.Qt.CursorShape.CrossCursor)  #change cursor
+            self.set_cursor(QtCore.Qt.CursorShape.CrossCursor)  #change cursor
         else:
-            QApplication.setOverrideCursor(QtCore.Qt.CursorShape.ArrowCursor)  #change cursor   
+            self.set_cursor(QtCore.Qt.CursorShape.ArrowCursor)  #change cursor
+
+        #coalesce moves: draw now, then at most once per frame with the latest position
+        self._pending = QtCore.QPointF(data)
+        if not self._preview_timer.isActive():
+            self.update_preview()
+            self._preview_timer.start()
+
+    def preview_timeout(self):
+        if self._pending is not None:
+            self.update_preview()
+            self._preview_timer.start()
+
+    def update_preview(self):
+        data, self._pending = self._pending, None
+        rules = [self.measuring_length, self.measuring_angle, self.measuring_area]
 
         #dragging line
-        if self._thispos and any(rules):
+        if data is not None and self._thispos and any(rules):
             if self.measuring_length:
-                self.parent().statusbar.showMessage(
-                    'Click to place next point... double click to finish')
+                msg = 'Click to place next point... double click to finish'
             if self.measuring_area:
-                self.parent().statusbar.showMessage(
-                    'Click to place next point... close polygon to finish')
+                msg = 'Click to place next point... close polygon to finish'
             if self.measuring_angle:
-                self.parent().statusbar.showMessage(
-                    'Click point to define vector')
-
-            end = QtCore.QPointF(data)#self.mapToScene(event.pos()))
-            start = self._thispos
-
-            if self.measuring_angle and self._lastpos:
-                start = self._thispos
-
-            if self.scene.testline:  #remove old line
-                self.scene.removeItem(self.scene.testline)
-                self.scene.testline = False
+                msg = 'Click point to define vector'
 
             if self.measuring_area and self.line_count > 2:
                 intersect, xi, yi, k = self.A.checkIntersect(data.x(),data.y())
-                if self.scene.area_ellipseItem: #remove existing intersect
-                    self.scene.removeItem(self.scene.area_ellipseItem)
-                    self.scene.area_ellipseItem = False
-                if self.scene.polyItem:
-                    self.scene.removeItem(self.scene.polyItem)
-                    self.scene.polyItem = False
                 if intersect:
-                    #indicate intersect point
-                    p = QtCore.QPointF(xi, yi)
-                    self.scene.area_ellipseItem = QGraphicsEllipseItem(0, 0, 10, 10)
-                    self.scene.area_ellipseItem.setPos(p.x() - 10 / 2, p.y() - 10 / 2)
-                    self.scene.area_ellipseItem.setBrush(
-                    QtGui.QBrush(QtCore.QtColor('blue'))) #, style=QtCore.Qt.BrushStyle.SolidPattern))
-                    self.scene.area_ellipseItem.setFlag(
-                    QGraphicsItem.GraphicsItemFlag.ItemIgnoresTransformations,
-                    False)  #size stays small, but doesnt translate if set to false
-                    self.scene.addItem(self.scene.area_ellipseItem)
-                    #shade polygon region
-                    points = [ QtCore.QPointF(x,y) for x,y in zip( self.A.x[k:], self.A.y[k:] ) ]
-                    points.append(QtCore.QPointF(xi,yi))
-                    self.scene.polyItem = QGraphicsPolygonItem(QtGui.QPolygonF(points))
-                    self.scene.polyItem.setBrush( QtGui.QBrush(QtGui.QColor(255,255,255,127)) )
-                    self.scene.addItem(self.scene.polyItem)
-
-            self.scene.testline = QGraphicsLineItem(QtCore.QLineF(start, end))
-            self.scene.addItem(self.scene.testline)
+                    #indicate intersect point and shade polygon region
+                    self.scene.area_ellipseItem.setPos(xi - 10 / 2, yi - 10 / 2)
+                    poly = self.areaPolygon[int(k):]
+                    poly.append(QtCore.QPointF(xi, yi))
+                    self.scene.polyItem.setPolygon(poly)
+                    self._closing = (xi, yi, int(k))
+                self.scene.area_ellipseItem.setVisible(intersect)
+                self.scene.polyItem.setVisible(intersect)
+
+            live = self.live_value(data) #after the intersect test, which decides where an area closes
+            if live:
+                msg = '{}   {} {}'.format(msg, live[0], self.parent().readout(*live[1:]))
+            if self.parent().statusbar.currentMessage() != msg:
+                self.parent().statusbar.showMessage(msg)
+
+            self.scene.testline.setLine(QtCore.QLineF(self._thispos, data))
+            self.scene.testline.show()
+
+    def live_value(self, p):
+        """
+        (label, pixel value, kind) of the measurement in progress with the cursor at
+        p as its next point, from running sums so the cost doesn't grow with the
+        points placed. None when there is nothing to show yet.
+        """
+        x, y = p.x(), p.y()
+        if self.measuring_length and len(self.L):
+            if self.parent().bezier.isChecked():
+                return 'traced length', self.L.traced_length(x, y), 'length' #the fitted curve is a little shorter
+            return 'length', np.hypot(x - self.L.x[0], y - self.L.y[0]), 'length' #piecewise runs first to last point
+        if self.measuring_area and len(self.A) > 1:
+            if self.scene.polyItem.isVisible(): #closes at the shaded intersect
+                return 'area', self.A.closed_area(*self._closing), 'area'
+            return 'area', self.A.closed_area(x, y), 'area'
+        if self.measuring_angle and self._lastpos:
+            return 'angle', angle((self._lastpos.x(), self._lastpos.y()), (self._thispos.x(), self._thispos.y()), (x, y)), 'angle'
+        return None
 
     def mouseDoubleClickEvent(self, event):
 
         #only delete lines if bezier fit
         if self.measuring_length and self.parent().bezier.isChecked() and (len(np.vstack((self.L.x, self.L.y)).T) > 2):
             self.parent().statusbar.showMessage('Length measurement complete.')
-            #Remove most recent items drawn (exact lines)
-            nl = self.line_count
-            for k, i in enumerate(self.scene.items()):
-                if k < nl:
-                    self.scene.removeItem(i) #set item to false?
+            #Remove straight lines drawn between the clicked points
+            while self.lines:
+                self.remove_last_line()
 
         if self._lastpos and self.measuring_length:
             # catmull roms spline instead?
@@ -630,37 +949,20 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
                     # m *= (1/np.linalg.norm(m, axis=0))
                     # return xb, yb, m
 
-                nt = 100 #max(1000, self.numwidths * 50)  #num of interpolating points
-                t = np.linspace(0.0, 1.0, nt)
                 self.P = np.vstack((self.L.x, self.L.y)).T #control points
                 self.kb = len(self.P) - 1 #order of bezier curve # of control points (n) - 1
+                self.curve, self.arc = fit_length(self.P) #arc length table reused for width stations
                 
                 # self.xs, self.ys, self.m = bezier_rational(points, nt)
-                B = bezier(t, self.P, k = self.kb) #evaluate bezier curve along t
-                self.Q = self.kb*np.diff(self.P, axis = 0)
-                self.l = gauss_legendre(b = 1, f = bezier, P = self.Q, k = self.kb - 1, arc = True) #compute total arc length. 
+                self.l = self.arc.length #compute total arc length
                 self.lengths[-1] = self.l
 
-                self.xs, self.ys = B[:,0], B[:,1]
-                pts = np.array(list(map(self.qpt2pt, self.xs, self.ys)))
-                #x, y = pts[:, 0], pts[:, 1]
-                #self.l = np.cumsum(np.hypot(np.gradient(x), np.gradient(y))) #integrate for length
-
-                #draw cubic line to interpolated points
-                for i in range(1, nt - 1):
-                    P0 = QtCore.QPointF( self.xs[i-1], self.ys[i-1] )#.toPoint()
-                    P1 = QtCore.QPointF( self.xs[i  ], self.ys[i  ] )#.toPoint()
-                    P2 = QtCore.QPointF( self.xs[i+1], self.ys[i+1] )#.toPoint() 
-                    start = self.mapFromScene(self.mapToScene(P0.toPoint()))
-                    mid = self.mapFromScene(self.mapToScene(P1.toPoint())) 
-                    end = self.mapFromScene(self.mapToScene(P2.toPoint()))
-                    path = QtGui.QPainterPath(P0)
-                    path.cubicTo(P0, P1, P2)
-                    self.scene.addPath(path)
+                #one item per curve, tessellated to the zoom level when painted
+                self.scene.addItem(CurveItem(self.curve))
 
             if (not self.parent().bezier.isChecked()) or (len(np.vstack((self.L.x, self.L.y)).T) <= 2):
                 """Simple linear points if piecewise mode (or only two points used?)"""
-                pts = np.array(list(map(self.qpt2pt, self.L.x, self.L.y)))
+                pts = np.vstack((self.L.x, self.L.y)).T
                 x, y = pts[:, 0], pts[:, 1]
                 slope = (y[-1] - y[0]) / (x[-1] - x[0])
                 theta = np.arctan(slope)
@@ -673,12 +975,19 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
                 self.m = np.vstack((  (x[-1] - x[0])*(r*0 + 1), (y[-1] - y[0])*(r*0 + 1) ))
                 self.l = np.cumsum(np.hypot(np.diff(self.xs), np.diff(self.ys)))  #integrate for length
                 self.lengths[-1] = self.l[-1]
+                self.curve, self.arc = fit_length(pts, bezier = False) #straight segment for width stations
 
             self.lengths.extend([np.nan])
             self.widths.append([])
             self.widthNames.append([])
-
-        QApplication.setOverrideCursor(QtCore.Qt.CursorShape.ArrowCursor)  #change cursor
+            self.lengthData.append({'points': np.vstack((self.L.x, self.L.y)).T,
+                                    'bezier': self.parent().bezier.isChecked(),
+                                    'numwidths': None, 'widths': None}) #raw geometry for re-measuring
+            self.parent().statusbar.showMessage('Length measurement complete: {}'.format(
+                self.parent().readout(self.lengths[-2], 'length')))
+
+        self.hide_preview()
+        self.set_cursor(QtCore.Qt.CursorShape.ArrowCursor)  #change cursor
         if self.parent().bezier.isChecked() or (len(np.vstack((self.L.x, self.L.y)).T) <= 2):
             #measure widths possible if bezier or if single piecewise segment
             self.parent().widthsButton.setEnabled(True)
@@ -695,17 +1004,14 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
                 self.measuring_area = False
                 A = self.A.calcArea()
                 self.areaValues = np.append(self.areaValues, A) #add area values
+                self.areaPoints.append(np.vstack((self.A.x, self.A.y)).T)
                 #draw permanent polygon
-                points = [ QtCore.QPointF(x,y) for x,y in zip( self.A.x, self.A.y ) ]
-                self.scene.polyItem2 = QGraphicsPolygonItem(QtGui.QPolygonF(points))
+                self.scene.polyItem2 = QGraphicsPolygonItem(self.areaPolygon)
                 self.scene.polyItem2.setBrush( QtGui.QBrush(QtGui.QColor(255,255,255,127)) )
-                if self.scene.polyItem:
-                    self.scene.removeItem(self.scene.polyItem) #remove mouseover polygon
-                    self.scene.polyItem = False #remove mouseover polygon
-                self.scene.removeItem(self.scene.testline)
-                self.scene.testline = False
+                self.hide_preview() #mouseover polygon and line
                 self.scene.addItem(self.scene.polyItem2) #shade in polygon
-                self.parent().statusbar.showMessage('Polygon area measurement completed')
+                self.parent().statusbar.showMessage('Polygon area measurement completed: {}'.format(
+                    self.parent().readout(A, 'area')))
                 self.parent().areaButton.setChecked(False)
                 self.parent().bezier.setEnabled(True) #make bezier fit available again
             else:
@@ -717,14 +1023,12 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
         self.parent().widthsButton.setChecked(True)
         self.numwidths = int(self.parent().subWin.numwidths.text())
         self.k = 0
+        self.proposal = None
         self.W = posData(
             np.empty(shape=(0, 0)),
             np.empty(shape=(0, 0)))  #preallocate custom widths
         self.widths[-1] = np.empty(self.numwidths - 1, dtype='float') #preallocate measurements
-        self.widthNames[-1] = [
-            '{0:2.2f}% Width'.format(100 * f / self.numwidths)
-            for f in np.arange(1, self.numwidths)
-        ]
+        self.widthNames[-1] = width_names(self.numwidths)
         self.nspines = 2 * (self.numwidths) #- 1)
         self.parent().statusbar.showMessage(
             'Click point along spines to make width measurements perpindicular to the length segment'
@@ -741,108 +1045,137 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
         # self.slopes = self.m[:,self.inddec]    
         # #Identify width spine points
 
-        #Bisection method on Gauss-Legendre Quadrature to find equal spaced intervals
-        s_i = np.linspace(0,1,self.numwidths+2)[1:-1] #only need to draw widths for inner pts
-        t_i = np.array([root_scalar(gauss_legendre, x0 = s_i, bracket = [-1,1], method = "bisect", 
-                            args = (bezier, self.Q, self.kb-1, True, s, self.l) ).root for s in s_i])
-        B_i = bezier(np.array(t_i), P = self.P, k = self.kb)
+        #Invert arc length table to find equal spaced intervals, normals at each station
+        B_i, bnorm = width_stations(self.curve, self.arc, self.numwidths)
         self.xp, self.yp = B_i[:,0], B_i[:,1]
-
-        #Find normal vectors by applying pi/2 rotation matrix to tangent vector
-        bdot = bezier(t_i, P = self.Q, k = self.kb - 1)
-        mag = np.linalg.norm(bdot,axis = 1) #normal vector magnitude
-        bnorm = np.flip(bdot/mag[:,None],axis = 1) 
-        bnorm[:,0] *= -1
         self.slopes = bnorm
 
-        for k,(pt,m) in enumerate(zip(B_i,bnorm)):
-        #for k,(x,y) in enumerate(zip(self.xp[1:-1], self.yp[1:-1])):
-            x1, y1 = pt[0],pt[1]
-            vx, vy = m[0], m[1]
-            L = self.pixmap_fit.width()
-            H = self.pixmap_fit.height()
-            # t2 = 0
-            # t0 = np.hypot(L,H) #preallocate t0 as diagonal distance
-
-            # #check intersection w/ bounding rectangle
-            # for offset in ([0,0],[L,H]):
-            #     for ev in ([1,0],[0,1]):
-            #         A = np.matrix([ [vx, ev[0]] , [vy, ev[1]] ])
-            #         b = np.array([offset[0] - x1, offset[1] - y1])
-            #         T = np.linalg.solve(A,b)[0]
-            #         t0 = min(T, t0, key=abs) #find nearest intersection to bounds
-
-            xi,yi = [], []
-            for bound in ([0,0],[L,H]):
-                for ev in ([1,0],[0,1]):
-                    A = np.matrix([ [vx, ev[0]] , [vy, ev[1]] ])
-                    b = np.array([bound[0] - x1, bound[1] - y1])
-                    T = np.linalg.solve(A,b)[0] #only need parametric value for our vector, not bound vector
-                    #t0 = min(T, t0, key=abs) #find nearest intersection to bounds
-
-                    xint = x1 + T*vx
-                    yint = y1 + T*vy
-                    print( f"for line {k}, sol to Ax = B is {T}")
-                    if ( (xint<=L + 1) and (xint>=0-1) and (yint<=H+1) and (yint>=0-1) ): #only add intersect if conditions met. 
-                        #1 pixel fudge factor required?
-                        print("success")
-                        xi.append(xint)
-                        yi.append(yint)
-            #assert False
-            # #Find 2nd furthest intersection within bounds
-            # bounds = np.array( [(L - x1)/vx, (H - y1)/vy, -x1/vx, -y1/vy] )
-            # t2 = max(-t0, np.sign(-t0)* np.partition(bounds,-2)[-2], key=abs)
-
-            # x0 = x1 + t0*vx
-            # y0 = y1 + t0*vy
-            # x2 = x1 + t2*vx
-            # y2 = y1 + t2*vy
-
-            # for l, (x, y) in enumerate(zip([x0, x2], [y0, y2])):
-
-            #Draw width lines
-            for l, (x, y) in enumerate(zip(xi,yi)):
-                index = 2 * k + l
-                
-                start = QtCore.QPointF(x1, y1)
-                end = QtCore.QPointF(x, y)
-                self.scene.interpLine = QGraphicsLineItem(
-                    QtCore.QLineF(start, end))
-                self.d["{}".format(index)] = self.scene.interpLine
-                self.scene.addItem(self.scene.interpLine)
-                if k == 0 and l == 0:
-                    self.scene.interpLine.setPen(
-                        QtGui.QPen(QtGui.QColor('yellow')))
+        #width lines reach a corridor either side of the curve, clipped to the frame, every station in one pass
+        self.reach = float(self.parent().subWin.reach.text()) / 100 * self.arc.length
+        rect = self.image.boundingRect()
+        t0, t1 = clip_lines(B_i, bnorm, rect.width(), rect.height())
+        T = np.nan_to_num(np.column_stack((t1, t0))) #+normal side first, lines missing the frame collapse
+        T = np.clip(T, -self.reach, self.reach)
+        log.debug('width lines for %d stations, reach %.1f px, ends at t = %s', len(B_i), self.reach, T)
+        ends = B_i[:,None,:] + T[...,None]*bnorm[:,None,:]
+
+        #Draw width lines, in the order their points are placed
+        self.guides = []
+        for pt, E in zip(B_i, ends):
+            for x, y in E:
+                line = QGraphicsLineItem(pt[0], pt[1], x, y)
+                self.scene.addItem(line)
+                self.guides.append(line)
+        self.guides[0].setPen(QtGui.QPen(QtGui.QColor('yellow')))
+
+        if self.parent().subWin.snap.isChecked():
+            self.propose_widths()
+
+    def intensity(self, rect):
+        """Grey levels of the frame inside rect (a QRect in scene pixels) as a float array, and the rect used"""
+        rect = rect.intersected(self.image.boundingRect().toAlignedRect())
+        if self.pixmap is not None:
+            img = self.pixmap.copy(rect).toImage()
+        else:
+            img = self.image.pyramid.region(rect)
+        img = img.convertToFormat(QtGui.QImage.Format.Format_Grayscale8)
+        ptr = img.constBits()
+        ptr.setsize(img.sizeInBytes())
+        a = np.frombuffer(ptr, np.uint8).reshape(img.height(), img.bytesPerLine())[:, :img.width()]
+        return a.astype(float), rect
+
+    def propose_widths(self):
+        """Pre-place every width point where the image changes fastest along the width lines"""
+        origins = np.column_stack((self.xp, self.yp))
+        reach = self.reach #searched as far as the width lines are drawn
+        ends = np.vstack((origins + reach*self.slopes, origins - reach*self.slopes))
+        (x0, y0), (x1, y1) = np.floor(ends.min(axis = 0)), np.ceil(ends.max(axis = 0))
+        image, rect = self.intensity(QtCore.QRect(int(x0), int(y0), int(x1 - x0) + 1, int(y1 - y0) + 1))
+        if rect.isEmpty():
+            return
+        self.proposal, strength = propose_edges(image, origins, self.slopes, reach,
+                                                offset = (rect.left(), rect.top()))
+        weak = np.ravel(strength) < 0.5
+        self.proposal_dots = []
+        for (x, y), w in zip(self.proposal, weak):
+            dot = self.add_dot(x, y)
+            dot.setPen(QtGui.QPen(QtGui.QColor('orange' if w else 'cyan')))
+            self.proposal_dots.append(dot)
+        self.corrections = []
+        self.guides[0].setPen(QtGui.QPen(QtGui.QColor('black'))) #no next spine to highlight
+        self.parent().statusbar.showMessage(
+            '{} width points proposed ({} weak, in orange). Click near a point to move it along its width line, '
+            'press Enter to accept'.format(len(self.proposal), np.count_nonzero(weak)))
+
+    def move_proposal(self, i, x, y, pen):
+        self.proposal[i] = x, y
+        self.proposal_dots[i].setPos(x - 5, y - 5)
+        self.proposal_dots[i].setPen(pen)
+
+    def adjust_width(self, x, y):
+        """Move the proposed point on the width line nearest (x, y) (and on its side of the length) to the click"""
+        origins = np.column_stack((self.xp, self.yp))
+        rel = np.array([x, y]) - origins
+        off = np.abs(rel[:,0]*self.slopes[:,1] - rel[:,1]*self.slopes[:,0]) #distance from each width line
+        k = int(np.argmin(off))
+        i = 2*k + int(np.dot(rel[k], self.slopes[k]) < 0) #proposals run +normal side first
+        self.corrections.append((i, self.proposal[i].copy(), self.proposal_dots[i].pen()))
+        xi, yi = project_to_normal(origins[k], self.slopes[k], (x, y))
+        self.move_proposal(i, xi, yi, QtGui.QPen(QtGui.QColor('red')))
+
+    def accept_widths(self):
+        """Take the proposed width points, with any corrections, as the measurement"""
+        if self.measuring_widths and self.proposal is not None:
+            self.W = posData(self.proposal[:,0], self.proposal[:,1])
+            self.k = self.nspines
+            self.finish_widths()
+
+    def finish_widths(self):
+        self.parent().statusbar.showMessage('Width measurements complete')
+        self.measuring_widths = False
+        self.proposal = None
+        self.corrections = []
+        self.parent().widthsButton.setEnabled(False)
+        self.parent().widthsButton.setChecked(False)
+        self.parent().bezier.setEnabled(True)
+        W = np.vstack((self.W.x, self.W.y)).T
+        self.widths[-1] = widths_from_points(W)  #calculate widths
+        self.lengthData[-1]['numwidths'] = self.numwidths
+        self.lengthData[-1]['widths'] = W
 
     def mousePressEvent(self, event):
         #http://pyqt.sourceforge.net/Docs/PyQt4/qgraphicsscenemouseevent.html
         #https://stackoverflow.com/questions/21197658/how-to-get-pixel-on-qgraphicspixmapitem-on-a-qgraphicsview-from-a-mouse-click
         data = self.mapToScene(event.pos())
+        if self._pending is not None:
+            self.update_preview() #flush a throttled move before acting on the click
 
         #draw piecewise lines for non-width measurements
         rules = [self.measuring_length, self.measuring_angle, self.measuring_area]
 
-        if self.scene.testline and self._thispos and any(rules):
+        if self.scene.testline.isVisible() and self._thispos and any(rules):
             start = self._thispos
             end = QtCore.QPointF(data)
 
             if self._lastpos and self.measuring_angle:
 
-                a = self._lastpos - self._thispos
-                b = data - self._thispos
-                a = np.array([a.x(), a.y()])
-                b = np.array([b.x(), b.y()])
+                pts = np.array([[self._lastpos.x(), self._lastpos.y()],
+                                [self._thispos.x(), self._thispos.y()],
+                                [data.x(), data.y()]])
                 self.measuring_angle = False
-                t = np.arccos(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
-                t *= 180 / np.pi  #convert to degrees
+                t = angle(*pts)  #degrees
                 self.T.update(t)
                 self.angleValues = np.append(self.angleValues,t)
-                self.parent().statusbar.showMessage('Angle measurement complete')
+                self.anglePoints.append(pts)
+                self.parent().statusbar.showMessage('Angle measurement complete: {}'.format(
+                    self.parent().readout(t, 'angle')))
                 self.parent().angleButton.setChecked(False)
                 self.parent().bezier.setEnabled(True)
+                self.hide_preview()
 
-            self.scene.realline = QGraphicsLineItem(QtCore.QLineF(start, end))
-            self.scene.addItem(self.scene.realline)
+            line = QGraphicsLineItem(QtCore.QLineF(start, end))
+            self.scene.addItem(line)
+            self.lines.append(line)
 
         #Collect piecewise line start/end points
         self._lastpos = self._thispos  # save old position value
@@ -861,41 +1194,38 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
             if intersect:
                 self.measuring_area = False
                 self.A.update(xi,yi) #update with intersect point
-                self.A.x, self.A.y = self.A.x[k:], self.A.y[k:] #only use points after intersection
+                self.A.trim(k) #only use points after intersection
+                self.areaPolygon.append(QtCore.QPointF(xi, yi))
+                self.areaPolygon = self.areaPolygon[int(k):]
                 A = self.A.calcArea()
                 self.areaValues = np.append(self.areaValues, A) #add area values
+                self.areaPoints.append(np.vstack((self.A.x, self.A.y)).T)
                 #draw permanent polygon
-                points = [ QtCore.QPointF(x,y) for x,y in zip( self.A.x, self.A.y ) ]
-                self.scene.polyItem2 = QGraphicsPolygonItem(QtGui.QPolygonF(points))
+                self.scene.polyItem2 = QGraphicsPolygonItem(self.areaPolygon)
                 self.scene.polyItem2.setBrush( QtGui.QBrush(QtGui.QColor(255,255,255,127)) )
-                self.scene.removeItem(self.scene.polyItem) #remove mouseover polygon
-                self.scene.polyItem = False #remove mouseover polygon
+                self.hide_preview() #mouseover polygon and line
                 self.scene.addItem(self.scene.polyItem2) #shade in polygon
-                self.parent().statusbar.showMessage('Polygon area measurement completed')
+                self.parent().statusbar.showMessage('Polygon area measurement completed: {}'.format(
+                    self.parent().readout(A, 'area')))
                 self.parent().areaButton.setChecked(False)
                 self.parent().bezier.setEnabled(True) #make bezier fit available again
-                QApplication.setOverrideCursor(QtCore.Qt.ArrowCursor)  #change cursor
+                self.set_cursor(QtCore.Qt.CursorShape.ArrowCursor)  #change cursor
             else:
                 self.A.update(data.x(),data.y()) #update with click point
+                self.areaPolygon.append(QtCore.QPointF(data))
 
         #https://stackoverflow.com/questions/30898846/qgraphicsview-items-not-being-placed-where-they-should-be
-        if self.measuring_widths:  #measure widths, snap to spines
+        if self.measuring_widths and self.proposal is not None: #correct a proposed point
+            self.adjust_width(data.x(), data.y())
+
+        elif self.measuring_widths:  #measure widths, snap to spines
 
             k = int(self.k / 2) #+ 1  #same origin for spine on either side
             x0, y0 = self.xp[k], self.yp[k]
             x1, y1 = data.x(), data.y()
 
-            #perpindicular slopes
-            # vx = self.slopes[:,k][1]
-            # vy = -self.slopes[:,k][0]
-            vx, vy = self.slopes[k,0], self.slopes[k,1]
-
-            A = np.matrix([[vx, -vy], [vy, vx]])
-            b = np.array([x1 - x0, y1 - y0])
-            t = np.linalg.solve(A,b)
-
-            xi = x0 + t[0]*vx
-            yi = y0 + t[0]*vy
+            #snap to perpindicular spine
+            xi, yi = project_to_normal((x0, y0), self.slopes[k], (x1, y1))
 
             self.W.update(xi,yi)
             p = QtCore.QPointF(xi, yi)
@@ -914,18 +1244,10 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
 
             #Highlight width lines
             if self.k < self.nspines:
-                self.d[str(self.k)].setPen(QtGui.QPen(QtGui.QColor('yellow'))) #Highlight next spine
+                self.guides[self.k].setPen(QtGui.QPen(QtGui.QColor('yellow'))) #Highlight next spine
                     
             if self.k == self.nspines:
-                self.parent().statusbar.showMessage('Width measurements complete')
-                self.measuring_widths = False
-                self.parent().widthsButton.setEnabled(False)
-                self.parent().widthsButton.setChecked(False)
-                self.parent().bezier.setEnabled(True)
-                width = np.sqrt(
-                    (self.W.x[1::2] - self.W.x[0::2])**2 +
-                    (self.W.y[1::2] - self.W.y[0::2])**2)  #calculate widths
-                self.widths[-1] = width
+                self.finish_widths()
 
     #MouseWheel Zoom
     def wheelEvent(self, event):
@@ -953,78 +1275,25 @@ class imwin(QGraphicsView):  #Subclass QLabel for interaction w/ QPixmap
         delta = newPos - oldPos
         self.translate(delta.x(), delta.y())  #Move scene to old position
 
-class posData():
-
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-    def update(self, add_x, add_y):
-        self.x = np.append(self.x, add_x)
-        self.y = np.append(self.y, add_y)
-        
-        #below just for area calcs
-        self.dx = np.diff(self.x)
-        self.dy = np.diff(self.y)
-        self.Tu = np.hypot(self.dx,self.dy) + np.finfo(float).eps
-
-    def downdate(self):
-        self.x = self.x[:-1]
-        self.y = self.y[:-1]
-
-        #below just for area calcs
-        self.dx = np.diff(self.x)
-        self.dy = np.diff(self.y)
-        self.Tu = np.hypot(self.dx,self.dy) + np.finfo(float).eps
-
-    def checkIntersect(self, xn, yn):
-        vx = np.array([self.x[-1],xn])
-        vy = np.array([self.y[-1],yn])
-        dvx = np.diff(vx)
-        dvy = np.diff(vy)
-        Tv = np.hypot(dvx,dvy) + np.finfo(float).eps
-        intersect = False
-        xi = None
-        yi = None
-        count = None
-        for k,(x,y,dx,dy,Tu) in enumerate(zip(self.x[:-1], self.y[:-1], self.dx, self.dy, self.Tu)):
-            A = np.matrix( [[dx/Tu, -dvx/Tv],
-                            [dy/Tu, -dvy/Tv]], dtype = 'float' )
-            b = np.array( [vx[0] - x, vy[0] - y] )
-            try:
-                t = np.linalg.solve(A, b)
-            except np.linalg.LinAlgError as err:
-                if 'Singular matrix' in str(err):
-                    t = np.array([0,0])
-            if (t[0] > 0) and (t[0] < Tu) and (t[1] > 0) and (t[1] < Tv):
-                intersect = True
-                xi = vx[0] + t[1]*dvx/Tv
-                yi = vy[0] + t[1]*dvy/Tv
-                count = k
-        return intersect, xi, yi, count
-
-    def calcArea(self):
-        A =  0.5*np.abs( np.dot(self.x[:-1],self.y[1:]) + self.x[-1]*self.y[0]
-                        - np.dot(self.y[:-1],self.x[1:]) - self.y[-1]*self.x[0] )
-        self.A = A
-        return A
-
-class angleData():  #actually need separate class from posdata? probably not
-
-    def __init__(self, t):
-        self.t = t
-
-    def update(self, add_t):
-        self.t = np.append(self.t, add_t)
-
-    def downdate(self):
-        self.t = self.t[:-1]
-
 def main():
+    #lets QtWebEngine be imported after the QApplication, when the manual is first opened
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.ApplicationAttribute.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
+    mark('QApplication')
     #GUI = Window()
     main = MainWindow()
+    mark('main window')
     main.show()
+    mark('show')
+    if '--debug' in sys.argv[1:]:
+        logging.basicConfig(level = logging.DEBUG, format = '%(relativeCreated)d ms %(name)s: %(message)s')
+    if '--startup-report' in sys.argv[1:]:
+        report_on_first_paint(main.iw.viewport())
+    if '--record' in sys.argv[1:-1]: #capture the session for python -m morphometrix.replay
+        from morphometrix.replay import Recorder
+        path = sys.argv[sys.argv.index('--record') + 1]
+        recorder = Recorder(main)
+        app.aboutToQuit.connect(lambda: recorder.stop().save(path))
     sys.exit(app.exec())
 
 if __name__ == "__main__":
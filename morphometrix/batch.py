@@ -0,0 +1,169 @@
+"""
+Headless re-measurement of saved annotation files.
+
+    morphometrix-batch survey/ -o measurements.csv --altitude 48.7 -j 8
+
+Each annotation file (written next to the exported .csv by the GUI) holds the
+raw clicked geometry and calibration for one image, so measurements can be
+re-derived in bulk whenever the calibration changes. Session files (.npz, see
+morphometrix.session) also carry the pixel values, so they are only rescaled.
+Directories are searched recursively and files are spread over a pool of
+worker processes; results are streamed into one table in sorted file order
+regardless of which worker finishes first. Rows follow the long-format
+schema of morphometrix.dataset whatever the output: -o appends to a .csv,
+.parquet, .arrow or .h5 dataset, without it the same columns go to stdout,
+so any of them reads back with dataset.read_dataset.
+"""
+import os
+import sys
+import csv
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from morphometrix.core import load_annotations, measure
+from morphometrix.session import load_session
+from morphometrix.dataset import DatasetWriter, measurement_records, names as columns
+from morphometrix.metadata import image_calibration
+from morphometrix.calibration import combine
+
+class CSVWriter():
+    """Writes measurement_records rows to a stream as a .csv dataset would hold them"""
+
+    def __init__(self, out):
+        self.writer = csv.writer(out)
+        self.writer.writerow(columns)
+
+    def writerows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        pass
+
+def find_annotations(paths, ext = '.json'):
+    """Expand directories recursively into a sorted list of annotation files"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in names if n.lower().endswith(ext))
+        else:
+            files.append(path)
+    return sorted(files)
+
+def process_file(path, exif = False, **overrides):
+    """
+    Measure one annotation file, returns (path, rows, error). Any exception is
+    caught and returned so one bad file cannot stop the run. With exif, camera
+    details found in the image's metadata replace the stored ones (overrides
+    still take precedence).
+    """
+    try:
+        record = load_session(path) if path.lower().endswith('.npz') else load_annotations(path)
+        if exif and os.path.exists(record['image']['path']):
+            for k, v in image_calibration(record['image']['path']).items():
+                if overrides.get(k) is None:
+                    overrides[k] = v
+        return path, measurement_records(record, measure(record, **overrides)), None
+    except Exception as err:
+        return path, [], f"{type(err).__name__}: {err}"
+
+def run(files, writer, jobs = None, chunksize = 16, progress = None, **overrides):
+    """
+    Measure files with `jobs` worker processes (in-process if jobs == 1) and
+    write rows in file order. progress(done, total, errors) is called after
+    each file. Returns a list of (path, error) for files that failed.
+    """
+    work = partial(process_file, **overrides)
+    errors = []
+    if jobs == 1:
+        results = map(work, files)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers = jobs)
+        results = pool.map(work, files, chunksize = chunksize) #ordered, chunked
+    try:
+        for done, (path, rows, err) in enumerate(results, 1):
+            if err:
+                errors.append((path, err))
+            writer.writerows(rows)
+            if progress:
+                progress(done, len(files), len(errors))
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures = True)
+    return errors
+
+def floats(text):
+    """Comma separated numbers, for argparse"""
+    try:
+        return [float(v) for v in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma separated numbers, got {text!r}") from None
+
+def report_progress(done, total, errors):
+    if done == total or done % 100 == 0:
+        sys.stderr.write(f"\r{done}/{total} files measured ({errors} errors)")
+        if done == total:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'morphometrix-batch',
+                                     description = 'Re-derive MorphoMetriX measurements from saved annotation files')
+    parser.add_argument('paths', nargs = '+', help = 'annotation .json/.npz files or directories to search')
+    parser.add_argument('--ext', default = '.json', choices = ['.json', '.npz'],
+                        help = 'file type to search directories for (default: .json)')
+    parser.add_argument('-o', '--output', help = '.csv, .parquet, .arrow or .h5 dataset to append to (default: stdout)')
+    parser.add_argument('-j', '--jobs', type = int, default = None, help = 'worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type = int, default = 16, help = 'files handed to a worker at a time')
+    parser.add_argument('-q', '--quiet', action = 'store_true', help = 'no progress report')
+    parser.add_argument('--exif', action = 'store_true',
+                        help = 'take focal length, altitude and pixel dimension from image EXIF/XMP metadata where present')
+    parser.add_argument('--focal', type = float, help = 'override focal length (mm)')
+    parser.add_argument('--altitude', type = float, help = 'override altitude (m)')
+    parser.add_argument('--pixeldim', type = float, help = 'override pixel dimension (mm/pixel)')
+    parser.add_argument('--altitude-offset', type = float,
+                        help = 'altitude correction model: add this to gain * altitude (m)')
+    parser.add_argument('--altitude-gain', type = float, help = 'altitude correction model: scale altitude by this')
+    parser.add_argument('--distortion', type = floats, metavar = 'K1,K2,P1,P2[,K3]',
+                        help = 'Brown-Conrady lens distortion (OpenCV order) removed from the clicked points')
+    parser.add_argument('--principal-point', type = floats, metavar = 'CX,CY',
+                        help = 'principal point for --distortion in pixels (default: frame centre)')
+    parser.add_argument('--max-degree', type = int, help = 'reduce bezier lengths to at most this degree')
+    args = parser.parse_args(argv)
+
+    files = find_annotations(args.paths, args.ext)
+    #only the parameters given, so the rest of a stored model survives (see calibration.combine)
+    correction = {k: v for k, v in (('offset', args.altitude_offset), ('gain', args.altitude_gain)) if v is not None}
+    if correction:
+        correction['model'] = 'altitude'
+    lens = {}
+    if args.distortion:
+        if len(args.distortion) not in (4, 5):
+            parser.error('--distortion takes 4 or 5 coefficients')
+        lens = dict(zip(('k1', 'k2', 'p1', 'p2', 'k3'), args.distortion), model = 'brown-conrady')
+        if args.principal_point:
+            lens.update(zip(('cx', 'cy'), args.principal_point))
+    calibration = combine(correction, lens)
+    if args.output:
+        try:
+            writer = DatasetWriter(args.output) #batched appends, typed long format
+        except ValueError as err:
+            parser.error(str(err))
+    else:
+        writer = CSVWriter(sys.stdout)
+    try:
+        errors = run(files, writer, jobs = args.jobs, chunksize = args.chunksize,
+                     progress = None if args.quiet else report_progress,
+                     exif = args.exif, focal = args.focal, altitude = args.altitude, pixeldim = args.pixeldim,
+                     max_degree = args.max_degree, **calibration)
+    finally:
+        writer.close()
+
+    for path, err in errors:
+        sys.stderr.write(f"{path}: {err}\n")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
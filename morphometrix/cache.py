@@ -0,0 +1,41 @@
+"""
+On-disk cache locations shared by the GUI and batch tools.
+"""
+import os
+import shutil
+import hashlib
+
+def cache_dir(*parts):
+    """
+    Cache directory under $MORPHOMETRIX_CACHE (default $XDG_CACHE_HOME/morphometrix
+    or ~/.cache/morphometrix), created on first use
+    """
+    root = os.environ.get('MORPHOMETRIX_CACHE') or os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'morphometrix')
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok = True)
+    return path
+
+def prune(parent, max_bytes, keep = ()):
+    """
+    Delete the least recently used entries (subdirectories, by mtime) of cache
+    directory parent until it holds at most max_bytes, never those in keep
+    """
+    entries = []
+    for entry in os.scandir(parent):
+        if entry.is_dir():
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            entries.append((entry.stat().st_mtime, size, entry.path))
+    total = sum(size for __, size, __ in entries)
+    for __, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path not in keep:
+            shutil.rmtree(path, ignore_errors = True)
+            total -= size
+
+def file_key(path):
+    """Key that changes whenever the file at path is replaced or modified"""
+    st = os.stat(path)
+    s = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+    return hashlib.sha1(s.encode()).hexdigest()
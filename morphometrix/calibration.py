@@ -0,0 +1,203 @@
+"""
+Calibration models converting pixel measurements to metres.
+
+A model is built from an image's calibration metadata (focal length in mm,
+altitude in m, pixel dimension in mm/pixel, plus any model parameters) and
+converts whole arrays of pixel values at once: lengths and widths scale with
+metres per pixel, areas with its square and angles not at all. Every
+parameter may also be an array with one entry per value, so a season of raw
+pixel measurements (see dataset.read_dataset) is recalibrated in one pass.
+
+Models are looked up by name in `models`, so the calibration stored with an
+annotation can name a different one ('model': 'altitude') and measurements
+are re-derived under it without re-digitizing. Each model extends the one
+before it, so calibrations given on top of each other (see combine) keep
+both an altitude correction and a lens model. A model that moves the
+clicked points themselves (lens distortion) sets `distorts` and implements
+undistort(); the others leave pixel geometry untouched.
+"""
+import inspect
+
+import numpy as np
+
+#power of metres per pixel applied to each kind of measurement
+exponents = {'length': 1, 'width': 1, 'error': 1, 'area': 2, 'angle': 0}
+
+class Pinhole():
+    """Metres per pixel = pixel dimension (mm) * altitude (m) / focal length (mm)"""
+
+    name = 'pinhole'
+    distorts = False
+
+    def __init__(self, focal, altitude, pixeldim):
+        self.focal = np.asarray(focal, dtype=float)
+        self.altitude = np.asarray(altitude, dtype=float)
+        self.pixeldim = np.asarray(pixeldim, dtype=float)
+
+    def range(self):
+        """Camera to subject distance (m)"""
+        return self.altitude
+
+    def scale(self):
+        """Metres per pixel"""
+        return self.pixeldim * self.range() / self.focal
+
+    def convert(self, values, exponent = 1):
+        """Pixel values to metres**exponent, exponent a number or array (see exponents)"""
+        return np.asarray(values, dtype=float) * self.scale()**np.asarray(exponent)
+
+    def undistort(self, points):
+        return points
+
+    def params(self):
+        """Calibration metadata as stored with annotations"""
+        p = {'focal': self.focal, 'altitude': self.altitude, 'pixeldim': self.pixeldim}
+        p = {k: v.item() if v.ndim == 0 else v for k, v in p.items()}
+        if self.name != Pinhole.name:
+            p['model'] = self.name
+        return p
+
+class AltitudeCorrection(Pinhole):
+    """
+    Pinhole camera at a corrected altitude, gain * altitude + offset, e.g. a
+    regression of barometric altitude on laser altimeter readings or the
+    height of the launch point above the water
+    """
+
+    name = 'altitude'
+
+    def __init__(self, focal, altitude, pixeldim, offset = 0.0, gain = 1.0):
+        super(AltitudeCorrection, self).__init__(focal, altitude, pixeldim)
+        self.offset = np.asarray(offset, dtype=float)
+        self.gain = np.asarray(gain, dtype=float)
+
+    def range(self):
+        return self.gain * self.altitude + self.offset
+
+    def params(self):
+        p = super(AltitudeCorrection, self).params()
+        p.update(offset = self.offset.item() if self.offset.ndim == 0 else self.offset,
+                 gain = self.gain.item() if self.gain.ndim == 0 else self.gain)
+        return p
+
+class BrownConrady(AltitudeCorrection):
+    """
+    Brown-Conrady lens distortion (radial k1, k2, k3 and tangential p1, p2,
+    in the OpenCV convention) about the principal point cx, cy (px, default
+    the frame centre), on top of the altitude corrected pinhole. Only the
+    clicked points are undistorted, never the image, so correcting a
+    measurement costs a few array operations per point.
+    """
+
+    name = 'brown-conrady'
+    distorts = True
+    coefficients = ('k1', 'k2', 'k3', 'p1', 'p2')
+
+    def __init__(self, focal, altitude, pixeldim, k1 = 0.0, k2 = 0.0, k3 = 0.0, p1 = 0.0, p2 = 0.0,
+                 cx = None, cy = None, offset = 0.0, gain = 1.0):
+        super(BrownConrady, self).__init__(focal, altitude, pixeldim, offset, gain)
+        self.k1, self.k2, self.k3, self.p1, self.p2 = (float(k) for k in (k1, k2, k3, p1, p2))
+        if cx is None or cy is None or not np.isfinite([cx, cy]).all():
+            raise ValueError("lens distortion needs the principal point (cx, cy) or the image size")
+        self.cx, self.cy = float(cx), float(cy)
+
+    def _delta(self, x, y):
+        """Distorted minus ideal normalized coordinates, (radial factor, tangential dx, dy)"""
+        r2 = x*x + y*y
+        radial = 1 + r2 * (self.k1 + r2 * (self.k2 + r2 * self.k3))
+        dx = 2 * self.p1 * x * y + self.p2 * (r2 + 2 * x*x)
+        dy = self.p1 * (r2 + 2 * y*y) + 2 * self.p2 * x * y
+        return radial, dx, dy
+
+    def distort(self, points):
+        """Image positions (px) of ideal pinhole positions, (n, 2) array"""
+        P = np.asarray(points, dtype=float)
+        f = float(self.focal / self.pixeldim) #focal length in pixels
+        x, y = (P[...,0] - self.cx) / f, (P[...,1] - self.cy) / f
+        radial, dx, dy = self._delta(x, y)
+        return np.stack([(x * radial + dx) * f + self.cx, (y * radial + dy) * f + self.cy], axis = -1)
+
+    def undistort(self, points, iterations = 20, tol = 1e-12):
+        """
+        Pinhole positions of clicked points (px), (n, 2) array. The model is
+        inverted by fixed-point iteration on all points at once, which
+        converges for the distortion of ordinary (non-fisheye) lenses.
+        """
+        P = np.asarray(points, dtype=float)
+        if not P.size:
+            return P
+        f = float(self.focal / self.pixeldim)
+        xd, yd = (P[...,0] - self.cx) / f, (P[...,1] - self.cy) / f
+        x, y = xd, yd
+        for __ in range(iterations):
+            radial, dx, dy = self._delta(x, y)
+            x1, y1 = (xd - dx) / radial, (yd - dy) / radial
+            step = max(np.abs(x1 - x).max(), np.abs(y1 - y).max())
+            x, y = x1, y1
+            if step < tol:
+                break
+        return np.stack([x * f + self.cx, y * f + self.cy], axis = -1)
+
+    def params(self):
+        p = super(BrownConrady, self).params()
+        p.update({k: getattr(self, k) for k in self.coefficients}, cx = self.cx, cy = self.cy)
+        return p
+
+models = {m.name: m for m in (Pinhole, AltitudeCorrection, BrownConrady)}
+
+def lookup(name):
+    """Model class by name (None for pinhole)"""
+    name = name or Pinhole.name
+    if name not in models:
+        raise ValueError(f"unknown calibration model {name!r}, expected one of {', '.join(models)}")
+    return models[name]
+
+def combine(*cals):
+    """
+    One calibration dict from several, later parameters overriding earlier
+    ones. Models are composed rather than replaced: the result is the most
+    specific model named, so an altitude correction given over a stored lens
+    model keeps the lens coefficients and the other way round. Models that
+    don't extend one another can't be combined and raise ValueError.
+    """
+    out, model = {}, Pinhole
+    for cal in cals:
+        params = dict(cal)
+        other = lookup(params.pop('model', None))
+        if issubclass(other, model):
+            model = other
+        elif not issubclass(model, other):
+            raise ValueError(f"cannot combine the {model.name} and {other.name} calibration models")
+        out.update(params)
+    if model is not Pinhole:
+        out['model'] = model.name
+    return out
+
+def calibration_model(cal, image = None):
+    """
+    Model instance from a calibration dict, {'model': name, **params} (default
+    pinhole). image (a record's 'image' entry) supplies the frame size, whose
+    centre is the default principal point of lens distortion models.
+    Parameters the model doesn't take raise ValueError rather than being dropped.
+    """
+    params = dict(cal)
+    model = lookup(params.pop('model', None))
+    unknown = set(params) - set(inspect.signature(model).parameters)
+    if unknown:
+        raise ValueError(f"the {model.name} calibration model takes no {', '.join(sorted(unknown))}")
+    if model.distorts and image:
+        params.setdefault('cx', image.get('width', np.nan) / 2)
+        params.setdefault('cy', image.get('height', np.nan) / 2)
+    return model(**params)
+
+def recalibrate(columns, **cal):
+    """
+    Metre values for a whole dataset (dataset.read_dataset columns) in one pass
+    from its stored pixel values. Per-row focal, altitude and pixeldim are used
+    unless given in cal, which may also name a model and its parameters.
+    """
+    params = combine({k: columns[k] for k in ('focal', 'altitude', 'pixeldim')}, cal)
+    if lookup(params.get('model')).distorts:
+        raise ValueError("lens distortion moves the clicked points, re-measure the annotations instead")
+    exponent = np.select([columns['kind'] == k for k in exponents], list(exponents.values()), 1)
+    return calibration_model(params).convert(columns['pixels'], exponent)
@@ -0,0 +1,659 @@
+"""
+Headless measurement engine for MorphoMetriX.
+
+Everything needed to turn clicked pixel geometry into lengths, widths,
+areas and angles lives here and depends only on NumPy, so saved
+annotations can be re-measured without a QApplication.
+"""
+import json
+import math
+from functools import lru_cache
+import numpy as np
+
+from morphometrix.calibration import calibration_model, combine, exponents
+
+@lru_cache(maxsize=64)
+def binomials(k):
+    """Binomial coefficients C(k, i) for i = 0..k, cached per order (LRU)"""
+    C = np.array([math.comb(k, i) for i in range(k+1)], dtype=float)
+    C.setflags(write=False) #shared between callers through the cache
+    return C
+
+def bernstein_eval(P, t):
+    """
+    Evaluate the Bezier curve with control points P (k+1, dim) at parameter
+    values t of any shape, returns array of shape t.shape + (dim,).
+
+    Stays in the Bernstein basis with a scaled Horner scheme: for t <= 1/2,
+    B(t) = (1-t)**k * sum C(k,i) P_i s**i with s = t/(1-t) in [0, 1], and
+    t > 1/2 uses the reversed polygon at 1-t. That is O(k) per point like the
+    power basis but without its cancellation, so the error grows like k*eps
+    (de Casteljau accuracy) instead of with the size of the binomials.
+    """
+    P = np.asarray(P, dtype=float)
+    k = len(P) - 1
+    t = np.asarray(t, dtype=float)
+    flip = t > 0.5
+    u = np.where(flip, 1.0 - t, t)
+    s = u / (1.0 - u)
+    C = binomials(k)[:,None]*P
+
+    B = np.empty(t.shape + P.shape[1:])
+    for mask, coeff in ((~flip, C), (flip, C[::-1])):
+        si = s[mask][:,None]
+        b = np.broadcast_to(coeff[-1], si.shape[:-1] + coeff.shape[1:]).copy()
+        for c in coeff[-2::-1]:
+            b *= si
+            b += c
+        B[mask] = b
+    B *= ((1.0 - u)**k)[...,None]
+    return B
+
+class BezierCurve():
+    """
+    Reusable Bezier curve evaluator on control points P, evaluated in the
+    Bernstein basis (bernstein_eval). The derivative curve is built on first use.
+    """
+
+    def __init__(self, P):
+        self.P = np.asarray(P, dtype=float)
+        self.k = len(self.P) - 1 #order of bezier curve = # of control points - 1
+        self._derivative = None
+
+    def __call__(self, t):
+        return bernstein_eval(self.P, t)
+
+    def derivative(self):
+        if self._derivative is None:
+            if self.k > 0:
+                self._derivative = BezierCurve(self.k*np.diff(self.P, axis=0))
+            else:
+                self._derivative = BezierCurve(np.zeros_like(self.P))
+        return self._derivative
+
+    def speed(self, t):
+        """Magnitude of the tangent vector |B'(t)|"""
+        return np.linalg.norm(self.derivative()(t), axis=-1)
+
+def bernstein_basis(k, t):
+    """Bernstein polynomials of order k at t, array of shape t.shape + (k+1,)"""
+    return bernstein_eval(np.eye(k+1), t)
+
+def reduce_degree(curve, degree, samples = None):
+    """
+    Least-squares approximation of curve by a Bezier curve of at most the given
+    degree, end points kept. The curve is sampled at Chebyshev points of its own
+    parameter (4 per original control point by default) and the interior
+    control points solved for, giving O(degree) evaluation for long tracings.
+    """
+    if curve.k <= degree:
+        return curve
+    n = samples or 4*(curve.k + 1)
+    t = 0.5 - 0.5*np.cos(np.pi*(np.arange(n) + 0.5)/n)
+    A = bernstein_basis(degree, t)
+    P0, P1 = curve.P[0], curve.P[-1]
+    Q = curve(t) - np.outer(A[:,0], P0) - np.outer(A[:,-1], P1)
+    interior = np.linalg.lstsq(A[:,1:-1], Q, rcond = None)[0]
+    return BezierCurve(np.vstack((P0, interior, P1)))
+
+def bezier(t,P,k,arc = False):
+    """
+    Bezier curve of order k with control points P at t (compatibility wrapper,
+    see BezierCurve), or its norm if arc
+    """
+    B = bernstein_eval(P, t)
+
+    if arc:
+        return np.linalg.norm(B, axis = -1)
+    else:
+        return B
+
+@lru_cache(maxsize=16)
+def legendre_rule(degree):
+    """Gauss-Legendre nodes and weights on [-1, 1], cached per degree (LRU)"""
+    x, w = np.polynomial.legendre.leggauss(degree)
+    x.setflags(write=False)
+    w.setflags(write=False)
+    return x, w
+
+@lru_cache(maxsize=1)
+def kronrod_rule():
+    """
+    15-point Gauss-Kronrod rule on [-1, 1] with its embedded 7-point Gauss rule
+    (QUADPACK qk15), returns nodes, Kronrod weights and Gauss weights (zero
+    off the Gauss nodes)
+    """
+    xgk = np.array([0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+                    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+                    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+                    0.207784955007898467600689403773245, 0.0])
+    wgk = np.array([0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+                    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+                    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+                    0.204432940075298892414161999234649, 0.209482141084727828012999174891714])
+    wg = np.array([0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+                   0.381830050505118944950369775488975, 0.417959183673469387755102040816327])
+    x = np.concatenate((-xgk[:-1], xgk[::-1]))
+    wk = np.concatenate((wgk[:-1], wgk[::-1]))
+    g = np.zeros(8)
+    g[1::2] = wg
+    wg = np.concatenate((g[:-1], g[::-1]))
+    for a in (x, wk, wg):
+        a.setflags(write=False)
+    return x, wk, wg
+
+def gauss_legendre(b, f, P, k, arc, loc = 0.0, L = 1, degree = 24, a = 0):
+    """
+    Gauss-Legendre Quadrature for bezier curve arc length
+    """
+    x, w = legendre_rule(degree)
+    t = 0.5*(b-a)*x + 0.5*(b+a)
+    
+    return 0.5*(b-a)*np.sum( w*bezier(t,P,k,arc) )/L - loc
+
+class ArcLength():
+    """
+    Arc length parameterization of a BezierCurve.
+
+    A cumulative arc length table is built once per curve by adaptive
+    Gauss-Kronrod (G7/K15) integration of the speed |B'(t)|: starting from
+    `intervals` equal pieces, every piece whose embedded error estimate exceeds
+    its share of tol * length is bisected, all pieces at once per pass, so
+    sharp bends get more nodes and near-straight curves stop after one pass.
+    `error` is the summed estimate for `length` (QUADPACK's scaled |K15 - G7|).
+    Fractions of total length are inverted for all stations at once by linear
+    interpolation of the table followed by a batched, bracketed Newton polish.
+
+    Error bound: Newton stops once every station satisfies
+    |s(t) - target| <= tol * length (default 1e-10 relative), and t never leaves
+    the table interval bracketing its target.
+    """
+
+    def __init__(self, curve, tol = 1e-10, intervals = 8, max_intervals = 4096):
+        self.curve = curve
+        self.tol = tol
+        knots = np.linspace(0.0, 1.0, intervals + 1)
+        a, b = knots[:-1], knots[1:]
+        I, E = self._kronrod(a, b)
+        done_a, done_b, done_I, done_E = [], [], [], []
+        while len(a):
+            budget = tol*max(np.sum(I) + sum(map(np.sum, done_I)), np.finfo(float).tiny)
+            ok = E <= budget*(b - a)
+            if len(a) + sum(map(len, done_a)) + np.count_nonzero(~ok) > max_intervals:
+                ok[:] = True #give up refining, report the estimate as is
+            done_a.append(a[ok]); done_b.append(b[ok]); done_I.append(I[ok]); done_E.append(E[ok])
+            m = 0.5*(a[~ok] + b[~ok])
+            a, b = np.concatenate((a[~ok], m)), np.concatenate((m, b[~ok]))
+            I, E = self._kronrod(a, b)
+
+        a, b = np.concatenate(done_a), np.concatenate(done_b)
+        order = np.argsort(a)
+        self.knots = np.append(a[order], b[order][-1])
+        self.s = np.concatenate(( [0.0], np.cumsum(np.concatenate(done_I)[order]) ))
+        self.length = self.s[-1]
+        self.error = np.sum(np.concatenate(done_E))
+
+    def _kronrod(self, a, b):
+        """K15 integral of |B'(t)| and its error estimate over each [a, b] pair (vectorized)"""
+        x, wk, wg = kronrod_rule()
+        a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        h = 0.5*(b - a)
+        f = self.curve.speed((a + h)[...,None] + h[...,None]*x)
+        K = np.sum(wk*f, axis = -1)
+        G = np.sum(wg*f, axis = -1)
+        #QUADPACK scaling of |K - G|, floored at roundoff
+        asc = np.sum(wk*np.abs(f - 0.5*K[...,None]), axis = -1)
+        err = np.abs(K - G)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            err = np.where((asc > 0) & (err > 0), asc*np.minimum(1.0, (200*err/asc)**1.5), err)
+        err = np.maximum(err, 50*np.finfo(float).eps*np.sum(wk*np.abs(f), axis = -1))
+        return h*K, np.abs(h)*err
+
+    def _integrate(self, a, b):
+        """Integral of |B'(t)| over each [a, b] pair (vectorized)"""
+        return self._kronrod(a, b)[0]
+
+    def __call__(self, t):
+        """Arc length from 0 to t, for t of any shape"""
+        t = np.clip(np.asarray(t, dtype=float), 0.0, 1.0)
+        j = np.clip(np.searchsorted(self.knots, t, side='right') - 1, 0, len(self.knots) - 2)
+        return self.s[j] + self._integrate(self.knots[j], t)
+
+    def invert(self, fractions, tol = 1e-10, maxiter = 20):
+        """Curve parameter t at each fraction of total arc length"""
+        target = np.asarray(fractions, dtype=float)*self.length
+        j = np.clip(np.searchsorted(self.s, target, side='right') - 1, 0, len(self.knots) - 2)
+        lo, hi = self.knots[j], self.knots[j+1] #bracket from the table
+        t = np.interp(target, self.s, self.knots) #initial guess
+        for _ in range(maxiter):
+            f = self(t) - target
+            if np.all(np.abs(f) <= tol*self.length):
+                break
+            speed = np.maximum(self.curve.speed(t), np.finfo(float).eps)
+            t = np.clip(t - f/speed, lo, hi)
+        return t
+
+def fit_length(points, bezier = True, max_degree = None):
+    """
+    Fit a length measurement to clicked points, returns (curve, arc length table).
+    Bezier fits use every point as a control point, piecewise measurements (or
+    only two points) run straight from the first to the last point as in the GUI.
+    With max_degree, longer bezier tracings are replaced by their least-squares
+    reduction to that degree (reduce_degree).
+    """
+    P = np.asarray(points, dtype=float)
+    if not (bezier and len(P) > 2):
+        P = P[[0,-1]]
+    curve = BezierCurve(P)
+    if max_degree is not None:
+        curve = reduce_degree(curve, max(max_degree, 1))
+    return curve, ArcLength(curve)
+
+def tessellate(curve, tol = 0.25, max_points = 2**14):
+    """
+    Polyline through curve that stays within about tol (scene units) of it,
+    returns (t, points). Every interval whose curve midpoint is further than
+    tol from its chord is bisected, all intervals at once per pass, so samples
+    gather where curvature is high (deviation ~ curvature*h**2/8).
+    """
+    t = np.linspace(0.0, 1.0, max(8, 2*curve.k) + 1) #catch inflections before testing chords
+    B = curve(t)
+    while len(t) < max_points:
+        tm = 0.5*(t[:-1] + t[1:])
+        M = curve(tm)
+        split = np.flatnonzero(np.hypot(*(M - 0.5*(B[:-1] + B[1:])).T) > tol)
+        if not len(split):
+            break
+        split = split[:max_points - len(t)]
+        t = np.insert(t, split + 1, tm[split])
+        B = np.insert(B, split + 1, M[split], axis = 0)
+    return t, B
+
+def width_fractions(numwidths):
+    """Fractions of total length at which width stations are drawn (inner points only)"""
+    return np.linspace(0, 1, numwidths + 2)[1:-1]
+
+def width_names(numwidths):
+    return ['{0:2.2f}% Width'.format(100 * f) for f in width_fractions(numwidths)]
+
+def width_stations(curve, arc, numwidths):
+    """
+    Points on the curve at equal arc length spacing and the unit normal there,
+    found by applying a pi/2 rotation matrix to the tangent vector
+    """
+    t_i = arc.invert(width_fractions(numwidths))
+    B_i = curve(t_i)
+    bdot = curve.derivative()(t_i)
+    bnorm = np.flip(bdot/np.linalg.norm(bdot, axis = 1)[:,None], axis = 1)
+    bnorm[:,0] *= -1
+    return B_i, bnorm
+
+def project_to_normal(origin, normal, point):
+    """Snap point(s) onto the line through origin along unit normal"""
+    origin, normal, point = np.asarray(origin), np.asarray(normal), np.asarray(point)
+    t = np.sum((point - origin)*normal, axis = -1)
+    return origin + t[...,None]*normal
+
+def clip_lines(origins, directions, width, height):
+    """
+    Parameters t0 <= t1 at which each line origin + t*direction enters and leaves
+    the frame [0, width] x [0, height], all lines at once by the slab method.
+    NaN for lines that miss the frame.
+    """
+    o, d = np.asarray(origins, dtype=float), np.asarray(directions, dtype=float)
+    size = np.array([width, height], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a, b = -o/d, (size - o)/d
+    lo, hi = np.fmin(a, b), np.fmax(a, b)
+    #a line parallel to a side is unbounded along it when between that pair of sides, else misses
+    between = (o >= 0) & (o <= size)
+    lo = np.where(d == 0, np.where(between, -np.inf, np.inf), lo)
+    hi = np.where(d == 0, np.where(between, np.inf, -np.inf), hi)
+    t0, t1 = lo.max(axis = -1), hi.min(axis = -1)
+    miss = t0 > t1
+    return np.where(miss, np.nan, t0), np.where(miss, np.nan, t1)
+
+def widths_from_points(points):
+    """Widths between consecutive pairs of points placed on either side of each station"""
+    W = np.asarray(points, dtype=float)
+    return np.hypot(W[1::2,0] - W[0::2,0], W[1::2,1] - W[0::2,1])
+
+def polygon_area(x, y):
+    """Shoelace formula for a closed polygon"""
+    return 0.5*np.abs( np.dot(x[:-1],y[1:]) + x[-1]*y[0]
+                      - np.dot(y[:-1],x[1:]) - y[-1]*x[0] )
+
+def angle(a, vertex, b):
+    """Angle (degrees) at vertex between rays towards a and b"""
+    u = np.asarray(a, dtype=float) - vertex
+    v = np.asarray(b, dtype=float) - vertex
+    t = np.arccos(np.dot(u, v) / (np.linalg.norm(u) * np.linalg.norm(v)))
+    return t * 180 / np.pi
+
+def unique_name(name, taken):
+    """name, or the first of 'name (2)', 'name (3)', ... not in taken"""
+    new, k = name, 1
+    while new in taken:
+        k += 1
+        new = f'{name} ({k})'
+    return new
+
+def unique_names(names):
+    """names in order, later repeats numbered so that no measurement shadows another"""
+    taken = []
+    for name in names:
+        taken.append(unique_name(name, taken))
+    return taken
+
+def pixel_scale(focal, altitude, pixeldim):
+    """Metres per pixel for a pinhole camera: pixel dimension (mm) * altitude (m) / focal length (mm)"""
+    return pixeldim * altitude / focal
+
+def save_annotations(path, record):
+    """Write raw annotation geometry and calibration to a JSON file"""
+    def encode(o):
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        if isinstance(o, np.generic):
+            return o.item()
+        raise TypeError(f"{type(o).__name__} is not JSON serializable")
+    with open(path, 'w') as f:
+        json.dump(record, f, default = encode)
+
+def load_annotations(path):
+    with open(path) as f:
+        return json.load(f)
+
+def measure(record, focal = None, altitude = None, pixeldim = None, max_degree = None, **calibration):
+    """
+    Re-derive measurements in metres (areas in square metres, angles in degrees)
+    from an annotation record. Calibration values given here override the
+    stored ones, e.g. after an altimeter correction, as do further keywords
+    naming a calibration model and its parameters (model = 'altitude',
+    offset = 1.2, see calibration.models), composed with the stored model
+    (see calibration.combine). max_degree overrides the degree
+    bound stored with each length (see fit_length). Pixel values stored with
+    a measurement (see session.load_session) are used as is unless max_degree
+    asks for a refit or the model undistorts the clicked points.
+
+    Returns a dict of {name: value} for 'lengths', 'areas' and 'angles' and
+    {name: (width names, widths)} for 'widths'. 'length_errors' holds the
+    estimated quadrature error of each length (see ArcLength) and 'pixels'
+    the same measurements before calibration. Repeated names within a kind
+    are numbered (see unique_names) rather than overwritten.
+    """
+    cal = dict(record['calibration'])
+    for key, value in (('focal', focal), ('altitude', altitude), ('pixeldim', pixeldim)):
+        if value is not None:
+            cal[key] = value
+    model = calibration_model(combine(cal, calibration), record.get('image'))
+    refit = max_degree is not None or model.distorts
+    def points(m):
+        return model.undistort(np.asarray(m['points'], dtype=float))
+
+    px = {'lengths': {}, 'length_errors': {}, 'widths': {}, 'areas': {}, 'angles': {}}
+    lengths, areas, angles = (record.get(kind, []) for kind in ('lengths', 'areas', 'angles'))
+    for m, name in zip(lengths, unique_names([m['name'] for m in lengths])):
+        if 'length' in m and not refit: #stored pixel values, e.g. from a session file
+            length, error = m['length'], m.get('error', 0.0)
+        else:
+            curve, arc = fit_length(points(m), m.get('bezier', True),
+                                    max_degree if max_degree is not None else m.get('max_degree'))
+            length, error = arc.length, arc.error
+        px['lengths'][name] = length
+        px['length_errors'][name] = error
+        if m.get('widths') is not None and len(m['widths']):
+            if 'width_values' in m and not model.distorts:
+                W = np.asarray(m['width_values'], dtype=float)
+            else:
+                W = widths_from_points(model.undistort(np.asarray(m['widths'], dtype=float)))
+            px['widths'][name] = (width_names(m['numwidths']), W)
+    for m, name in zip(areas, unique_names([m['name'] for m in areas])):
+        if 'area' in m and not model.distorts:
+            A = m['area']
+        else:
+            P = points(m)
+            A = polygon_area(P[:,0], P[:,1])
+        px['areas'][name] = A
+    for m, name in zip(angles, unique_names([m['name'] for m in angles])):
+        px['angles'][name] = m['angle'] if 'angle' in m and not model.distorts else angle(*points(m))
+
+    #convert everything in one pass
+    widths = [W for __, W in px['widths'].values()]
+    parts = [(list(px['lengths'].values()), 'length'), (list(px['length_errors'].values()), 'error'),
+             (np.concatenate(widths) if widths else [], 'width'),
+             (list(px['areas'].values()), 'area'), (list(px['angles'].values()), 'angle')]
+    values = np.concatenate([np.asarray(v, dtype=float) for v, __ in parts])
+    exponent = np.concatenate([np.full(len(v), exponents[k]) for v, k in parts])
+    converted = iter(model.convert(values, exponent).tolist())
+
+    results = {'calibration': model.params(), 'pixels': px}
+    for key in ('lengths', 'length_errors'):
+        results[key] = {name: next(converted) for name in px[key]}
+    results['widths'] = {name: (names, np.array([next(converted) for __ in W]))
+                         for name, (names, W) in px['widths'].items()}
+    for key in ('areas', 'angles'):
+        results[key] = {name: next(converted) for name in px[key]}
+    return results
+
+class PointBuffer():
+    """
+    Growable structure-of-arrays buffer with one contiguous row per field.
+    Capacity doubles when full so append and pop are O(1) amortized.
+    Fields are returned as views, copy them if they must outlive later appends.
+    """
+
+    def __init__(self, fields, capacity = 16):
+        self.data = np.empty((fields, capacity))
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, field):
+        return self.data[field, :self.n]
+
+    def append(self, *values):
+        if self.n == self.data.shape[1]:
+            grown = np.empty((self.data.shape[0], 2*self.data.shape[1]))
+            grown[:, :self.n] = self.data[:, :self.n]
+            self.data = grown
+        self.data[:, self.n] = values
+        self.n += 1
+
+    def pop(self):
+        if self.n:
+            self.n -= 1
+
+    def trim(self, k):
+        """Drop the first k entries"""
+        k = min(k, self.n)
+        self.data[:, :self.n - k] = self.data[:, k:self.n]
+        self.n -= k
+
+def segment_intersections(x0, y0, dx, dy, px, py, qx, qy):
+    """
+    Crossings of segments (x0, y0) + u*(dx, dy) with the segment p -> q, all
+    segments at once. Returns a mask of proper crossings (0 < u, s < 1, touching
+    endpoints and parallel segments excluded) and the fraction s along p -> q.
+    """
+    rx, ry = qx - px, qy - py
+    wx, wy = px - x0, py - y0
+    denom = dx*ry - dy*rx
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        u = (wx*ry - wy*rx) / denom
+        s = (wx*dy - wy*dx) / denom
+    return (denom != 0) & (u > 0) & (u < 1) & (s > 0) & (s < 1), s
+
+class SegmentGrid():
+    """
+    Uniform grid over the segments of a polyline: each cell lists the segments
+    whose bounding box overlaps it. Segments are added and removed at the end
+    as points are clicked or undone. Very long segments skip the grid and are
+    always tested.
+    """
+
+    def __init__(self, x, y, cell = 64.0, max_cells = 256):
+        self.cell = cell
+        self.max_cells = max_cells
+        self.cells = {}
+        self.long = set() #segments spanning more than max_cells cells
+        self.keys = [] #cells of each segment, for pop()
+        for k in range(len(x) - 1):
+            self.insert(x[k], y[k], x[k+1], y[k+1])
+
+    def _span(self, x0, y0, x1, y1):
+        c = self.cell
+        return (int(min(x0, x1) // c), int(max(x0, x1) // c),
+                int(min(y0, y1) // c), int(max(y0, y1) // c))
+
+    def insert(self, x0, y0, x1, y1):
+        k = len(self.keys)
+        i0, i1, j0, j1 = self._span(x0, y0, x1, y1)
+        if (i1 - i0 + 1)*(j1 - j0 + 1) > self.max_cells:
+            self.long.add(k)
+            self.keys.append(())
+            return
+        keys = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+        for key in keys:
+            self.cells.setdefault(key, []).append(k)
+        self.keys.append(keys)
+
+    def pop(self):
+        k = len(self.keys) - 1
+        for key in self.keys.pop():
+            self.cells[key].pop() #segments are appended in order, so k is last
+            if not self.cells[key]:
+                del self.cells[key]
+        self.long.discard(k)
+
+    def candidates(self, x0, y0, x1, y1):
+        """Sorted indices of segments near segment (x0, y0) -> (x1, y1), None if it spans too many cells"""
+        i0, i1, j0, j1 = self._span(x0, y0, x1, y1)
+        if (i1 - i0 + 1)*(j1 - j0 + 1) > self.max_cells:
+            return None
+        found = set(self.long)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                found.update(self.cells.get((i, j), ()))
+        return np.array(sorted(found), dtype = int)
+
+class posData():
+    """
+    Clicked points of a measurement. Alongside x, y the buffer keeps the
+    segment from the previous point (dx, dy and length Tu) so nothing is
+    re-differenced when points are added or removed, and running sums of the
+    segment lengths (S) and shoelace terms x[i-1]*y[i] - x[i]*y[i-1] (C), so the
+    length traced so far and the area of the outline closed through any point
+    take O(1) per query. Prefix sums stay valid when points are popped or trimmed.
+    """
+
+    grid_threshold = 128 #segments, spatial index used for intersection tests above this
+
+    def __init__(self, x = (), y = ()):
+        self.buf = PointBuffer(7) #x, y, dx, dy, Tu, S, C; segment fields unused for the first point
+        self.grid = None #built on first intersection test of a long outline
+        for xi, yi in zip(np.ravel(x), np.ravel(y)):
+            self.update(xi, yi)
+
+    x = property(lambda self: self.buf[0])
+    y = property(lambda self: self.buf[1])
+    #below just for area calcs, one entry per segment
+    dx = property(lambda self: self.buf.data[2, 1:self.buf.n])
+    dy = property(lambda self: self.buf.data[3, 1:self.buf.n])
+    Tu = property(lambda self: self.buf.data[4, 1:self.buf.n])
+
+    def __len__(self):
+        return len(self.buf)
+
+    def update(self, add_x, add_y):
+        if len(self.buf):
+            xl, yl, __, __, __, S, C = self.buf.data[:, self.buf.n - 1]
+            dx, dy = add_x - xl, add_y - yl
+            Tu = np.hypot(dx, dy)
+            self.buf.append(add_x, add_y, dx, dy, Tu + np.finfo(float).eps, S + Tu, C + xl*add_y - add_x*yl)
+            if self.grid is not None:
+                self.grid.insert(add_x - dx, add_y - dy, add_x, add_y)
+        else:
+            self.buf.append(add_x, add_y, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+    def downdate(self):
+        if self.grid is not None and len(self) > 1:
+            self.grid.pop()
+        self.buf.pop()
+
+    def trim(self, k):
+        """Only keep points from index k on"""
+        self.buf.trim(k)
+        self.grid = None #segment indices shifted
+
+    def traced_length(self, xn = None, yn = None):
+        """Length along the points, continued to (xn, yn) if given"""
+        n = self.buf.n
+        if not n:
+            return 0.0
+        d = self.buf.data
+        L = d[5, n - 1] - d[5, 0]
+        if xn is not None:
+            L += np.hypot(xn - d[0, n - 1], yn - d[1, n - 1])
+        return L
+
+    def closed_area(self, xn = None, yn = None, k = 0):
+        """
+        Area of the polygon through the points from index k on, and (xn, yn)
+        if given, closed back to point k (shoelace formula from the running sums)
+        """
+        n = self.buf.n
+        if n - k < 1:
+            return 0.0
+        d = self.buf.data
+        x0, y0, xl, yl = d[0, k], d[1, k], d[0, n - 1], d[1, n - 1]
+        C = d[6, n - 1] - d[6, k]
+        if xn is not None:
+            C += xl*yn - xn*yl
+            xl, yl = xn, yn
+        return 0.5*abs(C + xl*y0 - x0*yl)
+
+    def checkIntersect(self, xn, yn):
+        """
+        Does the segment from the last point to (xn, yn) cross an earlier segment?
+        Returns (intersect, xi, yi, k) with k the index of the latest crossed segment.
+        Long outlines only test the segments a SegmentGrid finds near the new one.
+        """
+        n = len(self) - 1 #number of existing segments
+        if n < 1:
+            return False, None, None, None
+        px, py = self.x[-1], self.y[-1]
+        if n > self.grid_threshold:
+            if self.grid is None:
+                self.grid = SegmentGrid(self.x, self.y)
+            k = self.grid.candidates(px, py, xn, yn)
+        else:
+            k = np.arange(n)
+        if k is None: #query too large for the grid to help
+            k = np.arange(n)
+        hit, s = segment_intersections(self.x[k], self.y[k], self.dx[k], self.dy[k], px, py, xn, yn)
+        if not hit.any():
+            return False, None, None, None
+        j = np.flatnonzero(hit)[-1] #latest segment crossed
+        return True, px + s[j]*(xn - px), py + s[j]*(yn - py), k[j]
+
+    def calcArea(self):
+        A = polygon_area(self.x, self.y)
+        self.A = A
+        return A
+
+class angleData():
+
+    def __init__(self, t = ()):
+        self.buf = PointBuffer(1)
+        for ti in np.ravel(t):
+            self.update(ti)
+
+    t = property(lambda self: self.buf[0])
+
+    def update(self, add_t):
+        self.buf.append(add_t)
+
+    def downdate(self):
+        self.buf.pop()
@@ -0,0 +1,185 @@
+"""
+Long-format, columnar measurement datasets spanning many images.
+
+Every measurement of every image becomes one typed row with the fixed
+`schema` below, appended in batches to a dataset chosen by extension:
+
+    .parquet / .arrow   directory of part files, one per writer, a row group
+                        per batch (needs pyarrow)
+    .h5 / .hdf5         one file of resizable, chunked column datasets,
+                        appended in place (needs h5py)
+    .csv                one long-format table with a single header row
+
+read_dataset() loads a whole dataset as one column array per field, so a
+season of images is aggregated with one read instead of a parse per image.
+"""
+import os
+import csv
+import uuid
+import numpy as np
+
+from morphometrix.core import width_fractions
+
+#column name, numpy dtype; never reorder, only append
+schema = [
+    ('image_id', 'U'),
+    ('image_path', 'U'),
+    ('object', 'U'),
+    ('kind', 'U'), #length, width, area or angle
+    ('measurement', 'U'), #e.g. 'Length' or '45.45% Width'
+    ('fraction', 'f8'), #position of a width along its length, NaN otherwise
+    ('value', 'f8'),
+    ('unit', 'U'), #m, m² or deg
+    ('focal', 'f8'),
+    ('altitude', 'f8'),
+    ('pixeldim', 'f8'),
+    ('pixels', 'f8'), #value before calibration: px, px² or deg (see calibration.recalibrate)
+]
+names = [n for n, __ in schema]
+
+def measurement_records(record, results):
+    """Rows in schema order for one image, from core.measure() results"""
+    image = (record['image']['id'], record['image']['path'])
+    cal = results['calibration']
+    optics = (cal['focal'], cal['altitude'], cal['pixeldim'])
+    px = results['pixels']
+    rows = []
+    for name, l in results['lengths'].items():
+        rows.append(image + (name, 'length', 'Length', np.nan, l, 'm') + optics + (px['lengths'][name],))
+        if name in results['widths']:
+            width_names, widths = results['widths'][name]
+            for n, f, w, p in zip(width_names, width_fractions(len(width_names)), widths, px['widths'][name][1]):
+                rows.append(image + (name, 'width', n, f, w, 'm') + optics + (p,))
+    for name, a in results['angles'].items():
+        rows.append(image + (name, 'angle', 'Angle', np.nan, a, 'deg') + optics + (px['angles'][name],))
+    for name, a in results['areas'].items():
+        rows.append(image + (name, 'area', 'Area', np.nan, a, 'm²') + optics + (px['areas'][name],))
+    return rows
+
+def dataset_format(path):
+    ext = os.path.splitext(str(path).rstrip('/\\'))[1].lower()
+    formats = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow',
+               '.h5': 'hdf5', '.hdf5': 'hdf5', '.csv': 'csv'}
+    if ext not in formats:
+        raise ValueError(f"{path}: unknown dataset type, use one of {', '.join(formats)}")
+    return formats[ext]
+
+def _require(module, package):
+    try:
+        return __import__(module, fromlist = ['_'])
+    except ImportError:
+        raise ImportError(f"writing {package} datasets needs the optional '{package}' package "
+                          f"(pip install {package})") from None
+
+def _arrow_schema(pa):
+    types = {'U': pa.string(), 'f8': pa.float64()}
+    return pa.schema([(n, types[t]) for n, t in schema])
+
+class DatasetWriter():
+    """
+    Buffer rows (see measurement_records) and append them to a dataset every
+    `batch_rows` rows and on close. Use as a context manager.
+    """
+
+    def __init__(self, path, batch_rows = 65536, format = None):
+        self.path = str(path)
+        self.format = format or dataset_format(path)
+        self.batch_rows = batch_rows
+        self.rows = []
+        self._out = None
+        if self.format in ('parquet', 'arrow'):
+            self.pa = _require('pyarrow', 'pyarrow')
+            os.makedirs(self.path, exist_ok = True)
+        elif self.format == 'hdf5':
+            self.h5py = _require('h5py', 'h5py')
+
+    def writerows(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.batch_rows:
+            self.flush()
+
+    def columns(self):
+        """Buffered rows as {name: typed array}"""
+        cols = list(zip(*self.rows)) if self.rows else [()]*len(schema)
+        return {n: np.array(c, dtype = str if t == 'U' else t) for (n, t), c in zip(schema, cols)}
+
+    def flush(self):
+        if not self.rows:
+            return
+        getattr(self, '_write_' + self.format)(self.columns())
+        self.rows = []
+
+    def _write_parquet(self, cols):
+        pa = self.pa
+        table = pa.table({n: pa.array(c) for n, c in cols.items()}, schema = _arrow_schema(pa))
+        if self._out is None:
+            import pyarrow.parquet as pq
+            name = os.path.join(self.path, f'part-{uuid.uuid4().hex}.parquet')
+            self._out = pq.ParquetWriter(name, table.schema)
+        self._out.write_table(table) #one row group per batch
+
+    def _write_arrow(self, cols):
+        pa = self.pa
+        table = pa.table({n: pa.array(c) for n, c in cols.items()}, schema = _arrow_schema(pa))
+        if self._out is None:
+            import pyarrow.ipc
+            name = os.path.join(self.path, f'part-{uuid.uuid4().hex}.arrow')
+            self._out = pyarrow.ipc.new_file(name, table.schema)
+        self._out.write_table(table)
+
+    def _write_hdf5(self, cols):
+        h5py = self.h5py
+        if self._out is None:
+            self._out = h5py.File(self.path, 'a')
+        n0 = max((self._out[n].shape[0] for n in names if n in self._out), default = 0)
+        for (n, t), c in zip(schema, cols.values()):
+            if n not in self._out: #new file, or a column added to the schema since it was written
+                dtype = h5py.string_dtype() if t == 'U' else t
+                self._out.create_dataset(n, shape = (n0,), maxshape = (None,), dtype = dtype,
+                                         chunks = (min(self.batch_rows, 65536),),
+                                         fillvalue = '' if t == 'U' else np.nan)
+            d = self._out[n]
+            d.resize((d.shape[0] + len(c),))
+            d[-len(c):] = c.astype(object) if t == 'U' else c
+
+    def _write_csv(self, cols):
+        if self._out is None:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self._out = open(self.path, 'a', newline = '')
+            self._writer = csv.writer(self._out)
+            if new:
+                self._writer.writerow(names)
+        self._writer.writerows(self.rows)
+
+    def close(self):
+        self.flush()
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_dataset(path):
+    """Whole dataset as {name: numpy array}, in schema order"""
+    fmt = dataset_format(path)
+    if fmt in ('parquet', 'arrow'):
+        _require('pyarrow', 'pyarrow')
+        import pyarrow.dataset
+        table = pyarrow.dataset.dataset(path, format = 'parquet' if fmt == 'parquet' else 'ipc',
+                                        schema = _arrow_schema(pyarrow)).to_table()
+        return {n: table.column(n).to_numpy(zero_copy_only = False).astype(str if t == 'U' else t)
+                for n, t in schema}
+    if fmt == 'hdf5':
+        h5py = _require('h5py', 'h5py')
+        with h5py.File(path, 'r') as f:
+            return {n: f[n].asstr()[()].astype(str) if t == 'U' else f[n][()] for n, t in schema}
+    with open(path, newline = '') as f:
+        rows = list(csv.reader(f))
+    head, rows = (rows[0], rows[1:]) if rows else (names, [])
+    cols = dict(zip(head, zip(*rows))) if rows else {}
+    return {n: np.array(cols.get(n, [''] * len(rows) if t == 'U' else [np.nan] * len(rows)),
+                        dtype = str if t == 'U' else t) for n, t in schema}
@@ -0,0 +1,106 @@
+"""
+Edge proposals for width measurements.
+
+Rather than clicking both sides of the body at every width station, the
+intensity profile along each station's normal is sampled from the frame (all
+stations and both sides in one bilinear lookup) and the outline is proposed
+where the smoothed profile changes fastest going outward from the length
+curve. The body is assumed to differ from its background the same way on
+every profile, so only steps of the polarity most stations agree on are
+taken. Like morphometrix.core this depends only on NumPy; the GUI passes the
+frame in as a grey level array.
+"""
+import numpy as np
+
+def bilinear(image, x, y):
+    """
+    Grey levels of image (2-D array) at scene coordinates x, y of any shape,
+    pixel (i, j) being centred on (i + 0.5, j + 0.5). NaN outside the image.
+    """
+    image = np.asarray(image, dtype=float)
+    H, W = image.shape
+    u = np.asarray(x, dtype=float) - 0.5
+    v = np.asarray(y, dtype=float) - 0.5
+    inside = (u >= 0) & (u <= W - 1) & (v >= 0) & (v <= H - 1)
+    u, v = np.clip(u, 0, W - 1), np.clip(v, 0, H - 1)
+    i = np.minimum(u.astype(int), max(W - 2, 0))
+    j = np.minimum(v.astype(int), max(H - 2, 0))
+    fu, fv = u - i, v - j
+    i1, j1 = np.minimum(i + 1, W - 1), np.minimum(j + 1, H - 1)
+    top = image[j, i]*(1 - fu) + image[j, i1]*fu
+    bottom = image[j1, i]*(1 - fu) + image[j1, i1]*fu
+    return np.where(inside, top*(1 - fv) + bottom*fv, np.nan)
+
+def normal_profiles(image, origins, normals, reach, step = 1.0, offset = (0, 0)):
+    """
+    Intensity at distances s = 0, step, ... reach from each origin along +normal
+    and -normal. Returns s and the profiles, shape (2, stations, len(s)), each
+    running outward from its station. offset is the scene position of image[0, 0].
+    """
+    origins, normals = np.asarray(origins, dtype=float), np.asarray(normals, dtype=float)
+    s = np.arange(0.0, reach + step, step)
+    side = np.array([1.0, -1.0])[:,None,None]
+    x = origins[:,0,None] + side*s*normals[:,0,None] - offset[0]
+    y = origins[:,1,None] + side*s*normals[:,1,None] - offset[1]
+    return s, bilinear(image, x, y)
+
+def gradient(profiles, step = 1.0, sigma = 2.0):
+    """
+    Derivative of Gaussian (scale sigma, same units as step) along the last axis,
+    scaled to the slope of a ramp. Returns the gradient and the index of the
+    first sample it is centred on; windows reaching outside the image are NaN.
+    """
+    r = max(1, int(np.ceil(3*sigma/step)))
+    t = np.arange(-r, r + 1)*step
+    kernel = t*np.exp(-0.5*(t/sigma)**2)
+    kernel /= np.dot(t, kernel)
+    m = profiles.shape[-1] - 2*r
+    if m < 1:
+        return np.full(profiles.shape[:-1] + (0,), np.nan), r
+    g = np.zeros(profiles.shape[:-1] + (m,))
+    for k, w in enumerate(kernel): #one shifted multiply-add per tap
+        g += w*profiles[...,k:k + m]
+    return g, r
+
+def propose_edges(image, origins, normals, reach, step = 1.0, sigma = 2.0, offset = (0, 0)):
+    """
+    Proposed width points for stations at origins with unit normals, searched up
+    to reach pixels either side. Returns the points, shape (2*stations, 2) in the
+    order widths are clicked (the +normal side then the -normal side of each
+    station), and the strength of each edge, shape (stations, 2), relative to
+    the median edge (0 where none was found; the point is then left on the
+    station for the analyst to place).
+    """
+    origins, normals = np.asarray(origins, dtype=float), np.asarray(normals, dtype=float)
+    s, P = normal_profiles(image, origins, normals, reach, step, offset)
+    g, r = gradient(P, step, sigma)
+    n = len(origins)
+    if not g.shape[-1]:
+        return np.repeat(origins, 2, axis = 0), np.zeros((n, 2))
+    g = np.where(np.isfinite(g), g, 0.0)
+
+    #body to background polarity agreed by the strongest step on every profile
+    peak = np.take_along_axis(g, np.argmax(np.abs(g), axis = -1)[...,None], axis = -1)[...,0]
+    polarity = 1.0 if np.sum(peak) >= 0 else -1.0
+    score = polarity*g
+    idx = np.argmax(score, axis = -1)
+    best = np.take_along_axis(score, idx[...,None], axis = -1)[...,0]
+
+    #sub-sample position from a parabola through the peak and its neighbours
+    a = np.take_along_axis(score, np.maximum(idx - 1, 0)[...,None], axis = -1)[...,0]
+    c = np.take_along_axis(score, np.minimum(idx + 1, g.shape[-1] - 1)[...,None], axis = -1)[...,0]
+    curvature = a - 2*best + c
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        shift = np.where(curvature < 0, 0.5*(a - c)/curvature, 0.0)
+    d = s[r + idx] + np.clip(shift, -0.5, 0.5)*step
+
+    #a step at roundoff level of the grey levels is a flat profile, not an edge
+    found = best > 1e-9*np.abs(np.where(np.isfinite(P), P, 0.0)).max(initial = 0.0)
+    d = np.where(found, d, 0.0)
+    strength = np.where(found, best, 0.0)
+    if found.any():
+        strength = strength/np.median(strength[found])
+
+    side = np.array([1.0, -1.0])[:,None,None]
+    points = origins + side*d[...,None]*normals #(2, stations, 2)
+    return points.transpose(1, 0, 2).reshape(-1, 2), strength.T
@@ -0,0 +1,75 @@
+"""
+Off-screen export of the measurement table and annotated image.
+
+Only the measurement graphics are rendered on the GUI thread (scene items are
+not thread safe), into a transparent QImage at the frame's native resolution
+or a set fraction of it. Decoding the frame at that size, compositing, PNG
+encoding and writing the .csv/.json/.npz/dataset files all run on a worker
+thread, so the window stays responsive while an export is written.
+"""
+import csv
+
+from PyQt6 import QtGui, QtCore
+
+from morphometrix.core import save_annotations, measure
+from morphometrix.session import save_session
+from morphometrix.dataset import DatasetWriter, measurement_records
+
+def export_size(width, height, scale = 1.0, max_pixels = 48e6):
+    """
+    Output size for a width x height frame at scale, reduced to at most
+    max_pixels (full decodes above ~64 MP exceed Qt's image allocation limit)
+    """
+    scale = min(scale, (max_pixels / (width * height))**0.5)
+    return QtCore.QSize(max(1, round(width * scale)), max(1, round(height * scale)))
+
+def render_overlay(scene, source, size, hide = ()):
+    """Scene area source drawn into a transparent QImage of size, without the items in hide"""
+    overlay = QtGui.QImage(size, QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    overlay.fill(QtCore.Qt.GlobalColor.transparent)
+    visible = [item.isVisible() for item in hide]
+    for item in hide:
+        item.setVisible(False)
+    painter = QtGui.QPainter(overlay)
+    painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+    scene.render(painter, QtCore.QRectF(overlay.rect()), source)
+    painter.end()
+    for item, v in zip(hide, visible):
+        item.setVisible(v)
+    return overlay
+
+def compose(path, overlay):
+    """Frame at path decoded at the overlay's size with the overlay drawn on top"""
+    reader = QtGui.QImageReader(path)
+    if reader.size() != overlay.size():
+        reader.setScaledSize(overlay.size())
+    image = reader.read()
+    if image.isNull():
+        raise IOError(f"cannot decode {path}: {reader.errorString()}")
+    image = image.convertToFormat(QtGui.QImage.Format.Format_RGB32)
+    painter = QtGui.QPainter(image)
+    painter.drawImage(0, 0, overlay)
+    painter.end()
+    return image
+
+def write_export(name, rows, record, overlay = None, dataset = None):
+    """
+    Write name.csv (rows), name.json and name.npz (record), append to dataset
+    if given and save name-measurements.png from the overlay. Safe to run off
+    the GUI thread; returns name.
+    """
+    with open(name + '.csv', 'w', newline = '') as f:
+        csv.writer(f).writerows(rows)
+
+    #Keep raw geometry so measurements can be re-derived headless (morphometrix-batch)
+    save_annotations(name + '.json', record)
+    save_session(name + '.npz', record) #binary session, reopened with "Open Session"
+    if dataset: #one columnar table across images
+        with DatasetWriter(dataset) as ds:
+            ds.writerows(measurement_records(record, measure(record)))
+
+    if overlay is not None:
+        image = compose(record['image']['path'], overlay)
+        if not image.save(name + '-measurements.png'):
+            raise IOError(f"cannot write {name}-measurements.png")
+    return name
@@ -0,0 +1,49 @@
+"""
+Scene items for fitted measurements.
+
+A fitted Bezier length is drawn as a single CurveItem rather than one path
+item per curve sample. The polyline is tessellated from the curve itself to a
+fixed on-screen tolerance, so it is rebuilt (lazily, on the next paint) only
+when the zoom changes by a factor of two, and each zoom level's path is kept.
+"""
+import math
+
+from PyQt6 import QtGui, QtCore
+from PyQt6.QtWidgets import QGraphicsItem
+
+from morphometrix.core import tessellate
+
+class CurveItem(QGraphicsItem):
+
+    def __init__(self, curve, tol = 0.25, pen = None, parent = None):
+        super(CurveItem, self).__init__(parent)
+        self.curve = curve
+        self.tol = tol #max deviation from the curve in screen pixels
+        self.pen = pen if pen is not None else QtGui.QPen()
+        self._paths = {} #zoom level -> QPainterPath
+        #a Bezier curve lies inside the convex hull of its control points,
+        #so the bounds never change when the curve is re-tessellated
+        (x0, y0), (x1, y1) = curve.P.min(axis = 0), curve.P.max(axis = 0)
+        pad = max(self.pen.widthF(), 1.0)
+        self._bounds = QtCore.QRectF(x0, y0, x1 - x0, y1 - y0).adjusted(-pad, -pad, pad, pad)
+
+    def boundingRect(self):
+        return self._bounds
+
+    def path(self, level = 0):
+        """Path accurate to tol pixels at any zoom up to 2**level"""
+        if level not in self._paths:
+            __, B = tessellate(self.curve, self.tol / 2**level)
+            path = QtGui.QPainterPath()
+            path.addPolygon(QtGui.QPolygonF([QtCore.QPointF(x, y) for x, y in B]))
+            self._paths[level] = path
+        return self._paths[level]
+
+    def shape(self):
+        return QtGui.QPainterPathStroker(self.pen).createStroke(self.path())
+
+    def paint(self, painter, option, widget = None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = min(max(math.ceil(math.log2(max(lod, 1e-6))), -8), 16)
+        painter.setPen(self.pen)
+        painter.drawPath(self.path(level))
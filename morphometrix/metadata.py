@@ -0,0 +1,215 @@
+"""
+Camera details read from image metadata.
+
+Focal length and camera model come from the EXIF tags of JPEG and TIFF
+frames, the height above the take-off point from DJI's XMP packet
+(drone-dji:RelativeAltitude). The pixel dimension is the sensor width of
+the camera in `cameras` divided by the image width, or failing that derived
+from the EXIF focal plane resolution or 35 mm equivalent focal length.
+Headers are parsed with the standard library only.
+
+Parsed metadata is kept in an on-disk index (a SQLite file in the cache
+directory) keyed by path, modification time and size, so reopening a flight
+folder is a lookup per image rather than a header parse.
+"""
+import os
+import re
+import json
+import struct
+import sqlite3
+
+from morphometrix.cache import cache_dir
+
+#sensor width (mm) by EXIF camera model; add entries for other cameras here
+cameras = {
+    'FC6310': 13.2, #Phantom 4 Pro
+    'FC6310S': 13.2, #Phantom 4 Pro V2
+    'FC6510': 13.2, #Zenmuse X4S
+    'FC6520': 17.3, #Zenmuse X5S
+    'L1D-20c': 13.2, #Mavic 2 Pro
+    'FC3411': 13.2, #Air 2S
+    'FC220': 6.17, #Mavic Pro
+    'FC330': 6.17, #Phantom 4
+    'FC300X': 6.17, #Phantom 3 Professional/Advanced
+    'FC300S': 6.17, #Phantom 3 Standard
+    'FC7203': 6.17, #Mavic Mini
+    'FC7303': 6.17, #Mini 2
+    'ILCE-6000': 23.5, #Sony a6000
+    'ILCE-5100': 23.5, #Sony a5100
+}
+
+#EXIF tags used
+MAKE, MODEL, EXIF_IFD, XMP = 0x010F, 0x0110, 0x8769, 0x02BC
+FOCAL, FOCAL_35, WIDTH, HEIGHT = 0x920A, 0xA405, 0xA002, 0xA003
+PLANE_XRES, PLANE_UNIT = 0xA20E, 0xA210
+IMAGE_WIDTH, IMAGE_HEIGHT = 0x0100, 0x0101 #TIFF only; an Exif IFD0 describes the thumbnail
+
+#bytes per value of each TIFF field type, struct code; BYTE and UNDEFINED fields are kept as bytes
+_types = {1: (1, 's'), 2: (1, 's'), 3: (2, 'H'), 4: (4, 'I'), 5: (8, 'II'), 7: (1, 's'),
+          8: (2, 'h'), 9: (4, 'i'), 10: (8, 'ii'), 11: (4, 'f'), 12: (8, 'd')}
+
+def _ifd(buf, offset, endian):
+    """Tags of the TIFF image file directory at offset, {tag: value}"""
+    tags = {}
+    n, = struct.unpack_from(endian + 'H', buf, offset)
+    for i in range(n):
+        tag, typ, count, value = struct.unpack_from(endian + 'HHI4s', buf, offset + 2 + 12*i)
+        if typ not in _types:
+            continue
+        size, code = _types[typ]
+        if size * count > 4:
+            start, = struct.unpack(endian + 'I', value)
+            value = buf[start:start + size*count]
+        if code == 's':
+            tags[tag] = bytes(value[:count]).split(b'\0')[0].decode('latin-1').strip() if typ == 2 \
+                        else bytes(value[:count])
+            continue
+        v = struct.unpack_from(endian + code * count, value)
+        if typ in (5, 10): #rationals
+            v = tuple(v[j] / v[j+1] if v[j+1] else float('nan') for j in range(0, len(v), 2))
+        tags[tag] = v[0] if count == 1 else v
+    return tags
+
+def parse_tiff(buf):
+    """IFD0 and Exif IFD tags of a TIFF structure (an Exif block or a .tif file)"""
+    endian = {b'II': '<', b'MM': '>'}.get(bytes(buf[:2]))
+    if endian is None:
+        return {}
+    offset, = struct.unpack_from(endian + 'I', buf, 4)
+    tags = _ifd(buf, offset, endian)
+    if EXIF_IFD in tags:
+        tags.update(_ifd(buf, tags.pop(EXIF_IFD), endian))
+    return tags
+
+#JPEG start of frame markers, which carry the image size
+_sof = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def jpeg_segments(f):
+    """(marker, payload) of the segments of the JPEG in file f, up to the start of the image data"""
+    if f.read(2) != b'\xff\xd8':
+        return
+    while True:
+        head = f.read(4)
+        if len(head) < 4 or head[0] != 0xFF or head[1] == 0xDA: #start of scan
+            return
+        length, = struct.unpack('>H', head[2:])
+        yield head[1], f.read(length - 2)
+
+def read_headers(path):
+    """(EXIF tags, XMP packet, (width, height)) of an image file; empty when it has none"""
+    tags, xmp, size = {}, '', (None, None)
+    with open(path, 'rb') as f:
+        if path.lower().endswith(('.tif', '.tiff')):
+            buf = f.read()
+            tags = parse_tiff(buf)
+            xmp = tags.pop(XMP, b'')
+            xmp = bytes(xmp).decode('utf-8', 'replace') if isinstance(xmp, (bytes, tuple)) else ''
+            size = (tags.get(IMAGE_WIDTH), tags.get(IMAGE_HEIGHT))
+        else:
+            for marker, data in jpeg_segments(f):
+                if marker == 0xE1 and data.startswith(b'Exif\0\0'):
+                    tags = parse_tiff(memoryview(data)[6:])
+                elif marker == 0xE1 and data.startswith(b'http://ns.adobe.com/xap/1.0/\0'):
+                    xmp = data[29:].decode('utf-8', 'replace')
+                elif marker in _sof:
+                    height, width = struct.unpack_from('>HH', data, 1)
+                    size = (width, height)
+    return tags, xmp, size
+
+def xmp_value(xmp, name):
+    """Value of an XMP property written as an attribute or an element, None if absent"""
+    m = re.search(rf'{name}\s*=\s*"([^"]*)"|<{name}>([^<]*)</{name}>', xmp)
+    return None if m is None else (m.group(1) if m.group(1) is not None else m.group(2)).strip()
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+#tags written with an unexpected type parse to other values, these keep only what fits
+def _text(value):
+    return value if isinstance(value, str) and value else None
+
+def _count(value):
+    return value if isinstance(value, int) and value > 0 else None
+
+def read_metadata(path):
+    """
+    Camera details of one image as a JSON-able dict: make, model, focal (mm),
+    focal_35mm, width and height (px), relative_altitude (m) and pixeldim
+    (mm/pixel). Entries that cannot be found are None.
+    """
+    try:
+        tags, xmp, (width, height) = read_headers(path)
+    except (OSError, struct.error, ValueError, TypeError, IndexError): #unreadable or malformed headers
+        tags, xmp, width, height = {}, '', None, None
+    meta = {
+        'make': _text(tags.get(MAKE)) or xmp_value(xmp, 'tiff:Make'),
+        'model': _text(tags.get(MODEL)) or xmp_value(xmp, 'tiff:Model'),
+        'focal': _number(tags.get(FOCAL)),
+        'focal_35mm': _number(tags.get(FOCAL_35)),
+        'width': _count(width) or _count(tags.get(WIDTH)),
+        'height': _count(height) or _count(tags.get(HEIGHT)),
+        'relative_altitude': _number(xmp_value(xmp, 'drone-dji:RelativeAltitude')),
+    }
+    meta['pixeldim'] = pixel_pitch(meta, _number(tags.get(PLANE_XRES)), _count(tags.get(PLANE_UNIT)))
+    return meta
+
+def pixel_pitch(meta, plane_xres = None, plane_unit = None):
+    """Pixel dimension (mm) from the camera table, focal plane resolution or 35 mm equivalent"""
+    width = meta['width']
+    if meta['model'] in cameras and width:
+        return cameras[meta['model']] / width
+    units = {2: 25.4, 3: 10.0, 4: 1.0} #inch, cm, mm
+    if plane_xres and plane_unit in units:
+        return units[plane_unit] / plane_xres
+    if meta['focal'] and meta['focal_35mm'] and width and meta['height']:
+        #35 mm frame diagonal over the image diagonal in pixels
+        return meta['focal'] / meta['focal_35mm'] * 43.2666 / (width**2 + meta['height']**2)**0.5
+    return None
+
+def calibration(meta):
+    """The calibration entries (focal, altitude, pixeldim) known from metadata"""
+    cal = {'focal': meta.get('focal'), 'altitude': meta.get('relative_altitude'),
+           'pixeldim': meta.get('pixeldim')}
+    return {k: v for k, v in cal.items() if v}
+
+class MetadataIndex():
+    """
+    Parsed metadata of every image seen, stored in a SQLite file (default
+    <cache>/metadata/index.sqlite). An entry is reused while the image's
+    modification time and size are unchanged. Safe to share between processes.
+    """
+
+    def __init__(self, path = None):
+        self.path = path or os.path.join(cache_dir('metadata'), 'index.sqlite')
+        self.pid = os.getpid()
+        self.db = sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+        self.db.execute('CREATE TABLE IF NOT EXISTS metadata '
+                        '(path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, meta TEXT)')
+
+    def get(self, path):
+        """Metadata of the image at path, parsed only if not indexed or changed"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        row = self.db.execute('SELECT meta FROM metadata WHERE path = ? AND mtime = ? AND size = ?',
+                              (path, st.st_mtime_ns, st.st_size)).fetchone()
+        if row:
+            return json.loads(row[0])
+        meta = read_metadata(path)
+        self.db.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)',
+                        (path, st.st_mtime_ns, st.st_size, json.dumps(meta)))
+        return meta
+
+    def close(self):
+        self.db.close()
+
+_index = None
+
+def image_calibration(path):
+    """Calibration entries for the image at path from the shared index of this process"""
+    global _index
+    if _index is None or _index.pid != os.getpid(): #connections do not survive a fork
+        _index = MetadataIndex()
+    return calibration(_index.get(path))
@@ -0,0 +1,124 @@
+"""
+Background decoding of the images in a measuring session.
+
+ImagePrefetcher decodes the next few images of a folder or file list on a
+thread pool while the analyst works on the current one. Decoded images are
+QImages (safe to create off the GUI thread) held in an LRU bounded by bytes;
+frames large enough to be shown from a TilePyramid only have the pyramid level
+used for the initial fit-to-window view decoded ahead of time.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+from PyQt6 import QtGui
+
+from morphometrix.tiles import TilePyramid
+
+image_extensions = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp')
+
+def list_images(folder):
+    """Image files directly inside folder, sorted by name"""
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                  if f.lower().endswith(image_extensions))
+
+def decode(path, tile_threshold = 24e6, view_size = None):
+    """
+    QImage for ordinary frames, TilePyramid (with the fit-to-view level warmed
+    when view_size is given) for frames above tile_threshold pixels
+    """
+    size = QtGui.QImageReader(path).size() #header only
+    if size.width() * size.height() > tile_threshold:
+        pyramid = TilePyramid(path)
+        if view_size is not None:
+            lod = min(view_size.width() / pyramid.width, view_size.height() / pyramid.height)
+            level = pyramid.level_for(lod)
+            cols, rows = pyramid.grid(level)
+            for j in range(rows):
+                pyramid(level, 0, j) #decodes the whole row
+        return pyramid
+    reader = QtGui.QImageReader(path)
+    img = reader.read()
+    if img.isNull():
+        raise IOError(f"cannot decode {path}: {reader.errorString()}")
+    return img
+
+def nbytes(item):
+    """Memory held by a decoded item, a pyramid's grows as tiles are decoded"""
+    return item.sizeInBytes() if isinstance(item, QtGui.QImage) else item._bytes
+
+class ImagePrefetcher():
+
+    def __init__(self, paths, ahead = 3, workers = 2, max_bytes = 1024*2**20, tile_threshold = 24e6, view_size = None):
+        self.paths = list(paths)
+        self.ahead = ahead
+        self.max_bytes = max_bytes
+        self.tile_threshold = tile_threshold
+        self.view_size = view_size
+        self._pool = ThreadPoolExecutor(max_workers = workers)
+        self._futures = {} #index -> pending decode
+        self._cache = OrderedDict() #index -> decoded image, LRU order
+        self._bytes = 0 #as of the last eviction pass
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _submit(self, index):
+        with self._lock:
+            if index in self._cache or index in self._futures:
+                return
+            future = self._pool.submit(decode, self.paths[index], self.tile_threshold, self.view_size)
+            self._futures[index] = future
+        future.add_done_callback(lambda f, index = index: self._done(index, f))
+
+    def _done(self, index, future):
+        with self._lock:
+            self._futures.pop(index, None)
+            if future.cancelled() or future.exception() is not None:
+                return #errors resurface when the image is requested
+            self._cache[index] = future.result()
+            self._evict()
+
+    def _evict(self):
+        """
+        Drop least recently used images beyond max_bytes. Pyramids keep decoding
+        tiles after they are cached (zooming in, edge proposals), so every entry
+        is measured afresh rather than charged its size when it was inserted.
+        Call with the lock held.
+        """
+        sizes = {index: nbytes(item) for index, item in self._cache.items()}
+        self._bytes = sum(sizes.values())
+        while self._bytes > self.max_bytes and len(self._cache) > 1:
+            index, __ = self._cache.popitem(last = False)
+            self._bytes -= sizes[index]
+
+    def prefetch(self, index):
+        """Queue decodes of the images following index, drop queued ones that fell out of range"""
+        wanted = range(index + 1, min(len(self.paths), index + 1 + self.ahead))
+        with self._lock:
+            self._evict() #the frame left behind may have grown while it was shown
+            for i, f in list(self._futures.items()):
+                if i not in wanted and i != index and f.cancel():
+                    self._futures.pop(i)
+        for i in wanted:
+            self._submit(i)
+
+    def get(self, index):
+        """Decoded image at index, waits for its prefetch or decodes it right away"""
+        with self._lock:
+            item = self._cache.get(index)
+            if item is not None:
+                self._cache.move_to_end(index)
+                return item
+            future = self._futures.get(index)
+        if future is not None:
+            try:
+                return future.result()
+            except CancelledError:
+                pass
+        return decode(self.paths[index], self.tile_threshold, self.view_size)
+
+    def close(self):
+        self._pool.shutdown(wait = False, cancel_futures = True)
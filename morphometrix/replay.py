@@ -0,0 +1,264 @@
+"""
+Record and replay measuring sessions for performance profiling.
+
+A Recorder attached to a MainWindow captures what the analyst does: mouse
+moves, presses, releases, double clicks and wheel steps on the image view
+(in scene coordinates, so a replay does not depend on the view), toolbar
+actions with the names typed into their dialogs, keyboard shortcuts and the
+image being measured. A Recording is a handful of flat arrays saved to a
+compressed .npz.
+
+replay() feeds a recording back through a MainWindow as fast as the
+handlers allow (or at the recorded pace) and times every event from
+dispatch until the event queue is idle again, so deferred work such as the
+throttled preview is included. report() summarizes those latencies per
+event type as log-spaced histograms:
+
+    python -m morphometrix --record sluggish.npz     #measure as usual, then quit
+    python -m morphometrix.replay sluggish.npz       #headless, offscreen Qt
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from PyQt6 import QtCore, QtGui
+from PyQt6.QtWidgets import QApplication, QInputDialog
+from PyQt6.QtGui import QShortcut
+
+version = 1
+kinds = ('move', 'press', 'release', 'dclick', 'wheel', 'action', 'shortcut', 'open')
+#toolbar buttons recorded, and where the text typed into their dialog ends up
+actions = {'lengthButton': 'lengthNames', 'areaButton': 'areaNames', 'angleButton': 'angleNames',
+           'widthsButton': None, 'undoButton': None, 'bezier': None, 'piecewise': None}
+
+_mouse = {QtCore.QEvent.Type.MouseMove: 'move', QtCore.QEvent.Type.MouseButtonPress: 'press',
+          QtCore.QEvent.Type.MouseButtonRelease: 'release',
+          QtCore.QEvent.Type.MouseButtonDblClick: 'dclick', QtCore.QEvent.Type.Wheel: 'wheel'}
+
+class Recording():
+    """
+    Event stream as columns: time (s from start), kind (index into kinds),
+    scene x, y, mouse button, buttons held, modifiers, wheel delta and arg
+    (index into strings: action name or shortcut key, -1 for none), plus the
+    window size the stream was recorded at.
+    """
+
+    fields = (('t', np.float64), ('kind', np.uint8), ('x', np.float64), ('y', np.float64),
+              ('button', np.uint32), ('buttons', np.uint32), ('modifiers', np.uint32),
+              ('delta', np.int32), ('arg', np.int32))
+
+    def __init__(self, size = (1200, 800)):
+        self.size = tuple(size)
+        self.strings = []
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def append(self, t, kind, x = 0.0, y = 0.0, button = 0, buttons = 0, modifiers = 0, delta = 0, *args):
+        """Add one event; args are strings (action name and dialog text, shortcut key or image path)"""
+        arg = -1
+        if args:
+            arg = len(self.strings)
+            self.strings.append('\0'.join(str(a) for a in args))
+        self.rows.append((t, kinds.index(kind), x, y, button, buttons, modifiers, delta, arg))
+
+    def columns(self):
+        cols = list(zip(*self.rows)) if self.rows else [()] * len(self.fields)
+        return {n: np.array(c, dtype = t) for (n, t), c in zip(self.fields, cols)}
+
+    def args(self, i):
+        """Strings attached to event i"""
+        a = self.rows[i][-1]
+        return self.strings[a].split('\0') if a >= 0 else []
+
+    def kind(self, i):
+        return kinds[self.rows[i][1]]
+
+    def save(self, path):
+        np.savez_compressed(path, version = np.array(version), size = np.array(self.size),
+                            kinds = np.array(kinds), strings = np.array(self.strings, dtype = str),
+                            **self.columns())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle = False) as z:
+            if int(z['version']) > version:
+                raise ValueError(f"{path}: recording version {int(z['version'])} is newer than supported ({version})")
+            rec = cls(z['size'].tolist())
+            rec.strings = z['strings'].tolist()
+            stored = z['kinds'].tolist() #map stored kind indices by name
+            cols = [z[n] for n, __ in cls.fields]
+            cols[1] = np.array([kinds.index(stored[k]) for k in cols[1]], dtype = np.uint8)
+            rec.rows = [tuple(r) for r in zip(*[c.tolist() for c in cols])]
+        return rec
+
+class Recorder(QtCore.QObject):
+    """Records the interaction with window (a MainWindow) until stop()"""
+
+    def __init__(self, window):
+        super(Recorder, self).__init__(window)
+        self.window = window
+        self.recording = Recording((window.width(), window.height()))
+        self.t0 = time.perf_counter()
+        self.image = None
+        self.viewport = window.iw.viewport()
+        self.counts = {}
+        for name, names in actions.items():
+            button = getattr(window, name)
+            self.counts[name] = len(getattr(window, names)) if names else 0
+            #connected after the window's own slot, so any dialog has been answered
+            button.clicked.connect(lambda checked, name = name: self.action(name))
+        QApplication.instance().installEventFilter(self)
+
+    def now(self):
+        return time.perf_counter() - self.t0
+
+    def check_image(self):
+        path = getattr(self.window, 'image_name', (None,))[0]
+        if path and path != self.image:
+            self.image = path
+            self.recording.append(self.now(), 'open', 0.0, 0.0, 0, 0, 0, 0, path)
+
+    def action(self, name):
+        self.check_image()
+        names = actions[name]
+        if names:
+            L = getattr(self.window, names)
+            answered = len(L) > self.counts[name]
+            self.counts[name] = len(L)
+            args = (name, L[-1]) if answered else (name,) #no text: the dialog was cancelled
+        elif name == 'widthsButton':
+            args = (name, self.window.subWin.numwidths.text(), str(int(self.window.subWin.snap.isChecked())))
+        else:
+            args = (name,)
+        self.recording.append(self.now(), 'action', 0.0, 0.0, 0, 0, 0, 0, *args)
+
+    def eventFilter(self, obj, event):
+        kind = _mouse.get(event.type())
+        if kind and obj is self.viewport:
+            self.check_image()
+            p = self.window.iw.mapToScene(event.position().toPoint())
+            if kind == 'wheel':
+                button, delta = 0, event.angleDelta().y()
+            else:
+                button, delta = event.button().value, 0
+            self.recording.append(self.now(), kind, p.x(), p.y(), button, event.buttons().value,
+                                  event.modifiers().value, delta)
+        elif event.type() == QtCore.QEvent.Type.Shortcut and isinstance(obj, QShortcut):
+            self.recording.append(self.now(), 'shortcut', 0.0, 0.0, 0, 0, 0, 0,
+                                  event.key().toString())
+        return False
+
+    def stop(self):
+        QApplication.instance().removeEventFilter(self)
+        return self.recording
+
+def replay(window, recording, realtime = False, image = None):
+    """
+    Drive window (a MainWindow) through recording, returns the latency (s)
+    of every event. With realtime the recorded pauses are kept, otherwise
+    events follow each other as soon as the previous one is handled. image
+    replaces the recorded image path(s).
+    """
+    view, vp = window.iw, window.iw.viewport()
+    window.resize(*recording.size)
+    QApplication.processEvents()
+    answers = []
+    getText = QInputDialog.getText
+    QInputDialog.getText = staticmethod(lambda *a, **k: answers.pop(0) if answers else ('', False))
+    latency = np.zeros(len(recording))
+    start = time.perf_counter()
+    try:
+        for i, (t, kind, x, y, button, buttons, modifiers, delta, arg) in enumerate(recording.rows):
+            kind = kinds[kind]
+            if realtime:
+                time.sleep(max(0.0, t - (time.perf_counter() - start)))
+            pos = QtCore.QPointF(view.mapFromScene(QtCore.QPointF(x, y)))
+            gpos = QtCore.QPointF(vp.mapToGlobal(pos))
+            t0 = time.perf_counter()
+            if kind in ('move', 'press', 'release', 'dclick'):
+                types = {'move': QtCore.QEvent.Type.MouseMove, 'press': QtCore.QEvent.Type.MouseButtonPress,
+                         'release': QtCore.QEvent.Type.MouseButtonRelease,
+                         'dclick': QtCore.QEvent.Type.MouseButtonDblClick}
+                event = QtGui.QMouseEvent(types[kind], pos, gpos, QtCore.Qt.MouseButton(button),
+                                          QtCore.Qt.MouseButton(buttons), QtCore.Qt.KeyboardModifier(modifiers))
+                QApplication.sendEvent(vp, event)
+            elif kind == 'wheel':
+                event = QtGui.QWheelEvent(pos, gpos, QtCore.QPoint(), QtCore.QPoint(0, delta),
+                                          QtCore.Qt.MouseButton(buttons), QtCore.Qt.KeyboardModifier(modifiers),
+                                          QtCore.Qt.ScrollPhase.NoScrollPhase, False)
+                QApplication.sendEvent(vp, event)
+            elif kind == 'action':
+                name, *text = recording.args(i)
+                if name == 'widthsButton' and text:
+                    window.subWin.numwidths.setText(text[0])
+                    window.subWin.snap.setChecked(text[1:] == ['1']) #not recorded before edge proposals
+                elif text:
+                    answers.append((text[0], True))
+                getattr(window, name).click()
+            elif kind == 'shortcut':
+                key = recording.args(i)[0]
+                for s in window.findChildren(QShortcut):
+                    if s.key().toString() == key:
+                        s.activated.emit()
+            elif kind == 'open':
+                window.start_session([image or recording.args(i)[0]])
+            QApplication.processEvents()
+            latency[i] = time.perf_counter() - t0
+    finally:
+        QInputDialog.getText = getText
+    return latency
+
+def report(recording, latency, bins = None):
+    """
+    Text histogram of latencies per event type, with percentiles. latency may
+    hold several replays of recording one after the other.
+    """
+    bins = np.logspace(-5, 1, 25) if bins is None else bins #10 us to 10 s, 4 per decade
+    kind = np.array([r[1] for r in recording.rows], dtype = int)
+    kind = np.tile(kind, len(latency) // max(len(kind), 1))
+    lines = []
+    for k, name in enumerate(kinds):
+        L = latency[kind == k]
+        if not len(L):
+            continue
+        p50, p90, p99 = np.percentile(L, [50, 90, 99]) * 1e3
+        lines.append(f"{name}: {len(L)} events, p50 {p50:.3f} ms, p90 {p90:.3f} ms, "
+                     f"p99 {p99:.3f} ms, max {L.max()*1e3:.3f} ms, total {L.sum():.3f} s")
+        counts = np.histogram(np.clip(L, bins[0], bins[-1]), bins)[0]
+        scale = 50 / counts.max()
+        for lo, hi, c in zip(bins[:-1], bins[1:], counts):
+            if c:
+                lines.append(f"  {lo*1e3:9.3f} - {hi*1e3:9.3f} ms {c:7d} {'#' * max(1, round(c * scale))}")
+    return '\n'.join(lines)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'python -m morphometrix.replay',
+                                     description = 'Replay a recorded MorphoMetriX session and report event latencies')
+    parser.add_argument('recording', help = '.npz file written by python -m morphometrix --record')
+    parser.add_argument('--image', help = 'image to measure instead of the recorded one')
+    parser.add_argument('--realtime', action = 'store_true', help = 'keep the recorded pauses between events')
+    parser.add_argument('--repeat', type = int, default = 1, help = 'replays to run, each in a fresh window')
+    parser.add_argument('--window', action = 'store_true', help = 'show the window instead of the offscreen platform')
+    args = parser.parse_args(argv)
+
+    if not args.window:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    from morphometrix.__main__ import MainWindow
+    recording = Recording.load(args.recording)
+    latency = []
+    for __ in range(args.repeat):
+        window = MainWindow()
+        window.show()
+        latency.append(replay(window, recording, args.realtime, args.image))
+        window.close()
+        window.deleteLater()
+        app.processEvents()
+    print(report(recording, np.concatenate(latency)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Binary session files.
+
+A session (.npz) holds everything needed to bring one image's measurements
+back: the raw clicked pixel geometry, names, width configuration and
+calibration, plus the derived pixel values and the drawn curve polylines.
+Ragged geometry is packed into a few flat arrays with offsets, one row per
+measurement, and the archive is stored uncompressed so load_session() can
+memory map every array in place. Reloading the overlay or re-exporting with
+a new calibration is then a file read, with no curve fitting.
+
+Sessions are saved to a temporary file that then replaces the old one, so
+re-saving over a session whose arrays are still mapped leaves them intact.
+Windows can't replace a file while it is mapped, so there sessions are read
+into memory instead.
+"""
+import os
+import json
+import mmap
+import zipfile
+import numpy as np
+
+from morphometrix.core import (fit_length, tessellate, widths_from_points,
+                               polygon_area, angle)
+
+version = 1
+kinds = ('length', 'area', 'angle')
+
+def _pack(arrays, dim = 2):
+    """Concatenate ragged (n_i, dim) arrays, returns (flat, offsets)"""
+    arrays = [np.asarray(a, dtype=float).reshape(-1, dim) for a in arrays]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(a) for a in arrays])
+    flat = np.concatenate(arrays) if arrays else np.empty((0, dim))
+    return flat, offsets
+
+def save_session(path, record):
+    """
+    Write an annotation record (see MainWindow.annotations) to a session file.
+    Derived values missing from the record ('length', 'error', 'curve' for
+    lengths, 'area', 'angle') are computed here once, so loading never has to.
+    """
+    M = [('length', m) for m in record.get('lengths', [])] + \
+        [('area', m) for m in record.get('areas', [])] + \
+        [('angle', m) for m in record.get('angles', [])]
+
+    values, errors, curves, width_points, width_values = [], [], [], [], []
+    for kind, m in M:
+        P = np.asarray(m['points'], dtype=float)
+        error, curve, W = 0.0, np.empty((0, 2)), np.empty((0, 2))
+        if kind == 'length':
+            if 'length' in m and 'curve' in m:
+                value, error, curve = m['length'], m.get('error', 0.0), m['curve']
+            else:
+                fit, arc = fit_length(P, m.get('bezier', True), m.get('max_degree'))
+                value, error = arc.length, arc.error
+                if m.get('bezier', True) and len(P) > 2:
+                    curve = tessellate(fit)[1]
+            if m.get('widths') is not None and len(m['widths']):
+                W = np.asarray(m['widths'], dtype=float)
+        elif kind == 'area':
+            value = m['area'] if 'area' in m else polygon_area(P[:,0], P[:,1])
+        else:
+            value = m['angle'] if 'angle' in m else angle(*P)
+        values.append(value)
+        errors.append(error)
+        curves.append(curve)
+        width_points.append(W)
+        width_values.append(widths_from_points(W) if len(W) else np.empty(0))
+
+    points, offsets = _pack([m['points'] for __, m in M])
+    curve, curve_offsets = _pack(curves)
+    widths, width_offsets = _pack(width_points)
+    image = record.get('image', {})
+    cal = record['calibration']
+    arrays = {
+        'version': np.array(version),
+        'image': np.array([str(image.get('id', '')), str(image.get('path', ''))]),
+        'image_size': np.array([image.get('width', np.nan), image.get('height', np.nan)], dtype=float),
+        'calibration': np.array([cal['focal'], cal['altitude'], cal['pixeldim']], dtype=float),
+        'calibration_model': np.array(json.dumps({k: v for k, v in cal.items()
+                                                  if k not in ('focal', 'altitude', 'pixeldim')})),
+        'notes': np.array(record.get('notes', '')),
+        'kind': np.array([kinds.index(k) for k, __ in M], dtype=np.int8),
+        'names': np.array([str(m['name']) for __, m in M]),
+        'bezier': np.array([bool(m.get('bezier', False)) for __, m in M], dtype=bool),
+        'max_degree': np.array([m.get('max_degree') or -1 for __, m in M], dtype=np.int64),
+        'numwidths': np.array([m.get('numwidths') or -1 for __, m in M], dtype=np.int64),
+        'values': np.array(values, dtype=float), #px, px or degrees
+        'errors': np.array(errors, dtype=float),
+        'points': points, 'offsets': offsets,
+        'curve': curve, 'curve_offsets': curve_offsets,
+        'width_points': widths, 'width_offsets': width_offsets,
+        'width_values': np.concatenate(width_values) if width_values else np.empty(0),
+    }
+    path = str(path)
+    if not path.endswith('.npz'):
+        path += '.npz'
+    #never truncate the file in place, a loaded record may still map it
+    np.savez(path + '.part.npz', **arrays) #stored, not deflated, so members can be mapped
+    os.replace(path + '.part.npz', path)
+
+def map_npz(path):
+    """
+    Memory map every member of an uncompressed .npz archive, returns {name: array}.
+    Compressed members (np.savez_compressed) are read into memory instead. The
+    mapping stays open as long as any mapped array is alive.
+    """
+    arrays, mapped = {}, False
+    with zipfile.ZipFile(path) as z, open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) #one map shared by all members
+        for info in z.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with z.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            f.seek(info.header_offset)
+            local = f.read(30) #fixed part of the local file header
+            start = info.header_offset + 30 + int.from_bytes(local[26:28], 'little') \
+                    + int.from_bytes(local[28:30], 'little')
+            f.seek(start)
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject or not np.prod(shape, dtype=np.int64):
+                f.seek(start)
+                arrays[name] = np.lib.format.read_array(f, allow_pickle = False)
+            else:
+                arrays[name] = np.ndarray(shape, dtype = dtype, buffer = buf, offset = f.tell(),
+                                          order = 'F' if fortran else 'C')
+                mapped = True
+        if not mapped:
+            buf.close()
+    return arrays
+
+def load_session(path, mmap = os.name != 'nt'):
+    """
+    Read a session file back into an annotation record. Geometry arrays are
+    views into the memory mapped file unless mmap is False (the default on
+    Windows, where a mapped session could not be saved again). Besides the raw
+    geometry each measurement carries its stored pixel value ('length',
+    'area' or 'angle'), lengths also their quadrature 'error', drawn 'curve'
+    polyline and 'width_values', so measure() and the overlay need no fitting.
+    """
+    if mmap:
+        S = map_npz(path)
+    else:
+        with np.load(path, allow_pickle = False) as z:
+            S = {k: z[k] for k in z.files}
+    if int(S['version']) > version:
+        raise ValueError(f"{path}: session version {int(S['version'])} is newer than supported ({version})")
+
+    focal, altitude, pixeldim = (float(v) for v in S['calibration'])
+    width, height = (float(v) for v in S['image_size'])
+    record = {
+        'image': {'id': str(S['image'][0]), 'path': str(S['image'][1]), 'width': width, 'height': height},
+        'calibration': {'focal': focal, 'altitude': altitude, 'pixeldim': pixeldim},
+        'notes': str(S['notes']),
+        'lengths': [], 'areas': [], 'angles': [],
+    }
+    if 'calibration_model' in S: #model name and parameters, see calibration.models
+        record['calibration'].update(json.loads(str(S['calibration_model'])))
+    o, co, wo = S['offsets'], S['curve_offsets'], S['width_offsets']
+    for i, kind in enumerate(S['kind']):
+        kind = kinds[kind]
+        m = {'name': str(S['names'][i]), 'points': S['points'][o[i]:o[i+1]], kind: float(S['values'][i])}
+        if kind == 'length':
+            numwidths = int(S['numwidths'][i])
+            W = S['width_points'][wo[i]:wo[i+1]]
+            m.update(bezier = bool(S['bezier'][i]), error = float(S['errors'][i]),
+                     curve = S['curve'][co[i]:co[i+1]],
+                     numwidths = numwidths if numwidths >= 0 else None,
+                     widths = W if len(W) else None,
+                     width_values = S['width_values'][wo[i]//2:wo[i+1]//2])
+            if S['max_degree'][i] >= 0:
+                m['max_degree'] = int(S['max_degree'][i])
+        record[kind + 's'].append(m)
+    return record
@@ -0,0 +1,58 @@
+"""
+Launch time instrumentation.
+
+The GUI marks each stage of startup (imports, QApplication, main window,
+first paint); `python -m morphometrix --startup-report` prints where the
+time went once the window has been drawn. Imported first by __main__ and
+free of heavy imports itself, so its clock starts before anything else.
+"""
+import os
+import sys
+import time
+
+marks = [('morphometrix imported', time.perf_counter())]
+
+def mark(label):
+    """Record the end of a startup stage"""
+    marks.append((label, time.perf_counter()))
+
+def process_age():
+    """Seconds since the process was created (Linux only, else None), covers interpreter start"""
+    try:
+        with open('/proc/self/stat') as f:
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def report():
+    """Table of stage durations and the running total, in ms"""
+    first = marks[0][1]
+    age = process_age()
+    #time before the first mark: interpreter start and site imports
+    before = (age - (time.perf_counter() - first)) if age is not None else None
+    lines = [f"{'MorphoMetriX startup':32s}{'stage ms':>10s}{'total ms':>10s}"]
+    if before is not None:
+        lines.append(f"{'  interpreter start':32s}{before*1e3:10.1f}{before*1e3:10.1f}")
+    offset = before or 0.0
+    last = first
+    for label, t in marks[1:]:
+        lines.append(f"  {label:30s}{(t - last)*1e3:10.1f}{(t - first + offset)*1e3:10.1f}")
+        last = t
+    return '\n'.join(lines)
+
+def report_on_first_paint(widget, stream = sys.stderr):
+    """Mark 'first paint' and write the report once widget has been drawn"""
+    from PyQt6 import QtCore
+
+    class FirstPaint(QtCore.QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QtCore.QEvent.Type.Paint:
+                widget.removeEventFilter(self)
+                mark('first paint')
+                stream.write(report() + '\n')
+                stream.flush()
+            return False
+
+    widget._first_paint = FirstPaint(widget) #kept alive with the widget
+    widget.installEventFilter(widget._first_paint)
@@ -0,0 +1,180 @@
+"""
+Tiled, multi-resolution display of very large images.
+
+Opening a 45-100 MP frame as one QPixmap decodes (and holds) every pixel up
+front. TilePyramid instead decodes fixed size tiles on demand, one pyramid
+level per factor of two in scale, and keeps them in a memory-bounded LRU with
+a copy on disk so reopening an image skips the decode. TiledImageItem paints
+only the tiles of the level matching the current zoom that intersect the
+exposed part of the scene.
+
+Only JPEG decoding can be limited to a strip of the frame. PNG and TIFF
+readers decode the whole frame whatever is asked for, so for those a level
+is decoded once and cut into all of its tiles, which briefly takes the
+memory of the whole level.
+"""
+import os
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6 import QtGui, QtCore
+from PyQt6.QtWidgets import QGraphicsItem
+
+from morphometrix.cache import cache_dir, file_key, prune
+
+class TilePyramid():
+
+    disk_bytes = 2*2**30 #tile cache on disk, least recently opened frames evicted beyond this
+
+    def __init__(self, path, tile = 512, max_bytes = 256*2**20, cache = True):
+        self.path = path
+        self.tile = tile
+        self.max_bytes = max_bytes
+        reader = QtGui.QImageReader(path)
+        self.size = reader.size() #read from header, no decode
+        if not self.size.isValid():
+            raise IOError(f"cannot read {path}: {reader.errorString()}")
+        self.width, self.height = self.size.width(), self.size.height()
+        #coarsest level fits in a single tile
+        self.levels = 1 + max(0, math.ceil(math.log2(max(self.width, self.height) / tile)))
+        #-2: last column tiles are cut to the frame, older entries are evicted as least recently used
+        self.dir = cache_dir('tiles', file_key(path) + '-2') if cache else None
+        self._tiles = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers = 1) if cache else None #disk writes off the GUI thread
+        if cache:
+            os.utime(self.dir) #mark as recently used
+            self._writer.submit(prune, os.path.dirname(self.dir), self.disk_bytes, (self.dir,))
+
+    def grid(self, level):
+        """Number of tile columns, rows at level"""
+        span = self.tile * 2**level #full resolution pixels per tile
+        return math.ceil(self.width / span), math.ceil(self.height / span)
+
+    def rect(self, level, i, j):
+        """Full resolution (scene) rectangle covered by tile i, j at level"""
+        span = self.tile * 2**level
+        x, y = i*span, j*span
+        return QtCore.QRect(x, y, min(span, self.width - x), min(span, self.height - y))
+
+    def level_for(self, lod):
+        """Coarsest level with at least one image pixel per screen pixel at scale lod"""
+        if lod <= 0:
+            return self.levels - 1
+        return min(self.levels - 1, max(0, math.floor(math.log2(1 / lod))))
+
+    def _filename(self, level, i, j):
+        #full resolution tiles stay lossless
+        return os.path.join(self.dir, '{}_{}_{}.{}'.format(level, i, j, 'png' if level == 0 else 'jpg'))
+
+    def _save(self, img, fname):
+        fmt = fname.rsplit('.', 1)[-1].upper()
+        if img.save(fname + '.part', fmt, 50 if fmt == 'PNG' else 95):
+            os.replace(fname + '.part', fname) #never leave a half written tile behind
+
+    def _decode_row(self, level, j):
+        """
+        Tiles of row j at level as {(level, i, j): QImage}. Where the reader can
+        clip, only the full width strip of the row is decoded (the decoder has
+        to scan down to it either way); otherwise the whole level is decoded
+        and every row is returned, as the next row would cost the same read.
+        """
+        cols, rows = self.grid(level)
+        reader = QtGui.QImageReader(self.path)
+        if reader.supportsOption(QtGui.QImageIOHandler.ImageOption.ClipRect):
+            first, last = j, j
+            r = self.rect(level, 0, j).united(self.rect(level, cols - 1, j))
+            reader.setClipRect(r)
+            size = QtCore.QSize(max(1, r.width() >> level), max(1, r.height() >> level))
+        else:
+            first, last = 0, rows - 1
+            size = QtCore.QSize(-(-self.width >> level), -(-self.height >> level)) #rounded up, no empty last row
+        if level:
+            reader.setScaledSize(size)
+        strip = reader.read()
+        if strip.isNull():
+            raise IOError(f"cannot decode {self.path}: {reader.errorString()}")
+        #the last column (and row) is narrower unless the frame is a multiple of the tile span
+        tiles = {}
+        for row in range(first, last + 1):
+            y = (row - first)*self.tile
+            for i in range(cols):
+                tiles[(level, i, row)] = strip.copy(i*self.tile, y, min(self.tile, strip.width() - i*self.tile),
+                                                    min(self.tile, strip.height() - y))
+        if self.dir:
+            for (__, i, row), img in tiles.items():
+                self._writer.submit(self._save, img, self._filename(level, i, row))
+        return tiles
+
+    def _store(self, key, img):
+        with self._lock:
+            if key in self._tiles:
+                return
+            self._tiles[key] = img
+            self._bytes += img.sizeInBytes()
+            while self._bytes > self.max_bytes and len(self._tiles) > 1:
+                __, old = self._tiles.popitem(last = False)
+                self._bytes -= old.sizeInBytes()
+
+    def __call__(self, level, i, j):
+        """Tile image at level (0 = full resolution), column i, row j"""
+        key = (level, i, j)
+        with self._lock:
+            img = self._tiles.get(key)
+            if img is not None:
+                self._tiles.move_to_end(key)
+                return img
+
+        fname = self.dir and self._filename(level, i, j)
+        img = QtGui.QImage(fname) if fname and os.path.exists(fname) else QtGui.QImage()
+        if img.isNull():
+            tiles = self._decode_row(level, j)
+            img = tiles.pop(key)
+            for k, tile in tiles.items():
+                self._store(k, tile)
+        self._store(key, img) #stored last, the most recently used
+        return img
+
+    def region(self, rect):
+        """Full resolution QImage of rect (scene pixels), assembled from level 0 tiles"""
+        rect = rect.intersected(QtCore.QRect(0, 0, self.width, self.height))
+        out = QtGui.QImage(rect.size(), QtGui.QImage.Format.Format_RGB32)
+        if rect.isEmpty():
+            return out
+        painter = QtGui.QPainter(out)
+        for j in range(rect.top() // self.tile, rect.bottom() // self.tile + 1):
+            for i in range(rect.left() // self.tile, rect.right() // self.tile + 1):
+                painter.drawImage(self.rect(0, i, j).topLeft() - rect.topLeft(), self(0, i, j))
+        painter.end()
+        return out
+
+class TiledImageItem(QGraphicsItem):
+
+    def __init__(self, pyramid, parent = None):
+        super(TiledImageItem, self).__init__(parent)
+        self.pyramid = pyramid
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption) #exposedRect
+        self.setCacheMode(QGraphicsItem.CacheMode.NoCache)
+
+    def boundingRect(self):
+        return QtCore.QRectF(0, 0, self.pyramid.width, self.pyramid.height)
+
+    def paint(self, painter, option, widget = None):
+        P = self.pyramid
+        level = P.level_for(option.levelOfDetailFromTransform(painter.worldTransform()))
+        span = P.tile * 2**level
+        cols, rows = P.grid(level)
+        device = painter.worldTransform().inverted()[0].mapRect(
+            QtCore.QRectF(0, 0, painter.device().width(), painter.device().height()))
+        exposed = option.exposedRect.intersected(device).intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        i0, i1 = int(exposed.left() // span), min(cols - 1, int(exposed.right() // span))
+        j0, j1 = int(exposed.top() // span), min(rows - 1, int(exposed.bottom() // span))
+        painter.setRenderHint(QtGui.QPainter.RenderHint.SmoothPixmapTransform, level > 0)
+        for j in range(j0, j1 + 1):
+            for i in range(i0, i1 + 1):
+                painter.drawImage(QtCore.QRectF(P.rect(level, i, j)), P(level, i, j))
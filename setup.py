@@ -11,9 +11,17 @@ setup(
     entry_points={
         'gui_scripts': [
             'morphometrix = morphometrix.__main__:main'
+        ],
+        'console_scripts': [
+            'morphometrix-batch = morphometrix.batch:main'
         ]
     },
+    extras_require = {
+        'parquet': ['pyarrow'], #columnar datasets (morphometrix.dataset)
+        'hdf5': ['h5py'],
+    },
 #    scripts=['morphometrix/morphometrix.py'],
-    packages = ['morphometrix']
+    packages = ['morphometrix'],
+    package_data = {'morphometrix': ['manual/*']} #offline manual
 #    packages= find_packages()
 )
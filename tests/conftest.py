@@ -0,0 +1,30 @@
+"""
+Annotation records shared by the tests, built like the GUI's
+MainWindow.annotations from a few synthetic measurements.
+"""
+import numpy as np
+import pytest
+
+from morphometrix.core import fit_length, width_stations
+
+def make_record(image_id = 'frame', numwidths = 5, seed = 0):
+    rng = np.random.default_rng(seed)
+    x = np.linspace(200.0, 1800.0, 8)
+    P = np.c_[x, 600.0 + 80.0*np.sin(x/500.0) + rng.normal(0.0, 1.0, len(x))]
+    curve, arc = fit_length(P)
+    B, normal = width_stations(curve, arc, numwidths)
+    W = np.stack([B + 60*normal, B - 50*normal], axis = 1).reshape(-1, 2)
+    a = np.linspace(0.0, 2*np.pi, 24, endpoint = False)
+    return {
+        'image': {'id': image_id, 'path': f'{image_id}.jpg', 'width': 2000.0, 'height': 1200.0},
+        'calibration': {'focal': 8.8, 'altitude': 48.2, 'pixeldim': 0.0024},
+        'notes': 'synthetic',
+        'lengths': [{'name': 'TL', 'points': P, 'bezier': True, 'numwidths': numwidths, 'widths': W},
+                    {'name': 'Rostrum', 'points': P[:2], 'bezier': False, 'numwidths': None, 'widths': None}],
+        'areas': [{'name': 'Fluke', 'points': np.c_[1000 + 300*np.cos(a), 600 + 120*np.sin(a)]}],
+        'angles': [{'name': 'Sweep', 'points': np.array([[100.0, 100.0], [300.0, 100.0], [300.0, 400.0]])}],
+    }
+
+@pytest.fixture
+def record():
+    return make_record()
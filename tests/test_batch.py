@@ -0,0 +1,54 @@
+"""
+Batch measurement of annotation files: rows in file order from a process
+pool, and a bad file reported without stopping the others.
+"""
+import os
+
+import numpy as np
+
+from morphometrix.core import save_annotations, measure
+from morphometrix.dataset import measurement_records
+from morphometrix.batch import run, process_file, find_annotations
+
+from conftest import make_record
+
+class Rows():
+    def __init__(self):
+        self.rows = []
+
+    def writerows(self, rows):
+        self.rows.extend(rows)
+
+def same_rows(a, b):
+    return len(a) == len(b) and all(x == y or (isinstance(x, float) and np.isnan(x) and np.isnan(y))
+                                    for r, s in zip(a, b) for x, y in zip(r, s))
+
+def test_corrupt_file_is_isolated(tmp_path):
+    record = make_record('good')
+    good, bad = str(tmp_path / 'good.json'), str(tmp_path / 'bad.json')
+    save_annotations(good, record)
+    with open(bad, 'w') as f:
+        f.write('{"image": {"id": "bad", ')
+    writer, progress = Rows(), []
+    errors = run([bad, good], writer, jobs = 2, chunksize = 1, progress = lambda *a: progress.append(a))
+    assert same_rows(writer.rows, measurement_records(record, measure(record)))
+    assert [path for path, __ in errors] == [bad] and errors[0][1].startswith('JSONDecodeError')
+    assert progress == [(1, 2, 1), (2, 2, 1)]
+
+def test_rows_in_file_order(tmp_path):
+    records = [make_record(f'{i:04d}', seed = i) for i in range(6)]
+    for r in records:
+        save_annotations(str(tmp_path / (r['image']['id'] + '.json')), r)
+    (tmp_path / 'sub').mkdir()
+    save_annotations(str(tmp_path / 'sub' / '0006.json'), make_record('0006', seed = 6))
+    files = find_annotations([str(tmp_path)])
+    assert [os.path.basename(f) for f in files] == [f'{i:04d}.json' for i in range(6)] + ['0006.json']
+    writer = Rows()
+    assert run(files, writer, jobs = 2, chunksize = 2, altitude = 30.0) == []
+    assert [r[0] for r in writer.rows] == sorted(r[0] for r in writer.rows)
+    expected = [row for r in records for row in measurement_records(r, measure(r, altitude = 30.0))]
+    assert same_rows(writer.rows[:len(expected)], expected)
+
+def test_process_file_reports_missing_file(tmp_path):
+    path, rows, err = process_file(str(tmp_path / 'missing.json'))
+    assert rows == [] and err.startswith('FileNotFoundError')
@@ -0,0 +1,87 @@
+"""
+Calibration models in morphometrix.calibration and how calibrations given
+on top of each other combine.
+"""
+import numpy as np
+import pytest
+
+from morphometrix import batch
+from morphometrix.calibration import (combine, calibration_model, recalibrate, exponents,
+                                      Pinhole, AltitudeCorrection, BrownConrady)
+
+base = {'focal': 8.8, 'altitude': 50.0, 'pixeldim': 0.0024}
+lens = {'model': 'brown-conrady', 'k1': -0.1, 'k2': 0.02, 'p1': 1e-3, 'p2': -5e-4, 'cx': 2736, 'cy': 1824}
+
+def test_pinhole_scale():
+    model = Pinhole(**base)
+    scale = 0.0024*50.0/8.8
+    assert model.scale() == pytest.approx(scale)
+    assert model.convert([100.0, 100.0, 30.0], [exponents['length'], exponents['area'], exponents['angle']]) == \
+        pytest.approx([100*scale, 100*scale**2, 30.0])
+    assert calibration_model(base).params() == base
+
+def test_altitude_correction():
+    model = AltitudeCorrection(**base, offset = -1.2, gain = 1.05)
+    assert model.range() == pytest.approx(1.05*50.0 - 1.2)
+    assert model.convert(10.0) == pytest.approx(10.0*0.0024*(1.05*50.0 - 1.2)/8.8)
+    assert calibration_model(model.params()).params() == model.params()
+
+@pytest.mark.parametrize('k1, k2, p1, p2, k3', [(-0.1, 0.02, 1e-3, -5e-4, 0.0), (0.08, -0.03, -2e-3, 1e-3, 0.01)])
+def test_undistort_recovers_points(k1, k2, p1, p2, k3):
+    model = BrownConrady(**base, k1 = k1, k2 = k2, p1 = p1, p2 = p2, k3 = k3, cx = 2736.0, cy = 1824.0)
+    x, y = np.meshgrid(np.linspace(0, 5472, 25), np.linspace(0, 3648, 17)) #out to the frame corners
+    ideal = np.c_[x.ravel(), y.ravel()]
+    clicked = model.distort(ideal)
+    assert np.abs(clicked - ideal).max() > 50 #a real correction, not a no-op
+    assert np.abs(model.undistort(clicked) - ideal).max() < 1e-6
+    assert np.array_equal(model.undistort(np.empty((0, 2))), np.empty((0, 2)))
+
+def test_lens_model_needs_principal_point():
+    with pytest.raises(ValueError, match = 'principal point'):
+        calibration_model(dict(base, model = 'brown-conrady', k1 = -0.1))
+    model = calibration_model(dict(base, model = 'brown-conrady', k1 = -0.1), {'width': 5472, 'height': 3648})
+    assert (model.cx, model.cy) == (2736.0, 1824.0)
+
+def test_recalibrate_columns():
+    kind = np.array(['length', 'width', 'area', 'angle'])
+    pixels = np.array([1500.0, 120.0, 2.5e5, 35.0])
+    columns = {'kind': kind, 'pixels': pixels, 'focal': np.full(4, 8.8),
+               'altitude': np.array([50.0, 50.0, 40.0, 40.0]), 'pixeldim': np.full(4, 0.0024)}
+    scale = 0.0024*columns['altitude']/8.8
+    assert recalibrate(columns) == pytest.approx([1500*scale[0], 120*scale[1], 2.5e5*scale[2]**2, 35.0])
+    corrected = recalibrate(columns, model = 'altitude', offset = -1.2)
+    scale = 0.0024*(columns['altitude'] - 1.2)/8.8
+    assert corrected == pytest.approx([1500*scale[0], 120*scale[1], 2.5e5*scale[2]**2, 35.0])
+    assert recalibrate(columns, altitude = 30.0)[0] == pytest.approx(1500*0.0024*30.0/8.8)
+    with pytest.raises(ValueError, match = 're-measure'):
+        recalibrate(columns, model = 'brown-conrady', k1 = -0.1, cx = 0, cy = 0)
+
+def test_correction_over_lens_keeps_both():
+    cal = combine(base, lens, {'model': 'altitude', 'offset': -1.2})
+    model = calibration_model(cal)
+    assert isinstance(model, BrownConrady)
+    assert model.k1 == -0.1 and float(model.offset) == -1.2 and float(model.gain) == 1.0
+
+def test_partial_correction_keeps_stored_parameters():
+    stored = dict(base, model = 'altitude', offset = -1.2, gain = 1.05)
+    model = calibration_model(combine(stored, {'model': 'altitude', 'gain': 1.1}))
+    assert type(model) is AltitudeCorrection
+    assert float(model.offset) == -1.2 and float(model.gain) == 1.1
+    assert calibration_model(combine(stored, {})).params() == stored
+
+def test_unknown_parameters_are_rejected():
+    with pytest.raises(ValueError, match = 'offset'):
+        calibration_model(dict(base, offset = 1.0))
+    with pytest.raises(ValueError, match = 'unknown calibration model'):
+        combine(base, {'model': 'fisheye'})
+
+def test_batch_flags_compose(monkeypatch):
+    seen = {}
+    def run(files, writer, **overrides):
+        seen.update(overrides)
+        return []
+    monkeypatch.setattr(batch, 'run', run)
+    monkeypatch.setattr(batch, 'find_annotations', lambda paths, ext: [])
+    batch.main(['.', '-q', '--altitude-offset=-1.2', '--distortion=-0.1,0.02,0.001,-0.0005'])
+    cal = {k: v for k, v in seen.items() if k in ('model', 'offset', 'gain', 'k1', 'k2', 'p1', 'p2')}
+    assert cal == {'model': 'brown-conrady', 'offset': -1.2, 'k1': -0.1, 'k2': 0.02, 'p1': 0.001, 'p2': -0.0005}
@@ -0,0 +1,134 @@
+"""
+Numerical kernels of morphometrix.core checked against direct, slower
+computations: de Casteljau evaluation, closed form arc length, plain sums
+and brute force segment crossings.
+"""
+import numpy as np
+import pytest
+
+from morphometrix.core import (bernstein_eval, BezierCurve, ArcLength, PointBuffer, posData, polygon_area,
+                               segment_intersections, SegmentGrid)
+
+def de_casteljau(P, t):
+    P = np.asarray(P, dtype=float)
+    out = []
+    for ti in np.ravel(t):
+        Q = P.copy()
+        while len(Q) > 1:
+            Q = (1 - ti)*Q[:-1] + ti*Q[1:]
+        out.append(Q[0])
+    return np.array(out)
+
+@pytest.mark.parametrize('degree', [1, 3, 12, 40, 80])
+def test_bernstein_eval_matches_de_casteljau(degree):
+    rng = np.random.default_rng(degree)
+    P = rng.uniform(-1000, 1000, size = (degree + 1, 2))
+    t = np.concatenate(([0.0, 0.5, 1.0, 1e-9, 1 - 1e-9], rng.uniform(size = 200)))
+    B = bernstein_eval(P, t)
+    assert B.shape == (len(t), 2)
+    assert np.allclose(B, de_casteljau(P, t), rtol = 0, atol = 1e-9*np.abs(P).max())
+    assert np.array_equal(B[[0, 2]], P[[0, -1]])
+
+def parabola_length(a):
+    """Length of y = x**2 from 0 to a"""
+    return 0.5*a*np.sqrt(1 + 4*a*a) + 0.25*np.arcsinh(2*a)
+
+def test_arc_length_of_parabola():
+    arc = ArcLength(BezierCurve([[0, 0], [0.5, 0], [1, 1]])) #B(t) = (t, t**2)
+    L = parabola_length(1.0)
+    assert arc.length == pytest.approx(L, rel = 1e-12)
+    assert arc.error < 1e-9*L
+    t = np.linspace(0, 1, 11)
+    assert np.allclose(arc(t), parabola_length(t), rtol = 0, atol = 1e-12)
+    fractions = np.linspace(0, 1, 21)
+    assert np.allclose(parabola_length(arc.invert(fractions)), fractions*L, rtol = 0, atol = 1e-9*L)
+
+def test_invert_straight_line_with_uneven_parameter():
+    #collinear control points bunched at one end, so t is far from arc length
+    arc = ArcLength(BezierCurve([[0, 0], [1, 1], [1.5, 1.5], [30, 30]]))
+    assert arc.length == pytest.approx(30*np.sqrt(2), rel = 1e-12)
+    f = np.linspace(0, 1, 9)
+    x = arc.curve(arc.invert(f))[:,0]
+    assert np.allclose(x, 30*f, atol = 1e-8)
+
+def test_point_buffer_growth_pop_trim():
+    buf = PointBuffer(2, capacity = 2)
+    for i in range(37):
+        buf.append(i, -i)
+    buf.pop()
+    buf.trim(5)
+    assert len(buf) == 31
+    assert np.array_equal(buf[0], np.arange(5, 36)) and np.array_equal(buf[1], -np.arange(5, 36))
+
+def test_prefix_length_and_area():
+    rng = np.random.default_rng(1)
+    x, y = rng.uniform(0, 500, size = (2, 100))
+    p = posData(x, y)
+    p.downdate()
+    x, y = x[:-1], y[:-1]
+    assert p.traced_length() == pytest.approx(np.sum(np.hypot(np.diff(x), np.diff(y))), rel = 1e-12)
+    assert p.traced_length(3.0, 4.0) == pytest.approx(
+        np.sum(np.hypot(np.diff(x), np.diff(y))) + np.hypot(3 - x[-1], 4 - y[-1]), rel = 1e-12)
+    for k in (0, 17, 60):
+        assert p.closed_area(k = k) == pytest.approx(polygon_area(x[k:], y[k:]), rel = 1e-9)
+        assert p.closed_area(250.0, 250.0, k) == pytest.approx(
+            polygon_area(np.append(x[k:], 250), np.append(y[k:], 250)), rel = 1e-9)
+    p.trim(40)
+    assert p.traced_length() == pytest.approx(np.sum(np.hypot(np.diff(x[40:]), np.diff(y[40:]))), rel = 1e-12)
+    assert p.closed_area() == pytest.approx(polygon_area(x[40:], y[40:]), rel = 1e-9)
+
+def orientation(ax, ay, bx, by, cx, cy):
+    return np.sign((bx - ax)*(cy - ay) - (by - ay)*(cx - ax))
+
+def brute_crossings(x, y, px, py, qx, qy):
+    """Indices of polyline segments properly crossed by p -> q (touching and collinear excluded)"""
+    hits = []
+    for k in range(len(x) - 1):
+        a = orientation(x[k], y[k], x[k+1], y[k+1], px, py) * orientation(x[k], y[k], x[k+1], y[k+1], qx, qy)
+        b = orientation(px, py, qx, qy, x[k], y[k]) * orientation(px, py, qx, qy, x[k+1], y[k+1])
+        if a < 0 and b < 0:
+            hits.append(k)
+    return hits
+
+def random_walk(n, seed):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.integers(-40, 41, size = (2, n)), axis = 1).astype(float)
+
+def test_segment_intersections_brute_force():
+    x, y = random_walk(300, 2)
+    rng = np.random.default_rng(3)
+    for px, py, qx, qy in rng.integers(-200, 200, size = (200, 4)).astype(float):
+        hit, s = segment_intersections(x[:-1], y[:-1], np.diff(x), np.diff(y), px, py, qx, qy)
+        assert list(np.flatnonzero(hit)) == brute_crossings(x, y, px, py, qx, qy)
+
+def test_segment_intersections_adjacent_and_touching():
+    x0, y0, dx, dy = np.array([0.0]), np.array([0.0]), np.array([10.0]), np.array([0.0])
+    for q in ([20, 0], [5, 0], [15, 7], [10, -3]): #continuing, folding back, turning, at the end
+        assert not segment_intersections(x0, y0, dx, dy, 10.0, 0.0, *q)[0].any()
+    assert not segment_intersections(x0, y0, dx, dy, 5.0, 0.0, 5.0, 4.0)[0].any() #starts on the segment
+    hit, s = segment_intersections(x0, y0, dx, dy, 5.0, -2.0, 5.0, 6.0)
+    assert hit.all() and s[0] == pytest.approx(0.25)
+
+@pytest.mark.parametrize('seed', [4, 5, 6])
+def test_grid_matches_brute_force(seed):
+    x, y = random_walk(400, seed)
+    p = posData(x[:1], y[:1])
+    grid = SegmentGrid(x[:1], y[:1], cell = 32.0, max_cells = 64)
+    for k in range(1, len(x)):
+        p.update(x[k], y[k])
+        grid.insert(x[k-1], y[k-1], x[k], y[k])
+        if k % 7 == 0: #undo a point now and then
+            p.downdate()
+            grid.pop()
+            p.update(x[k], y[k])
+            grid.insert(x[k-1], y[k-1], x[k], y[k])
+        qx, qy = x[k] + 60*np.cos(k), y[k] + 60*np.sin(k)
+        expected = brute_crossings(x[:k+1], y[:k+1], x[k], y[k], qx, qy)
+        candidates = grid.candidates(x[k], y[k], qx, qy)
+        if candidates is not None:
+            assert set(expected) <= set(candidates)
+        hit, xi, yi, j = p.checkIntersect(qx, qy)
+        assert hit == bool(expected)
+        if hit:
+            assert j == expected[-1]
+    assert p.grid is not None #long enough to have used the index
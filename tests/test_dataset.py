@@ -0,0 +1,54 @@
+"""
+DatasetWriter -> read_dataset round trip of typed long-format rows, for every
+backend whose library is installed.
+"""
+import numpy as np
+import pytest
+
+from morphometrix.core import measure
+from morphometrix.calibration import recalibrate
+from morphometrix.dataset import DatasetWriter, read_dataset, measurement_records, schema, names
+
+from conftest import make_record
+
+backends = [('.csv', None), ('.parquet', 'pyarrow'), ('.arrow', 'pyarrow'), ('.h5', 'h5py')]
+
+def rows_for(image_id, seed):
+    record = make_record(image_id, seed = seed)
+    record['areas'][0]['name'] = 'Fluke, "tip"' #needs quoting in a .csv
+    return measurement_records(record, measure(record))
+
+def key(row):
+    return row[0], row[2], row[3], row[4]
+
+@pytest.mark.parametrize('ext, module', backends)
+def test_round_trip(tmp_path, ext, module):
+    if module:
+        pytest.importorskip(module)
+    path = str(tmp_path / ('season' + ext))
+    first, second = rows_for('0001', 0), rows_for('0002', 1)
+    with DatasetWriter(path, batch_rows = 4) as writer: #several batches
+        writer.writerows(first)
+    with DatasetWriter(path) as writer: #appended by a later run
+        writer.writerows(second)
+
+    cols = read_dataset(path)
+    assert list(cols) == names
+    for n, t in schema:
+        assert cols[n].dtype.kind == ('U' if t == 'U' else 'f'), n
+    got = sorted(zip(*cols.values()), key = key)
+    expected = sorted(first + second, key = key)
+    assert len(got) == len(expected)
+    for a, b in zip(got, expected):
+        for (n, t), x, y in zip(schema, a, b):
+            if t == 'U':
+                assert x == y, n
+            else:
+                assert x == y or (np.isnan(x) and np.isnan(y)), n
+
+    #the stored pixels put the values back on the same calibration
+    assert np.allclose(recalibrate(cols), cols['value'], rtol = 1e-12)
+
+def test_unknown_extension(tmp_path):
+    with pytest.raises(ValueError, match = 'unknown dataset type'):
+        DatasetWriter(str(tmp_path / 'season.txt'))
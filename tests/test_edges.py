@@ -0,0 +1,51 @@
+"""
+Edge proposals on a synthetic frame: a filled ellipse, whose outline along
+any normal to its major axis is known exactly.
+"""
+import numpy as np
+import pytest
+
+from morphometrix.edges import propose_edges, bilinear
+
+def ellipse_frame(width, height, centre, a, b, theta, inside = 200.0, outside = 50.0, supersample = 4):
+    """Grey frame with an anti-aliased filled ellipse (pixel i, j covers [i, i+1) x [j, j+1))"""
+    s = (np.arange(supersample) + 0.5)/supersample
+    x = (np.arange(width)[:,None] + s).ravel()
+    y = (np.arange(height)[:,None] + s).ravel()
+    X, Y = np.meshgrid(x - centre[0], y - centre[1])
+    u = X*np.cos(theta) + Y*np.sin(theta)
+    v = -X*np.sin(theta) + Y*np.cos(theta)
+    cover = ((u/a)**2 + (v/b)**2 <= 1).reshape(height, supersample, width, supersample).mean(axis = (1, 3))
+    rng = np.random.default_rng(0)
+    return outside + (inside - outside)*cover + rng.normal(0.0, 2.0, cover.shape)
+
+@pytest.mark.parametrize('theta', [0.0, np.pi/6])
+@pytest.mark.parametrize('inside, outside', [(200.0, 50.0), (40.0, 180.0)]) #bright or dark body
+def test_edges_on_ellipse(theta, inside, outside):
+    centre, a, b = np.array([320.0, 240.0]), 220.0, 70.0
+    image = ellipse_frame(640, 480, centre, a, b, theta, inside, outside)
+    axis, normal = np.array([np.cos(theta), np.sin(theta)]), np.array([-np.sin(theta), np.cos(theta)])
+    u = np.linspace(-0.85*a, 0.85*a, 15) #stations along the major axis
+    origins = centre + u[:,None]*axis
+    normals = np.tile(normal, (len(u), 1))
+
+    points, strength = propose_edges(image, origins, normals, reach = 1.6*b)
+    assert points.shape == (2*len(u), 2) and strength.shape == (len(u), 2)
+    d = np.einsum('ij,j->i', points - np.repeat(origins, 2, axis = 0), normal).reshape(-1, 2)
+    half = b*np.sqrt(1 - (u/a)**2)
+    assert np.abs(d[:,0] - half).max() < 1.0 #+normal side first
+    assert np.abs(d[:,1] + half).max() < 1.0
+    assert (strength > 0.5).all()
+
+def test_no_edge_leaves_points_on_stations():
+    image = np.full((100, 100), 120.0)
+    origins = np.array([[30.0, 50.0], [70.0, 50.0]])
+    points, strength = propose_edges(image, origins, np.array([[0.0, 1.0], [0.0, 1.0]]), reach = 30)
+    assert np.array_equal(points, np.repeat(origins, 2, axis = 0))
+    assert not strength.any()
+
+def test_bilinear_pixel_centres():
+    image = np.arange(12.0).reshape(3, 4)
+    assert bilinear(image, 0.5, 0.5) == 0.0 and bilinear(image, 3.5, 2.5) == 11.0
+    assert bilinear(image, 1.0, 0.5) == pytest.approx(0.5)
+    assert np.isnan(bilinear(image, 0.2, 1.0))
@@ -0,0 +1,100 @@
+"""
+EXIF/XMP header parsing in morphometrix.metadata, on small TIFF and JPEG
+files built byte by byte.
+"""
+import struct
+
+import pytest
+
+from morphometrix import metadata
+from morphometrix.metadata import (MAKE, MODEL, EXIF_IFD, XMP, FOCAL, FOCAL_35, IMAGE_WIDTH, IMAGE_HEIGHT,
+                                   read_metadata, calibration, MetadataIndex)
+
+XMP_PACKET = (b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:Description '
+              b'drone-dji:RelativeAltitude="+48.20"/></x:xmpmeta>')
+
+def ascii(text):
+    return 2, len(text) + 1, text.encode() + b'\0'
+
+def short(v):
+    return 3, 1, struct.pack('<H', v)
+
+def rational(num, den):
+    return 5, 1, struct.pack('<II', num, den)
+
+def tiff(ifd0, exif = None):
+    """Little-endian TIFF structure with IFD0 and an optional Exif IFD, {tag: (type, count, data)}"""
+    ifd0 = dict(ifd0)
+    if exif:
+        ifd0[EXIF_IFD] = (4, 1, b'\0\0\0\0') #offset patched below
+    layout = [ifd0] + ([exif] if exif else [])
+    offsets, pos = [], 8
+    for ifd in layout:
+        offsets.append(pos)
+        pos += 2 + 12*len(ifd) + 4
+    data, out = b'', [b'II*\0' + struct.pack('<I', 8)]
+    for ifd in layout:
+        entries = b''
+        for tag in sorted(ifd):
+            typ, count, value = ifd[tag]
+            if tag == EXIF_IFD:
+                value = struct.pack('<I', offsets[1])
+            if len(value) > 4:
+                entries += struct.pack('<HHII', tag, typ, count, pos + len(data))
+                data += value
+            else:
+                entries += struct.pack('<HHI', tag, typ, count) + value.ljust(4, b'\0')
+        out.append(struct.pack('<H', len(ifd)) + entries + b'\0\0\0\0')
+    return b''.join(out) + data
+
+@pytest.fixture
+def drone_tiff(tmp_path):
+    """TIFF from a known camera with the XMP packet in tag 0x02BC (type BYTE)"""
+    path = tmp_path / 'frame.tif'
+    path.write_bytes(tiff({MAKE: ascii('DJI'), MODEL: ascii('FC6310'), IMAGE_WIDTH: short(5472),
+                           IMAGE_HEIGHT: short(3648), XMP: (1, len(XMP_PACKET), XMP_PACKET)},
+                          {FOCAL: rational(88, 10)}))
+    return str(path)
+
+@pytest.fixture
+def drone_jpeg(tmp_path):
+    """JPEG headers only: Exif APP1, XMP APP1 and a baseline start of frame"""
+    def segment(marker, payload):
+        return b'\xff' + bytes([marker]) + struct.pack('>H', len(payload) + 2) + payload
+    exif = tiff({MAKE: ascii('DJI'), MODEL: ascii('FC6310')}, {FOCAL: rational(88, 10), FOCAL_35: short(24)})
+    path = tmp_path / 'frame.jpg'
+    path.write_bytes(b'\xff\xd8' + segment(0xE1, b'Exif\0\0' + exif)
+                     + segment(0xE1, b'http://ns.adobe.com/xap/1.0/\0' + XMP_PACKET)
+                     + segment(0xC0, b'\x08' + struct.pack('>HH', 3648, 5472) + b'\x03')
+                     + b'\xff\xda')
+    return str(path)
+
+@pytest.mark.parametrize('name', ['drone_tiff', 'drone_jpeg'])
+def test_read_metadata(name, request):
+    meta = read_metadata(request.getfixturevalue(name))
+    assert meta['make'] == 'DJI' and meta['model'] == 'FC6310'
+    assert meta['focal'] == pytest.approx(8.8)
+    assert (meta['width'], meta['height']) == (5472, 3648)
+    assert meta['relative_altitude'] == pytest.approx(48.2)
+    assert meta['pixeldim'] == pytest.approx(13.2 / 5472)
+    assert calibration(meta) == {'focal': meta['focal'], 'altitude': meta['relative_altitude'],
+                                 'pixeldim': meta['pixeldim']}
+
+def test_unexpected_tag_types(tmp_path):
+    #model as a SHORT, XMP as ASCII and a single BYTE: values that don't fit are ignored
+    path = tmp_path / 'odd.tif'
+    path.write_bytes(tiff({MODEL: short(7), XMP: ascii('x'), IMAGE_WIDTH: (1, 1, b'\x05')}))
+    meta = read_metadata(str(path))
+    assert meta['model'] is None and meta['relative_altitude'] is None and meta['pixeldim'] is None
+
+def test_truncated_file(tmp_path, drone_tiff):
+    path = tmp_path / 'cut.tif'
+    path.write_bytes(open(drone_tiff, 'rb').read()[:40])
+    assert read_metadata(str(path))['focal'] is None
+
+def test_index_reuses_entries(tmp_path, drone_jpeg, monkeypatch):
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    first = index.get(drone_jpeg)
+    monkeypatch.setattr(metadata, 'read_metadata', lambda path: pytest.fail('parsed again'))
+    assert index.get(drone_jpeg) == first
+    index.close()
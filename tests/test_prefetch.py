@@ -0,0 +1,46 @@
+"""
+Memory bound of the image prefetcher when it holds tiled frames.
+"""
+import time
+
+import pytest
+
+pytest.importorskip('PyQt6')
+from PyQt6 import QtGui
+
+from morphometrix.prefetch import ImagePrefetcher, nbytes
+
+@pytest.fixture
+def frame(tmp_path, monkeypatch):
+    monkeypatch.setenv('MORPHOMETRIX_CACHE', str(tmp_path / 'cache'))
+    img = QtGui.QImage(1536, 1536, QtGui.QImage.Format.Format_RGB32)
+    img.fill(QtGui.QColor(90, 120, 200))
+    path = str(tmp_path / 'frame.jpg')
+    assert img.save(path)
+    return path
+
+def wait_cached(prefetcher, n, timeout = 10):
+    end = time.monotonic() + timeout
+    while len(prefetcher._cache) < n:
+        assert time.monotonic() < end, 'prefetch did not finish'
+        time.sleep(0.01)
+
+def test_growing_pyramids_stay_bounded(frame):
+    max_bytes = 20*2**20
+    prefetcher = ImagePrefetcher([frame]*6, ahead = 5, max_bytes = max_bytes, tile_threshold = 1)
+    try:
+        prefetcher.prefetch(0)
+        wait_cached(prefetcher, 5) #inserted with no tiles decoded yet
+        for index in range(1, 6):
+            pyramid = prefetcher.get(index)
+            cols, rows = pyramid.grid(0)
+            for j in range(rows):
+                for i in range(cols):
+                    pyramid(0, i, j) #zoomed all over it at full resolution, 9 MB
+            prefetcher.prefetch(index)
+            total = sum(nbytes(item) for item in prefetcher._cache.values())
+            assert total <= max_bytes
+            assert prefetcher._bytes == total
+            assert index in prefetcher._cache #the frame being shown is the last to go
+    finally:
+        prefetcher.close()
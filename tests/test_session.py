@@ -0,0 +1,52 @@
+"""
+Session files: save_session/load_session round trip, and saving a reopened
+session over itself.
+"""
+import numpy as np
+import pytest
+
+from morphometrix.core import measure
+from morphometrix.session import save_session, load_session
+
+def assert_same_measurements(a, b):
+    ma, mb = measure(a), measure(b)
+    for kind in ('lengths', 'length_errors', 'areas', 'angles'):
+        assert ma[kind] == pytest.approx(mb[kind], rel = 1e-12)
+    for name, (names, W) in ma['widths'].items():
+        assert list(mb['widths'][name][0]) == list(names)
+        assert np.allclose(mb['widths'][name][1], W, rtol = 1e-12)
+    assert ma['calibration'] == mb['calibration']
+
+@pytest.mark.parametrize('mapped', [True, False])
+def test_round_trip(tmp_path, record, mapped):
+    path = str(tmp_path / 'frame.npz')
+    save_session(path, record)
+    loaded = load_session(path, mmap = mapped)
+    assert loaded['image'] == record['image'] and loaded['notes'] == record['notes']
+    for kind in ('lengths', 'areas', 'angles'):
+        assert [m['name'] for m in loaded[kind]] == [m['name'] for m in record[kind]]
+        for a, b in zip(loaded[kind], record[kind]):
+            assert np.array_equal(a['points'], b['points'])
+    assert np.array_equal(loaded['lengths'][0]['widths'], record['lengths'][0]['widths'])
+    assert loaded['lengths'][1]['widths'] is None
+    assert_same_measurements(loaded, record)
+
+def test_lens_model_round_trip(tmp_path, record):
+    record['calibration'].update(model = 'brown-conrady', k1 = -0.05, cx = 1000.0, cy = 600.0)
+    save_session(str(tmp_path / 'lens'), record) #extension added
+    assert load_session(str(tmp_path / 'lens.npz'))['calibration'] == record['calibration']
+
+def test_resave_reopened_session(tmp_path, record):
+    path = str(tmp_path / 'frame.npz')
+    save_session(path, record)
+    first = load_session(path) #arrays still mapped while it is saved over
+    before = np.array(first['lengths'][0]['points'])
+    first['lengths'].append(dict(first['lengths'][1], name = 'Added'))
+    save_session(path, first)
+    assert np.array_equal(first['lengths'][0]['points'], before) #old views untouched
+    second = load_session(path)
+    assert [m['name'] for m in second['lengths']] == ['TL', 'Rostrum', 'Added']
+    assert_same_measurements(second, first)
+    save_session(path, second) #and once more over the new mapping
+    assert_same_measurements(load_session(path), first)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['frame.npz']
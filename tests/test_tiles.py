@@ -0,0 +1,58 @@
+"""
+Tile pyramid decoding: tiles reassemble the frame, and formats that can't be
+decoded a strip at a time are read once per level.
+"""
+import pytest
+
+pytest.importorskip('PyQt6')
+from PyQt6 import QtGui, QtCore
+
+from morphometrix.tiles import TilePyramid
+
+def gradient(width, height):
+    img = QtGui.QImage(width, height, QtGui.QImage.Format.Format_RGB32)
+    for y in range(height):
+        for x in range(0, width, 7):
+            img.setPixel(x, y, QtGui.qRgb(x % 256, y % 256, (x + y) % 256))
+    return img
+
+class CountingReader(QtGui.QImageReader):
+    reads = 0
+
+    def read(self):
+        CountingReader.reads += 1
+        return super(CountingReader, self).read()
+
+@pytest.fixture
+def reads(monkeypatch):
+    CountingReader.reads = 0
+    monkeypatch.setattr(QtGui, 'QImageReader', CountingReader)
+    return CountingReader
+
+@pytest.mark.parametrize('ext', ['png', 'tif'])
+def test_unclipped_formats_decode_each_level_once(tmp_path, reads, ext):
+    img = gradient(1300, 1100) #neither side a multiple of the tile
+    path = str(tmp_path / f'frame.{ext}')
+    assert img.save(path)
+    P = TilePyramid(path, tile = 256, cache = False)
+    for level in range(P.levels):
+        cols, rows = P.grid(level)
+        for j in range(rows):
+            for i in range(cols):
+                tile = P(level, i, j)
+                r = P.rect(level, i, j)
+                assert abs(tile.width() - r.width() / 2**level) <= 1
+                assert abs(tile.height() - r.height() / 2**level) <= 1
+    assert reads.reads == P.levels
+    assert P.region(QtCore.QRect(0, 0, 1300, 1100)) == img
+
+def test_jpeg_decodes_strips(tmp_path, reads):
+    path = str(tmp_path / 'frame.jpg')
+    assert gradient(1300, 1100).save(path)
+    P = TilePyramid(path, tile = 256, cache = False)
+    cols, rows = P.grid(0)
+    for i in range(cols):
+        assert P(0, i, 2).size() == P.rect(0, i, 2).size()
+    assert reads.reads == 1
+    P(0, 0, 4) #last row, 76 px high
+    assert reads.reads == 2 and P(0, 0, 4).height() == 1100 - 4*256